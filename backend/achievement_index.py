@@ -0,0 +1,135 @@
+import bisect
+import itertools
+import threading
+
+from prolog_terms import Var, goal
+
+# Facets an achievement can be filtered on; every combination of them has
+# its own date-sorted list, so any filtered top-N is one bisect and a slice
+FACETS = ('category', 'sport', 'level')
+_COMBINATIONS = list(itertools.product((False, True), repeat=len(FACETS)))
+
+# Athletes without a sport or competition level
+NONE = 'none'
+
+
+class AchievementIndex:
+    # Secondary indexes over every athlete's achievements, kept in step with
+    # the achievement writes. Achievements carry the athlete's current sport
+    # and competition level as facets; when either changes, that athlete's
+    # entries move to their new lists.
+    #
+    # Pages are addressed by a cursor: the id of the last entry returned.
+    # The next page starts with a bisect on that entry's sort key, so paging
+    # deep into the roster costs the same as the first page.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = itertools.count(1)
+        self._entries = {}
+        self._by_user = {}
+        self._facets = {}
+        self._by_date = {}
+        self._by_title = []
+
+    def _facet_keys(self, entry):
+        values = (entry['category'], entry['sport'], entry['level'])
+        return [
+            tuple(value if used else None for value, used in zip(values, combination))
+            for combination in _COMBINATIONS
+        ]
+
+    def _link(self, entry_id, entry):
+        for key in self._facet_keys(entry):
+            bisect.insort(self._by_date.setdefault(key, []), (entry['date'], entry_id))
+
+    def _unlink(self, entry_id, entry):
+        for key in self._facet_keys(entry):
+            dates = self._by_date[key]
+            del dates[bisect.bisect_left(dates, (entry['date'], entry_id))]
+            if not dates:
+                del self._by_date[key]
+
+    def _add(self, user_id, title, date, category, description):
+        sport, level = self._facets.get(user_id, (NONE, NONE))
+        entry = {
+            'userId': user_id, 'title': title, 'date': str(date), 'category': category,
+            'description': description, 'sport': sport, 'level': level,
+        }
+        entry_id = next(self._ids)
+        self._entries[entry_id] = entry
+        self._by_user.setdefault(user_id, []).append(entry_id)
+        self._link(entry_id, entry)
+        bisect.insort(self._by_title, (str(title).lower(), entry_id))
+
+    def add(self, user_id, title, date, category, description):
+        with self._lock:
+            self._add(user_id, title, date, category, description)
+
+    def set_athlete(self, user_id, sport=None, level=None):
+        # Called when an athlete's sport or competition level changes
+        with self._lock:
+            current_sport, current_level = self._facets.get(user_id, (NONE, NONE))
+            facets = (sport or current_sport, level or current_level)
+            if facets == (current_sport, current_level):
+                return
+            self._facets[user_id] = facets
+            for entry_id in self._by_user.get(user_id, ()):
+                entry = self._entries[entry_id]
+                self._unlink(entry_id, entry)
+                entry['sport'], entry['level'] = facets
+                self._link(entry_id, entry)
+
+    def rebuild(self, engine):
+        facets = engine.broadcast(goal("athlete_facets", Var("UserID"), Var("Sport"), Var("Level")))
+        achievements = engine.broadcast(goal(
+            "user_achievement", Var("UserID"), Var("Title"), Var("Date"), Var("Category"), Var("Description"), Var(),
+        ))
+        with self._lock:
+            self._reset()
+            for result in (result for results in facets for result in results):
+                self._facets[result['UserID']] = (result['Sport'], result['Level'])
+            for result in (result for results in achievements for result in results):
+                self._add(result['UserID'], result['Title'], result['Date'], result['Category'], result['Description'])
+            return len(self._entries)
+
+    def top(self, limit, after=None, start=None, end=None, **filters):
+        # Newest first, optionally within [start, end] and matching filters
+        # (any of category, sport, level). Returns (entries, next cursor).
+        key = tuple(filters.get(facet) or None for facet in FACETS)
+        with self._lock:
+            dates = self._by_date.get(key, [])
+            stop = len(dates)
+            if after is not None and after in self._entries:
+                stop = bisect.bisect_left(dates, (self._entries[after]['date'], after))
+            if end is not None:
+                stop = min(stop, bisect.bisect_right(dates, (end, float('inf'))))
+            first = 0 if start is None else bisect.bisect_left(dates, (start, 0))
+            begin = max(first, stop - limit)
+            page = [entry_id for _, entry_id in reversed(dates[begin:stop])]
+            return self._page(page, more=begin > first)
+
+    def search(self, prefix, limit, after=None):
+        # Titles starting with prefix (case-insensitive), alphabetically
+        prefix = prefix.lower()
+        with self._lock:
+            titles = self._by_title
+            position = bisect.bisect_left(titles, (prefix, 0))
+            if after is not None and after in self._entries:
+                position = max(position, bisect.bisect_right(titles, (str(self._entries[after]['title']).lower(), after)))
+            page = []
+            while position < len(titles) and len(page) <= limit and titles[position][0].startswith(prefix):
+                page.append(titles[position][1])
+                position += 1
+            more = len(page) > limit
+            return self._page(page[:limit], more)
+
+    def _page(self, entry_ids, more):
+        entries = [dict(self._entries[entry_id], id=entry_id) for entry_id in entry_ids]
+        return entries, (entry_ids[-1] if more and entry_ids else None)
+
+    def __len__(self):
+        return len(self._entries)
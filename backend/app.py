@@ -1,55 +1,179 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context, url_for
 from flask_cors import CORS
 import subprocess
 import tempfile
 import uuid
 import os
 import json
-from pyswip import Prolog
-import logging
+import atexit
+import hmac
+import itertools
+import multiprocessing
+import threading
+import time
+from datetime import date
+from achievement_index import AchievementIndex
+from app_logging import PayloadSampler, configure_logging
+from engine_pool import EngineBusy, EnginePool, QueryBudgetExceeded
+from kb_compiler import KnowledgeBaseError
+from metrics import COUNT_BUCKETS, Registry
+from catalog import build_catalog
+from chatbot_index import build_chatbot_index
+from plan_cache import PlanCache, plan_key
+from plan_encoding import build_plan_fragments, dumps
+from plan_versions import PlanVersions
+from request_profiler import RequestProfiler
+from roster_stats import UNSPECIFIED, RosterStats
+from persistence import Persistence
+from session_store import SessionStore
+from training_calendar import CalendarCache, TrainingCalendar
+from prolog_terms import Var, goal, text
+from user_keys import UserKeys
 
-# Set up logging (you can adjust the level based on your needs)
-logging.basicConfig(level=logging.DEBUG)
+# Structured JSON logs written by a background thread; the level comes from
+# COACH_LOG_LEVEL and payload dumps are sampled per route (COACH_LOG_PAYLOADS)
+configure_logging()
+payload_sampler = PayloadSampler.from_env()
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize Prolog
-prolog = Prolog()
+# Path to the Prolog file - update this with your actual file path
+prolog_file = "sports_fitness_coach.pl"
+
+# Pool of Prolog engine worker processes; athletes are sharded across workers
+# by user ID so each athlete's dynamic facts live on exactly one engine
+engine = EnginePool(prolog_file)
+
+# Athlete facts hold a small integer key per user instead of the user ID
+user_keys = UserKeys(
+    os.path.join(os.environ.get("COACH_DATA_DIR", "data"), "users.keys"),
+    fsync=os.environ.get("COACH_LOG_FSYNC", "1") == "1",
+)
+engine.keys = user_keys
+
+# Athlete facts are made durable through a write log plus periodic snapshots
+persistence = Persistence(
+    engine,
+    os.environ.get("COACH_DATA_DIR", "data"),
+    snapshot_interval=int(os.environ.get("COACH_SNAPSHOT_INTERVAL", 300)),
+    fsync=os.environ.get("COACH_LOG_FSYNC", "1") == "1",
+)
+
+# Logged training sessions, kept in NumPy columns outside the engines
+session_store = SessionStore(
+    os.path.join(os.environ.get("COACH_DATA_DIR", "data"), "sessions"),
+    fsync=os.environ.get("COACH_LOG_FSYNC", "1") == "1",
+)
+
+# Roster-wide counters for coach dashboards, kept current by the write paths
+roster = RosterStats()
+
+# Sorted indexes over every athlete's achievements for leaderboards and search
+achievement_index = AchievementIndex()
+
+# Immutable snapshot of the static catalog facts, rebuilt only when the
+# knowledge base is (re)loaded
+catalog = None
+
+# Retrieval index over the chatbot Q&A facts, rebuilt with the catalog
+chatbot_index = None
+CHATBOT_THRESHOLD = float(os.environ.get("COACH_CHATBOT_THRESHOLD", 0.35))
+
+# Pre-encoded JSON for every recommendation text, rebuilt with the catalog
+plan_fragments = None
+
+# Formatted plans keyed on their inputs (fitness level, sport, diet, injuries)
+plan_cache = PlanCache(maxsize=int(os.environ.get("COACH_PLAN_CACHE_SIZE", 4096)))
+# Per-user plan section versions behind the plan ETags
+plan_versions = PlanVersions()
+
+# Periodized calendar weeks, generated on request and kept per athlete until
+# their sport, competition or injuries change
+calendar_cache = CalendarCache(maxsize=int(os.environ.get("COACH_CALENDAR_CACHE_SIZE", 1024)))
+training_calendar = TrainingCalendar(engine, calendar_cache)
+CALENDAR_DEFAULT_WEEKS = 12
+CALENDAR_MAX_WEEKS = 104
+
+# Request and engine instrumentation, served on /metrics
+metrics = Registry()
+request_latency = metrics.histogram(
+    'coach_http_request_duration_seconds', 'Time spent handling a request', ('route', 'method', 'status'))
+request_round_trips = metrics.histogram(
+    'coach_prolog_queries_per_request', 'Prolog engine calls issued while handling a request',
+    ('route',), buckets=COUNT_BUCKETS)
+engine_wait = metrics.histogram(
+    'coach_engine_queue_wait_seconds', 'Time engine requests spent queued before running', ('command',))
+engine_execution = metrics.histogram(
+    'coach_engine_execution_seconds', 'Time engine requests spent running in the engine', ('command',))
+engine_rejections = metrics.counter(
+    'coach_engine_rejected_total', 'Requests refused with 503 because an engine queue was full', ('route',))
+
+def record_engine_timing(command, wait, execution):
+    engine_wait.observe(wait, command)
+    engine_execution.observe(execution, command)
+
+engine.on_timing = record_engine_timing
+
+budget_violations = metrics.counter(
+    'coach_query_budget_exceeded_total', 'Queries cancelled for exceeding their time or inference budget',
+    ('route', 'limit'))
+
+def parse_budgets(spec):
+    # "get_plan=2:5000000,get_plans_batch=20:100000000" -> {endpoint: (seconds, inferences)}
+    budgets = {}
+    for item in (spec or "").split(","):
+        name, _, budget = item.partition("=")
+        if name.strip() and budget.strip():
+            seconds, _, inferences = budget.partition(":")
+            budgets[name.strip()] = (float(seconds), int(inferences or 0))
+    return budgets
+
+# Wall-clock and inference limits enforced inside the engine on each read
+# query, per endpoint; 0 disables a limit
+DEFAULT_QUERY_BUDGET = (
+    float(os.environ.get("COACH_QUERY_TIME_LIMIT", 5)),
+    int(os.environ.get("COACH_QUERY_INFERENCE_LIMIT", 10000000)),
+)
+QUERY_BUDGETS = parse_budgets(os.environ.get("COACH_QUERY_BUDGETS"))
+
+# Seconds clients are told to wait when the engines are saturated
+RETRY_AFTER = int(os.environ.get("COACH_RETRY_AFTER", 1))
+
+# Requests profiled on demand (X-Profile with the admin token) or sampled
+# at COACH_PROFILE_SAMPLE_RATE, optionally only on COACH_PROFILE_ENDPOINTS
+request_profiler = RequestProfiler(
+    os.path.join(os.environ.get("COACH_DATA_DIR", "data"), "profiles"),
+    sample_rate=float(os.environ.get("COACH_PROFILE_SAMPLE_RATE", 0)),
+    endpoints={name.strip() for name in os.environ.get("COACH_PROFILE_ENDPOINTS", "").split(",") if name.strip()},
+    keep=int(os.environ.get("COACH_PROFILE_KEEP", 50)),
+)
+
+# Upper bound on records accepted by the batch endpoints in one request
+MAX_BATCH_SIZE = int(os.environ.get("COACH_MAX_BATCH", 1000))
+
+def build_static_views():
+    # Everything derived from the static facts; rebuilt on every (re)load
+    global catalog, chatbot_index, plan_fragments
+    catalog = build_catalog(engine)
+    plan_fragments = build_plan_fragments(engine)
+    chatbot_index = build_chatbot_index(engine, CHATBOT_THRESHOLD)
+    plan_cache.clear()
+    plan_versions.clear()
+    calendar_cache.clear()
+    app.logger.info("Chatbot index built: %d questions", len(chatbot_index))
+    app.logger.info("Plan fragments encoded: %d recommendation texts", len(plan_fragments))
+    app.logger.info("Catalog snapshot built: %d sports, %d sport formats", len(catalog.sports), len(catalog.sport_formats))
 
 # Load the Prolog knowledge base
 def load_prolog_knowledge_base():
-    # Path to the Prolog file - update this with your actual file path
-    prolog_file = "sports_fitness_coach.pl"
-    
+    timings = {}
+
     # Check if file exists
     if os.path.exists(prolog_file):
-        print(f"Loading Prolog file: {prolog_file}")
-        prolog.consult(prolog_file)
-        print(f"Loaded Prolog knowledge base from {prolog_file}")
-        
-        # Test if predicates are loaded
-        try:
-            print("Testing if predicates are loaded...")
-            # Test user_injury predicate
-            test_query = "user_injury(_, _, _, _, _, _)"
-            results = list(prolog.query(test_query))
-            print(f"user_injury predicate test: {'Success' if results is not None else 'Failed'}")
-            
-            # Test user_achievement predicate
-            test_query = "user_achievement(_, _, _, _, _)"
-            results = list(prolog.query(test_query))
-            print(f"user_achievement predicate test: {'Success' if results is not None else 'Failed'}")
-            
-            # Test add_injury predicate
-            test_query = "add_injury(_, _, _, _, _, _)"
-            results = list(prolog.query(test_query))
-            print(f"add_injury predicate test: {'Success' if results is not None else 'Failed'}")
-            
-        except Exception as e:
-            print(f"Error testing predicates: {str(e)}")
+        app.logger.info("Loading Prolog file: %s", prolog_file)
     else:
-        print(f"Prolog file {prolog_file} not found")
+        app.logger.warning("Prolog file %s not found", prolog_file)
         # Create the file with basic rules for development
         with open(prolog_file, "w") as f:
             f.write("""
@@ -63,11 +187,83 @@ def load_prolog_knowledge_base():
 
 % Rest of the Prolog code would go here
             """)
-        prolog.consult(prolog_file)
-        print(f"Created and loaded basic Prolog file at {prolog_file}")
+        app.logger.warning("Created basic Prolog file at %s", prolog_file)
+
+    # Engines load the compiled image of the knowledge base, which is only
+    # rebuilt when the source changed
+    atexit.register(engine.stop)
+    timings.update(engine.start())
+    app.logger.info("Loaded Prolog knowledge base from %s into %d engine workers", prolog_file, engine.size)
+
+    # Bring back the athletes from the last run before serving anything
+    started = time.perf_counter()
+    user_keys.load()
+    atexit.register(user_keys.close)
+    persistence.restore()
+    persistence.start()
+    atexit.register(persistence.close)
+    timings['restore'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sessions = session_store.load()
+    atexit.register(session_store.close)
+    timings['sessions'] = time.perf_counter() - started
+    app.logger.info("Loaded %d training sessions for %d athletes", sessions, len(session_store))
+
+    started = time.perf_counter()
+    roster.rebuild(engine)
+    timings['roster'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    achievement_index.rebuild(engine)
+    timings['achievements'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    build_static_views()
+    timings['views'] = time.perf_counter() - started
+    return timings
+
+# Startup runs in the background; until it is done /health/ready answers 503
+# and so does every API route
+readiness = {'ready': False, 'error': None, 'startupSeconds': None, 'phases': {}}
+startup_duration = metrics.collector(lambda: [(
+    'coach_startup_seconds', 'gauge', 'Time spent in each cold-start phase', ('phase',),
+    [((phase,), seconds) for phase, seconds in readiness['phases'].items()],
+)])
 
-# Call this at startup
-load_prolog_knowledge_base()
+def initialize():
+    started = time.perf_counter()
+    try:
+        phases = load_prolog_knowledge_base()
+    except Exception as e:
+        app.logger.exception("Startup failed: %s", e)
+        readiness['error'] = str(e)
+        return
+    readiness['phases'] = {phase: round(seconds, 3) for phase, seconds in phases.items()}
+    readiness['startupSeconds'] = round(time.perf_counter() - started, 3)
+    readiness['ready'] = True
+    app.logger.info("Ready in %ss: %s", readiness['startupSeconds'], readiness['phases'])
+
+# Engine workers re-import this module when they are spawned, so only the
+# parent process owns and starts the pool.
+if multiprocessing.parent_process() is None:
+    threading.Thread(target=initialize, name="startup", daemon=True).start()
+
+def log_payload(message, **fields):
+    # Payloads are serialised on the logging thread, and only when sampled
+    if payload_sampler.sample(request.endpoint):
+        app.logger.info(message, extra={'fields': fields})
+
+def as_number(value):
+    # Profile numbers used to be spliced into the query text unquoted, so
+    # numeric strings from form fields still arrive in Prolog as numbers
+    if isinstance(value, str):
+        for parse in (int, float):
+            try:
+                return parse(value)
+            except ValueError:
+                pass
+    return value
 
 @app.route('/api/user', methods=['POST'])
 def create_user():
@@ -85,19 +281,269 @@ def create_user():
     fitness_level = data.get('fitnessLevel', 'beginner')
     
     # Assert user profile in Prolog
-    query = f"new_user('{user_id}', '{name}', {age}, '{gender}', {height}, {weight}, '{fitness_level}')"
-    list(prolog.query(query))
+    query = goal("new_user", user_id, text(name), as_number(age), gender, as_number(height), as_number(weight), fitness_level)
+    user_keys.assign([user_id])
+    with roster.writing():
+        if persistence.write(user_id, query):
+            roster.add_athlete(user_id, fitness_level)
     
     return jsonify({
         "userId": user_id,
         "message": "User profile created successfully"
     })
 
+# Outcomes reported by the api_* write predicates, other than ok
+WRITE_ERRORS = {
+    'unknown_user': (404, 'User not found. Please complete your profile setup first.'),
+    'invalid_sport': (400, 'Invalid sport'),
+    'invalid_level': (400, 'Invalid level'),
+    'invalid_competition_type': (400, 'Invalid competition type'),
+    'invalid_diet_type': (400, 'Invalid diet type'),
+    'invalid_injury_type': (400, 'Invalid injury type'),
+    'invalid_recovery_status': (400, 'Invalid recovery status'),
+}
+
+def write_status(results):
+    # api_* predicates always succeed once and bind Status
+    return results[0]['Status'] if results else 'failed'
+
+def write_error(status, value=None):
+    code, message = WRITE_ERRORS.get(status, (500, 'The update could not be applied'))
+    if value is not None:
+        message = f'{message}: {value}'
+    return jsonify({'status': status, 'error': message}), code
+
+def invalid_value(field, value):
+    # Checked against the catalog snapshot before any engine call
+    return not isinstance(value, str) or value not in catalog.valid[field]
+
+# The plan sections each kind of write can change
+PLAN_SECTIONS_CHANGED = {
+    'sport': ('trainingPlan', 'nutritionPlan'),
+    'competition': ('trainingPlan',),
+    'diet': ('nutritionPlan',),
+    'injury': ('injuryRecommendations',),
+    'workload': ('trainingPlan',),
+}
+
+# Writes that change an input of the training calendar
+CALENDAR_CHANGES = {'sport', 'competition', 'injury'}
+
+def plan_changed(user_id, change):
+    plan_cache.invalidate_user(user_id)
+    plan_versions.bump(user_id, PLAN_SECTIONS_CHANGED[change])
+    if change in CALENDAR_CHANGES:
+        calendar_cache.invalidate_user(user_id)
+
+# Endpoints that answer before startup has finished
+ALWAYS_AVAILABLE = {'liveness', 'readiness_probe', 'get_metrics'}
+# Endpoints never profiled
+NOT_PROFILED = ALWAYS_AVAILABLE | {'profiling', 'get_profile', 'download_python_profile'}
+
+def wants_profile():
+    if request.endpoint in NOT_PROFILED:
+        return False
+    if 'X-Profile' in request.headers:
+        return admin_denied() is None
+    return request_profiler.sampled(request.endpoint)
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    engine.reset_round_trips()
+    engine.set_budget(QUERY_BUDGETS.get(request.endpoint, DEFAULT_QUERY_BUDGET))
+    engine.set_profile(None)
+    if not readiness['ready'] and request.endpoint not in ALWAYS_AVAILABLE:
+        response = jsonify({'error': 'The coach is starting up. Please retry shortly.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER)
+        return response
+    if wants_profile():
+        g.profile = request_profiler.start()
+        if g.profile is not None:
+            engine.set_profile(g.profile['engine'])
+
+@app.after_request
+def finish_request(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        engine.set_profile(None)
+        try:
+            response.headers['X-Profile-Id'] = request_profiler.finish(profile, {
+                'method': request.method, 'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint, 'status': response.status_code,
+            })
+        except Exception as e:
+            app.logger.error(f"Error saving request profile: {str(e)}", exc_info=True)
+    round_trips = engine.round_trips
+    response.headers['X-Prolog-Round-Trips'] = str(round_trips)
+    if round_trips:
+        wait, execution = engine.request_timing
+        response.headers['Server-Timing'] = (
+            f"engine-wait;dur={wait * 1000:.2f}, engine-exec;dur={execution * 1000:.2f}")
+    # Label by route pattern, not path, to keep the series bounded
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_latency.observe(time.perf_counter() - g.started, route, request.method, response.status_code)
+    request_round_trips.observe(round_trips, route)
+    return response
+
+@app.errorhandler(EngineBusy)
+def engine_busy(e):
+    # Shed load quickly rather than letting requests pile up on an engine
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    engine_rejections.inc(route)
+    response = jsonify({'error': 'The coach is busy right now. Please retry shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
+
+@app.errorhandler(QueryBudgetExceeded)
+def query_budget_exceeded(e):
+    # The engine cancelled the query and carries on with the next one
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    budget_violations.inc(route, e.limit)
+    app.logger.warning("Query on %s cancelled: %s", route, e.limit)
+    return jsonify({'status': e.limit, 'error': 'The request took too long to answer and was cancelled.'}), 504
+
+def athlete_record_error(record):
+    # Checked up front so clients get a precise reason. import_athlete/11
+    # re-checks fitness level, sport and diet inside the engine; competition
+    # and injury values are checked only here, so records already in the
+    # write log still replay
+    if not isinstance(record, dict):
+        return 'Athlete record must be an object'
+    if not record.get('name'):
+        return 'name is required'
+    if invalid_value('fitness_level', record.get('fitnessLevel', 'beginner')):
+        return f"Invalid fitness level: {record.get('fitnessLevel')}"
+    sport = record.get('sport')
+    if sport is not None:
+        if not isinstance(sport, dict) or invalid_value('sport', sport.get('sport')):
+            return f'Invalid sport: {sport}'
+        if invalid_value('fitness_level', sport.get('level', 'beginner')):
+            return f"Invalid level: {sport.get('level')}"
+    diet = record.get('diet')
+    if diet is not None:
+        if not isinstance(diet, dict) or invalid_value('diet_type', diet.get('dietType')):
+            return f'Invalid diet: {diet}'
+        if not isinstance(diet.get('restrictions', []), list):
+            return 'Diet restrictions must be a list'
+    competition = record.get('competition')
+    if competition is not None:
+        if not isinstance(competition, dict):
+            return 'competition must be an object'
+        if invalid_value('competition_type', competition.get('competitionType')):
+            return f"Invalid competition type: {competition.get('competitionType')}"
+        if invalid_value('competition_level', competition.get('level')):
+            return f"Invalid competition level: {competition.get('level')}"
+    injuries = record.get('injuries', [])
+    if not isinstance(injuries, list) or not all(isinstance(injury, dict) for injury in injuries):
+        return 'injuries must be a list of objects'
+    for injury in injuries:
+        if invalid_value('injury_type', injury.get('type')):
+            return f"Invalid injury type: {injury.get('type')}"
+    return None
+
+def import_athlete_goal(user_id, record):
+    sport = record.get('sport')
+    diet = record.get('diet')
+    competition = record.get('competition')
+    return goal(
+        "import_athlete",
+        user_id,
+        text(record.get('name', '')),
+        as_number(record.get('age', 0)),
+        record.get('gender', ''),
+        as_number(record.get('height', 0)),
+        as_number(record.get('weight', 0)),
+        record.get('fitnessLevel', 'beginner'),
+        [sport['sport'], sport.get('level', 'beginner')] if sport else [],
+        [diet['dietType'], list(diet.get('restrictions', []))] if diet else [],
+        [competition.get('competitionType', ''), competition.get('format', ''), competition.get('level', '')] if competition else [],
+        [
+            [injury.get('type', ''), injury.get('date', ''), injury.get('severity', ''),
+             injury.get('recoveryTime', ''), text(injury.get('notes', ''))]
+            for injury in record.get('injuries', [])
+        ],
+    )
+
+def recovery_status_of(notes):
+    # Same rule as injury_recovery_status/2 in the knowledge base
+    return notes if isinstance(notes, str) and notes in catalog.valid['recovery_status'] else UNSPECIFIED
+
+def roster_add_imported(user_id, record):
+    sport = record.get('sport')
+    competition = record.get('competition')
+    achievement_index.set_athlete(
+        user_id,
+        sport=sport['sport'] if sport else None,
+        level=competition.get('level') if competition else None,
+    )
+    roster.add_athlete(
+        user_id,
+        record.get('fitnessLevel', 'beginner'),
+        sport['sport'] if sport else None,
+        [
+            (injury.get('type', ''), injury.get('severity', ''), recovery_status_of(injury.get('notes', '')))
+            for injury in record.get('injuries', [])
+        ],
+    )
+
+@app.route('/api/users/batch', methods=['POST'])
+def create_users_batch():
+    data = request.json
+    records = data.get('athletes') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a list of athlete records'}), 400
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} athletes per batch'}), 413
+    
+    results = [None] * len(records)
+    writes = []
+    indexes = []
+    for index, record in enumerate(records):
+        error = athlete_record_error(record)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+            continue
+        user_id = str(uuid.uuid4())
+        writes.append((user_id, import_athlete_goal(user_id, record)))
+        indexes.append(index)
+    
+    # Each engine worker asserts its share of the athletes in a single call
+    if writes:
+        user_keys.assign([user_id for user_id, _ in writes])
+        try:
+            with roster.writing():
+                applied = persistence.write_batch(writes)
+                for index, (user_id, _), (ok, result) in zip(indexes, writes, applied):
+                    if ok and result:
+                        roster_add_imported(user_id, records[index])
+        except (EngineBusy, QueryBudgetExceeded):
+            raise
+        except Exception as e:
+            app.logger.error(f"Error importing athletes: {str(e)}", exc_info=True)
+            return jsonify({'error': 'An unexpected error occurred while importing athletes.'}), 500
+        for index, (user_id, _), (ok, result) in zip(indexes, writes, applied):
+            if ok and result:
+                results[index] = {'index': index, 'status': 'created', 'userId': user_id}
+            else:
+                if not ok:
+                    app.logger.error(f"Error importing athlete {index}: {result}")
+                results[index] = {'index': index, 'status': 'error', 'error': 'Athlete record was rejected'}
+    
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    })
+
 @app.route('/api/sport', methods=['POST'])
 def set_sport():
     try:
         data = request.json
-        app.logger.info(f"Received sport data: {data}")
+        log_payload("Received sport data", data=data)
         
         user_id = data.get('userId')
         sport = data.get('sport')
@@ -106,43 +552,31 @@ def set_sport():
         if not user_id or not sport:
             app.logger.error(f"Missing required fields: userId={user_id}, sport={sport}")
             return jsonify({'error': 'User ID and sport are required'}), 400
-            
-        # First check if user exists
-        user_exists = list(prolog.query(f"user_profile('{user_id}', _, _, _, _, _, _)"))
-        if not user_exists:
-            app.logger.error(f"User not found: {user_id}")
-            return jsonify({'error': 'User not found. Please complete your profile setup first.'}), 404
-            
-        # Check if sport is valid
-        valid_sport = list(prolog.query(f"sport_category('{sport}')"))
-        if not valid_sport:
+        if invalid_value('sport', sport):
             app.logger.error(f"Invalid sport: {sport}")
-            return jsonify({'error': f'Invalid sport: {sport}'}), 400
-            
-        # Check if level is valid
-        valid_level = list(prolog.query(f"fitness_level('{level}')"))
-        if not valid_level:
+            return write_error('invalid_sport', sport)
+        if invalid_value('fitness_level', level):
             app.logger.error(f"Invalid level: {level}")
-            return jsonify({'error': f'Invalid level: {level}'}), 400
-            
-        # Remove any existing sport for this user
-        prolog.query(f"retractall(user_sport('{user_id}', _, _))")
+            return write_error('invalid_level', level)
         
-        # Add the new sport with level
-        query = f"set_sport('{user_id}', '{sport}', '{level}')"
-        app.logger.info(f"Executing Prolog query: {query}")
-        result = list(prolog.query(query))
-        app.logger.info(f"Query result: {result}")
+        # Checks the user, replaces any previous sport and reports back in
+        # a single engine call
+        query = goal("api_set_sport", user_id, sport, level, Var("Status"))
+        with roster.writing():
+            status = write_status(persistence.write(user_id, query))
+            if status == 'ok':
+                roster.set_sport(user_id, sport)
+                achievement_index.set_athlete(user_id, sport=sport)
+        if status != 'ok':
+            app.logger.error(f"Could not set sport for user {user_id}: {status}")
+            return write_error(status)
+        plan_changed(user_id, 'sport')
         
-        # Verify the sport was added
-        sport_verified = list(prolog.query(f"user_sport('{user_id}', Sport, Level)"))
-        if not sport_verified:
-            app.logger.error(f"Failed to verify sport setting for user {user_id}")
-            return jsonify({'error': 'Failed to set sport'}), 500
-            
-        app.logger.info(f"Successfully set sport for user {user_id}: {sport} at level {level}")
-        return jsonify({'message': f'Sport set to {sport} at {level} level'})
+        app.logger.debug("Set sport for user %s: %s at level %s", user_id, sport, level)
+        return jsonify({'status': status, 'message': f'Sport set to {sport} at {level} level'})
         
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
     except Exception as e:
         app.logger.error(f"Error setting sport: {str(e)}", exc_info=True)
         return jsonify({'error': 'An unexpected error occurred while setting your sport.'}), 500
@@ -156,11 +590,34 @@ def set_competition():
     format = data.get('format', '')
     level = data.get('level', '')
     
+    # Formats depend on the athlete's sport, so only the type and level are
+    # checked here
+    if invalid_value('competition_type', comp_type):
+        return write_error('invalid_competition_type', comp_type)
+    if invalid_value('competition_level', level):
+        return write_error('invalid_level', level)
+    # The optional date is what the training calendar peaks for; an empty
+    # one clears it, and leaving it out keeps the current one
+    if 'date' in data:
+        competition_date = data['date'] or ''
+        try:
+            if competition_date:
+                date.fromisoformat(competition_date)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+        query = goal("api_set_competition", user_id, comp_type, format, level, competition_date, Var("Status"))
+    else:
+        query = goal("api_set_competition", user_id, comp_type, format, level, Var("Status"))
+    
     # Assert competition details in Prolog
-    query = f"set_competition('{user_id}', '{comp_type}', '{format}', '{level}')"
-    list(prolog.query(query))
+    status = write_status(persistence.write(user_id, query))
+    if status != 'ok':
+        return write_error(status)
+    plan_changed(user_id, 'competition')
+    achievement_index.set_athlete(user_id, level=level)
     
     return jsonify({
+        "status": status,
         "message": "Competition details set successfully"
     })
 
@@ -172,11 +629,23 @@ def add_injury():
     injury_type = data.get('injuryType', '')
     recovery_status = data.get('recoveryStatus', '')
     
-    # Assert injury in Prolog
-    query = f"add_injury('{user_id}', '{injury_type}', '{recovery_status}')"
-    list(prolog.query(query))
+    if invalid_value('injury_type', injury_type):
+        return write_error('invalid_injury_type', injury_type)
+    if invalid_value('recovery_status', recovery_status):
+        return write_error('invalid_recovery_status', recovery_status)
+    
+    # Assert injury in Prolog; the recovery status is kept in the notes
+    query = goal("api_add_injury", user_id, injury_type, '', '', '', recovery_status, Var("Status"))
+    with roster.writing():
+        status = write_status(persistence.write(user_id, query))
+        if status == 'ok':
+            roster.add_injury(injury_type, '', recovery_status)
+    if status != 'ok':
+        return write_error(status)
+    plan_changed(user_id, 'injury')
     
     return jsonify({
+        "status": status,
         "message": "Injury record added successfully"
     })
 
@@ -190,10 +659,14 @@ def add_achievement():
     year = data.get('year', 0)
     
     # Assert achievement in Prolog
-    query = f"add_achievement('{user_id}', '{competition}', '{position}', {year})"
-    list(prolog.query(query))
+    query = goal("api_add_achievement", user_id, competition, str(year), 'competition', position, Var("Status"))
+    status = write_status(persistence.write(user_id, query))
+    if status != 'ok':
+        return write_error(status)
+    achievement_index.add(user_id, competition, str(year), 'competition', position)
     
     return jsonify({
+        "status": status,
         "message": "Achievement added successfully"
     })
 
@@ -205,197 +678,363 @@ def set_diet():
     diet_type = data.get('dietType', '')
     restrictions = data.get('restrictions', [])
     
-    # Convert restrictions list to Prolog list format
-    restrictions_str = "[" + ",".join([f"'{r}'" for r in restrictions]) + "]"
+    if invalid_value('diet_type', diet_type):
+        return write_error('invalid_diet_type', diet_type)
     
     # Assert diet preferences in Prolog
-    query = f"set_diet('{user_id}', '{diet_type}', {restrictions_str})"
-    list(prolog.query(query))
+    query = goal("api_set_diet", user_id, diet_type, list(restrictions), Var("Status"))
+    status = write_status(persistence.write(user_id, query))
+    if status != 'ok':
+        return write_error(status)
+    plan_changed(user_id, 'diet')
     
     return jsonify({
+        "status": status,
         "message": "Diet preferences set successfully"
     })
 
 from flask import jsonify
 
+def plan_response(plan, versions, etag, modified):
+    # Cached plans are shared between athletes; the versions are per user
+    response = Response(plan.body(versions), mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def format_plan(result):
+    # Format plans for frontend, encoded once from the cached text fragments
+    return plan_fragments.plan(result)
+
 @app.route('/api/plan/<user_id>', methods=['GET'])
 def get_plan(user_id):
     try:
         # Log the request
-        app.logger.info(f"Fetching plan for user: {user_id}")
+        app.logger.debug("Fetching plan for user: %s", user_id)
+        refresh_workload(user_id)
         
-        # Check if user exists
-        user_exists = list(prolog.query(f"user_profile('{user_id}', _, _, _, _, _, _)"))
-        if not user_exists:
-            app.logger.error(f"User not found: {user_id}")
-            return jsonify({'error': 'User not found. Please complete your profile setup first.'}), 404
+        # Versions are read before the engine, so a write racing this
+        # request can only make the ETag older than the plan, never newer.
+        # Only If-None-Match earns a 304: Last-Modified has one-second
+        # resolution and could hide a write made in the same second. Users
+        # without a recorded version fall through, so unknown ones get a 404.
+        versions, etag, modified = plan_versions.current(user_id)
+        if plan_versions.known(user_id) and request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.last_modified = modified
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        # Plans only depend on the user's plan signature, so athletes with
+        # the same inputs share one cached plan
+        token = plan_cache.token(user_id)
+        signature = plan_cache.signature(user_id)
+        if signature is None:
+            # Also tells us whether the user exists
+            signature_results = engine.query(goal("plan_signature", user_id, Var("FitnessLevel"), Var("Sport"), Var("DietType"), Var("Injuries"), Var("WorkloadZone")), user_id=user_id)
+            if not signature_results:
+                app.logger.error(f"User not found: {user_id}")
+                return jsonify({'error': 'User not found. Please complete your profile setup first.'}), 404
+            result = signature_results[0]
+            signature = plan_key(result['FitnessLevel'], result['Sport'], result['DietType'], result['Injuries'], result['WorkloadZone'])
+            plan_cache.remember_signature(user_id, signature, token)
+        plan_versions.seen(user_id)
+        
+        plan = plan_cache.get(signature)
+        if plan is not None:
+            return plan_response(plan, versions, etag, modified)
         
         # Get full plan including injury recommendations
-        plan_results = list(prolog.query(f"get_full_plan('{user_id}', TrainingPlan, NutritionPlan, InjuryRecommendations)"))
+        plan_results = engine.query(goal("get_full_plan", user_id, Var("TrainingPlan"), Var("NutritionPlan"), Var("InjuryRecommendations")), user_id=user_id)
         if not plan_results:
             app.logger.error(f"Could not generate plan for user: {user_id}")
             return jsonify({'error': 'Could not generate plan.'}), 400
             
-        result = plan_results[0]
-        training_plan = result['TrainingPlan']
-        nutrition_plan = result['NutritionPlan']
-        injury_recommendations = result['InjuryRecommendations']
-        
-        # Format plans for frontend
-        formatted_training_plan = [
-            {'description': str(item), 'details': []} 
-            for item in training_plan
-        ]
-        formatted_nutrition_plan = [
-            {'description': str(item), 'details': []} 
-            for item in nutrition_plan
-        ]
-        formatted_injury_recommendations = [
-            {'description': str(item), 'details': []} 
-            for item in injury_recommendations
-        ]
+        plan = format_plan(plan_results[0])
         
-        # Log the formatted plans
-        app.logger.info(f"Generated training plan: {formatted_training_plan}")
-        app.logger.info(f"Generated nutrition plan: {formatted_nutrition_plan}")
-        app.logger.info(f"Generated injury recommendations: {formatted_injury_recommendations}")
+        log_payload("Generated plan", userId=user_id, plan=plan.sections)
         
-        return jsonify({
-            'trainingPlan': formatted_training_plan,
-            'nutritionPlan': formatted_nutrition_plan,
-            'injuryRecommendations': formatted_injury_recommendations
-        })
+        plan_cache.put(signature, plan, token, user_id)
+        return plan_response(plan, versions, etag, modified)
         
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
     except Exception as e:
         app.logger.error(f"Error generating plan: {str(e)}", exc_info=True)
         return jsonify({'error': 'An unexpected error occurred while generating your plan.'}), 500
 
+@app.route('/api/plans/batch', methods=['POST'])
+def get_plans_batch():
+    data = request.json or {}
+    user_ids = data.get('userIds')
+    if not isinstance(user_ids, list):
+        return jsonify({'error': 'userIds must be a list of user IDs'}), 400
+    if len(user_ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} users per batch'}), 413
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    
+    plans = {}
+    errors = {}
+    for user_id in user_ids:
+        try:
+            refresh_workload(user_id)
+        except Exception as e:
+            # The plan is still served from the last workload fact
+            app.logger.warning(f"Could not refresh workload for {user_id}: {e}")
+    tokens = {user_id: plan_cache.token(user_id) for user_id in user_ids}
+    versions = {user_id: plan_versions.current(user_id)[0] for user_id in user_ids}
+    signatures = {}
+    for user_id in user_ids:
+        signature = plan_cache.signature(user_id)
+        if signature is not None:
+            signatures[user_id] = signature
+    
+    # Signatures we don't know yet: one engine call per worker
+    unknown = [user_id for user_id in user_ids if user_id not in signatures]
+    if unknown:
+        results = engine.query_batch([
+            (user_id, goal("plan_signature", user_id, Var("FitnessLevel"), Var("Sport"), Var("DietType"), Var("Injuries"), Var("WorkloadZone")))
+            for user_id in unknown
+        ])
+        for user_id, (ok, result) in zip(unknown, results):
+            if not ok:
+                app.logger.error(f"Error reading plan signature for {user_id}: {result}")
+                errors[user_id] = 'Could not generate plan.'
+            elif not result:
+                errors[user_id] = 'User not found.'
+            else:
+                result = result[0]
+                signature = plan_key(result['FitnessLevel'], result['Sport'], result['DietType'], result['Injuries'], result['WorkloadZone'])
+                plan_cache.remember_signature(user_id, signature, tokens[user_id])
+                signatures[user_id] = signature
+    
+    # Build each missing plan once, from any one athlete that shares it
+    plans_by_signature = {}
+    builders = {}
+    for user_id, signature in signatures.items():
+        if signature in plans_by_signature or signature in builders:
+            continue
+        plan = plan_cache.get(signature)
+        if plan is not None:
+            plans_by_signature[signature] = plan
+        else:
+            builders[signature] = user_id
+    if builders:
+        pending = list(builders.items())
+        results = engine.query_batch([
+            (user_id, goal("get_full_plan", user_id, Var("TrainingPlan"), Var("NutritionPlan"), Var("InjuryRecommendations")))
+            for _, user_id in pending
+        ])
+        for (signature, user_id), (ok, result) in zip(pending, results):
+            if ok and result:
+                plan = format_plan(result[0])
+                plan_cache.put(signature, plan, tokens[user_id], user_id)
+                plans_by_signature[signature] = plan
+            elif not ok:
+                app.logger.error(f"Error generating plan for {user_id}: {result}")
+    
+    for user_id, signature in signatures.items():
+        plan = plans_by_signature.get(signature)
+        if plan is None:
+            errors[user_id] = 'Could not generate plan.'
+        else:
+            plans[user_id] = plan.body(versions[user_id])
+    
+    # Each plan is already encoded; only the envelope is put around them
+    body = b'{"plans":{' + b','.join(
+        dumps(user_id) + b':' + plan for user_id, plan in plans.items()
+    ) + b'},"errors":' + dumps(errors) + b'}'
+    return Response(body, mimetype='application/json')
+
+def catalog_response(entry):
+    # Catalog bodies are pre-encoded; conditional requests get a 304
+    response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+@app.route('/api/catalog', methods=['GET'])
+def get_catalog():
+    # Everything the onboarding screens need in one round trip
+    return catalog_response(catalog.entries['catalog'])
+
 @app.route('/api/sports', methods=['GET'])
 def get_sports():
-    # Query Prolog for available sports
-    results = list(prolog.query("sport_category(Sport)"))
-    sports = [result['Sport'] for result in results]
-    
-    return jsonify({
-        "sports": sports
-    })
+    return catalog_response(catalog.entries['sports'])
 
 @app.route('/api/competition_types', methods=['GET'])
 def get_competition_types():
-    try:
-        # Query Prolog for competition types
-        results = list(prolog.query("competition_type(Type)"))
-        types = [result['Type'] for result in results]
-        
-        return jsonify({
-            "competitionTypes": types
-        })
-    except Exception as e:
-        print(f"Error in get_competition_types: {str(e)}")
-        return jsonify({
-            "competitionTypes": ['olympics', 'commonwealth', 'world_championship', 'national', 'local']
-        })
+    return catalog_response(catalog.entries['competition_types'])
 
 @app.route('/api/sport_formats/<sport>', methods=['GET'])
 def get_sport_formats(sport):
-    try:
-        # Query Prolog for formats for a specific sport
-        results = list(prolog.query(f"sport_format('{sport}', Format)"))
-        formats = [result['Format'] for result in results]
-        
-        return jsonify({
-            "formats": formats
-        })
-    except Exception as e:
-        print(f"Error in get_sport_formats: {str(e)}")
-        return jsonify({
-            "formats": ['tournament', 'league', 'friendly']
-        })
+    return catalog_response(catalog.formats_entry(sport))
 
 @app.route('/api/competition_levels', methods=['GET'])
 def get_competition_levels():
-    try:
-        # Query Prolog for competition levels
-        results = list(prolog.query("competition_level(Level)"))
-        levels = [result['Level'] for result in results]
-        
-        return jsonify({
-            "levels": levels
-        })
-    except Exception as e:
-        print(f"Error in get_competition_levels: {str(e)}")
-        return jsonify({
-            "levels": ['international', 'national', 'state', 'club']
-        })
+    return catalog_response(catalog.entries['competition_levels'])
 
 @app.route('/api/fitness_levels', methods=['GET'])
 def get_fitness_levels():
-    # Query Prolog for fitness levels
-    results = list(prolog.query("fitness_level(Level)"))
-    levels = [result['Level'] for result in results]
-    
-    return jsonify({
-        "fitnessLevels": levels
-    })
+    return catalog_response(catalog.entries['fitness_levels'])
 
 @app.route('/api/diet_types', methods=['GET'])
 def get_diet_types():
-    # Query Prolog for diet types
-    results = list(prolog.query("diet_type(Type)"))
-    types = [result['Type'] for result in results]
-    
-    return jsonify({
-        "dietTypes": types
-    })
+    return catalog_response(catalog.entries['diet_types'])
 
 @app.route('/api/injury_types', methods=['GET'])
 def get_injury_types():
-    # Query Prolog for injury types
-    results = list(prolog.query("injury_type(Type)"))
-    types = [result['Type'] for result in results]
-    
-    return jsonify({
-        "injuryTypes": types
-    })
+    return catalog_response(catalog.entries['injury_types'])
 
 @app.route('/api/recovery_statuses', methods=['GET'])
 def get_recovery_statuses():
-    # Query Prolog for recovery statuses
-    results = list(prolog.query("recovery_status(Status)"))
-    statuses = [result['Status'] for result in results]
-    
-    return jsonify({
-        "recoveryStatuses": statuses
-    })
+    return catalog_response(catalog.entries['recovery_statuses'])
+
+# History reads are paged inside the engine: the date range and the
+# type/category filter are part of the query and only one page of solutions
+# crosses the pipe, however long an athlete's history is. The 'after'
+# cursor is the position of the last record a page returned (records are
+# numbered in the order they were logged), so a page resumes right there
+# instead of skipping the records before it.
+HISTORY_PAGE_SIZE = int(os.environ.get("COACH_HISTORY_PAGE_SIZE", 200))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("COACH_HISTORY_MAX_PAGE_SIZE", 1000))
+
+# (predicate, (JSON field, Prolog variable) pairs, field that can be filtered)
+HISTORIES = {
+    'injuries': ('injury_history', (
+        ('type', 'Type'), ('date', 'Date'), ('severity', 'Severity'),
+        ('recoveryTime', 'RecoveryTime'), ('notes', 'Notes'),
+    ), 'type'),
+    'achievements': ('achievement_history', (
+        ('title', 'Title'), ('date', 'Date'), ('category', 'Category'),
+        ('description', 'Description'),
+    ), 'category'),
+}
+
+def history_filters(kind):
+    # Returns (filters, after, limit, error message); limit is None when not given
+    _, _, filter_field = HISTORIES[kind]
+    try:
+        after = int(request.args.get('after', 0))
+        limit = request.args.get('limit')
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        return None, None, None, 'after and limit must be integers'
+    if after < 0 or (limit is not None and not 1 <= limit <= HISTORY_MAX_PAGE_SIZE):
+        return None, None, None, f'after must be >= 0 and limit between 1 and {HISTORY_MAX_PAGE_SIZE}'
+    filters = {
+        'from': request.args.get('from', ''),
+        'to': request.args.get('to', ''),
+        filter_field: request.args.get(filter_field, ''),
+    }
+    return filters, after, limit, None
+
+def history_page(kind, user_id, filters, after, limit):
+    # Up to limit records logged after position 'after', as (position, record) pairs
+    predicate, fields, filter_field = HISTORIES[kind]
+    # A filtered field is passed bound; every other field comes back as a binding
+    value = filters[filter_field]
+    args = [value if name == filter_field and value else Var(var) for name, var in fields]
+    query = goal(predicate, user_id, filters['from'], filters['to'], after, limit, *args, Var("Position"))
+    return [
+        (result['Position'], {name: result.get(var, value) for name, var in fields})
+        for result in engine.query(query, user_id=user_id)
+    ]
+
+def wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+def stream_ndjson(records, description):
+    # One JSON document per line, produced as the records are
+    try:
+        for record in records:
+            yield json.dumps(record) + "\n"
+    except Exception as e:
+        # The status line is already sent, so the error cannot become a
+        # status code. Re-raising aborts the response instead of ending it
+        # cleanly, and the client sees a broken transfer, not a short one.
+        app.logger.exception("Error streaming %s: %s", description, e)
+        raise
+
+def history_pages(kind, user_id, filters, after, limit):
+    # One engine page at a time until the history (or the limit) runs out
+    while limit is None or limit > 0:
+        size = HISTORY_PAGE_SIZE if limit is None else min(limit, HISTORY_PAGE_SIZE)
+        page = history_page(kind, user_id, filters, after, size)
+        yield page
+        if len(page) < size:
+            return
+        after = page[-1][0]
+        if limit is not None:
+            limit -= size
+
+def history_records(kind, user_id, filters, after, limit):
+    # The first page is read before the response starts, so a busy or
+    # over-budget engine still answers 503/504; later pages are read as the
+    # client consumes the stream
+    pages = history_pages(kind, user_id, filters, after, limit)
+    first = next(pages)
+    return (record for page in itertools.chain([first], pages) for _, record in page)
+
+def stream_history(kind, user_id, filters, after, limit):
+    return stream_ndjson(history_records(kind, user_id, filters, after, limit), f"{kind} for user {user_id}")
+
+def json_array(lines):
+    # NDJSON lines as one JSON array. After a failure the array is never
+    # closed, so it cannot pass for the complete result.
+    yield "["
+    for index, line in enumerate(lines):
+        yield ("," if index else "") + line.rstrip("\n")
+    yield "]"
+
+def history_response(kind, user_id):
+    filters, after, limit, error = history_filters(kind)
+    if error:
+        return jsonify({'error': error}), 400
+    if wants_ndjson():
+        return Response(
+            stream_with_context(stream_history(kind, user_id, filters, after, limit)),
+            mimetype='application/x-ndjson',
+        )
+    if 'after' not in request.args and 'limit' not in request.args:
+        # Callers that do not page get every record, as before paging existed
+        return Response(
+            stream_with_context(json_array(stream_history(kind, user_id, filters, 0, None))),
+            mimetype='application/json',
+        )
+
+    # One extra record tells whether there is a next page
+    limit = limit or HISTORY_PAGE_SIZE
+    page = history_page(kind, user_id, filters, after, limit + 1)
+    records = [record for _, record in page[:limit]]
+    log_payload(f"Fetched {kind}", userId=user_id, results=records)
+    response = jsonify(records)
+    if len(page) > limit:
+        cursor = page[limit - 1][0]
+        args = {**request.args.to_dict(), 'after': cursor, 'limit': limit}
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['Link'] = f'<{url_for(request.endpoint, user_id=user_id, **args)}>; rel="next"'
+    return response
 
 @app.route('/api/injuries/<user_id>', methods=['GET', 'POST'])
 def handle_injuries(user_id):
     if request.method == 'GET':
         try:
-            print(f"Fetching injuries for user {user_id}")
-            # Query Prolog for user's injuries
-            query = f"user_injury('{user_id}', Type, Date, Severity, RecoveryTime, Notes)"
-            print(f"Executing query: {query}")
-            results = list(prolog.query(query))
-            print(f"Query results: {results}")
-            
-            injuries = [{
-                'type': result['Type'],
-                'date': result['Date'],
-                'severity': result['Severity'],
-                'recoveryTime': result['RecoveryTime'],
-                'notes': result['Notes']
-            } for result in results]
-            
-            return jsonify(injuries)
+            app.logger.debug("Fetching injuries for user %s", user_id)
+            # One page of the user's injuries, oldest first
+            return history_response('injuries', user_id)
+        except (EngineBusy, QueryBudgetExceeded):
+            raise
         except Exception as e:
-            print(f"Error fetching injuries: {str(e)}")
+            app.logger.exception("Error fetching injuries: %s", e)
             return jsonify([])
     
     elif request.method == 'POST':
         try:
             data = request.json
-            print(f"Adding injury for user {user_id}: {data}")
+            log_payload("Adding injury", userId=user_id, data=data)
             
             # Extract injury data
             injury_type = data.get('type', '')
@@ -404,43 +1043,72 @@ def handle_injuries(user_id):
             recovery_time = data.get('recoveryTime', '')
             notes = data.get('notes', '')
             
+            if invalid_value('injury_type', injury_type):
+                return write_error('invalid_injury_type', injury_type)
+            
             # Assert injury in Prolog
-            query = f"add_injury('{user_id}', '{injury_type}', '{date}', '{severity}', '{recovery_time}', '{notes}')"
-            print(f"Executing query: {query}")
-            results = list(prolog.query(query))
-            print(f"Query results: {results}")
+            query = goal("api_add_injury", user_id, injury_type, date, severity, recovery_time, text(notes), Var("Status"))
+            with roster.writing():
+                status = write_status(persistence.write(user_id, query))
+                if status == 'ok':
+                    roster.add_injury(injury_type, severity, recovery_status_of(notes))
+            app.logger.debug("Added injury for user %s: %s", user_id, status)
+            if status != 'ok':
+                return write_error(status)
+            plan_changed(user_id, 'injury')
             
             return jsonify({
+                'status': status,
                 'type': injury_type,
                 'date': date,
                 'severity': severity,
                 'recoveryTime': recovery_time,
                 'notes': notes
             })
+        except (EngineBusy, QueryBudgetExceeded):
+            raise
         except Exception as e:
-            print(f"Error adding injury: {str(e)}")
+            app.logger.exception("Error adding injury: %s", e)
             return jsonify({
                 "error": "Failed to add injury"
             }), 400
 
+@app.route('/api/achievements', methods=['GET'])
+def search_achievements():
+    # Across the whole roster, from the achievement index: newest first,
+    # filtered by category/sport/level and a from/to date range, or titles
+    # starting with q. 'after' is the 'next' cursor of the previous page.
+    try:
+        limit = int(request.args.get('limit', 20))
+        after = int(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}'}), 400
+
+    if 'q' in request.args:
+        entries, cursor = achievement_index.search(request.args['q'], limit, after)
+    else:
+        entries, cursor = achievement_index.top(
+            limit, after,
+            start=request.args.get('from') or None,
+            end=request.args.get('to') or None,
+            category=request.args.get('category'),
+            sport=request.args.get('sport'),
+            level=request.args.get('level'),
+        )
+    return jsonify({'achievements': entries, 'next': cursor})
+
 @app.route('/api/achievements/<user_id>', methods=['GET', 'POST'])
 def handle_achievements(user_id):
     if request.method == 'GET':
         try:
-            # Query Prolog for user's achievements
-            query = f"user_achievement('{user_id}', Title, Date, Category, Description)"
-            results = list(prolog.query(query))
-            
-            achievements = [{
-                'title': result['Title'],
-                'date': result['Date'],
-                'category': result['Category'],
-                'description': result['Description']
-            } for result in results]
-            
-            return jsonify(achievements)
+            # One page of the user's achievements, oldest first
+            return history_response('achievements', user_id)
+        except (EngineBusy, QueryBudgetExceeded):
+            raise
         except Exception as e:
-            print(f"Error fetching achievements: {str(e)}")
+            app.logger.exception("Error fetching achievements: %s", e)
             return jsonify([])
     
     elif request.method == 'POST':
@@ -454,27 +1122,163 @@ def handle_achievements(user_id):
             description = data.get('description', '')
             
             # Assert achievement in Prolog
-            query = f"add_achievement('{user_id}', '{title}', '{date}', '{category}', '{description}')"
-            list(prolog.query(query))
+            query = goal("api_add_achievement", user_id, title, date, category, text(description), Var("Status"))
+            status = write_status(persistence.write(user_id, query))
+            if status != 'ok':
+                return write_error(status)
+            achievement_index.add(user_id, title, date, category, description)
             
             return jsonify({
+                'status': status,
                 'title': title,
                 'date': date,
                 'category': category,
                 'description': description
             })
+        except (EngineBusy, QueryBudgetExceeded):
+            raise
         except Exception as e:
-            print(f"Error adding achievement: {str(e)}")
+            app.logger.exception("Error adding achievement: %s", e)
             return jsonify({
                 "error": "Failed to add achievement"
             }), 400
 
+# Longest session that can be logged, in minutes
+MAX_SESSION_MINUTES = 24 * 60
+
+def parse_session(item):
+    # Returns ((date, minutes, rpe, sport), None) or (None, error message)
+    if not isinstance(item, dict):
+        return None, 'sessions must be objects'
+    try:
+        day = date.fromisoformat(str(item.get('date', '')))
+    except ValueError:
+        return None, 'date must be YYYY-MM-DD'
+    minutes, rpe, sport = item.get('duration'), item.get('rpe'), item.get('sport')
+    if isinstance(minutes, bool) or not isinstance(minutes, (int, float)) or not 0 < minutes <= MAX_SESSION_MINUTES:
+        return None, f'duration must be between 0 and {MAX_SESSION_MINUTES} minutes'
+    if isinstance(rpe, bool) or not isinstance(rpe, (int, float)) or not 0 <= rpe <= 10:
+        return None, 'rpe must be between 0 and 10'
+    if invalid_value('sport', sport):
+        return None, f'Invalid sport: {sport}'
+    return (day, float(minutes), float(rpe), sport), None
+
+# user -> (day, sessions, ACWR) covered by the user's workload fact
+workload_facts = {}
+
+def write_workload(user_id, as_of, pending=()):
+    # The plan logic sees the current acute:chronic ratio as a fact. The
+    # session count is read first, so a concurrent append can only make the
+    # fact look stale, never fresh.
+    logged = session_store.count(user_id) + len(pending)
+    current = session_store.workload(user_id, as_of, weeks=1, pending=pending)['current']
+    acwr = current['acwr'] if current['acwr'] is not None else 'none'
+    status = write_status(persistence.write(user_id, goal("api_set_workload", user_id, acwr, Var("Status"))))
+    if status == 'ok':
+        previous = workload_facts.get(user_id)
+        workload_facts[user_id] = (as_of, logged, acwr)
+        if previous is None or previous[2] != acwr:
+            plan_changed(user_id, 'workload')
+    return status, current
+
+def refresh_workload(user_id):
+    # The ratio moves with the calendar even when nothing is logged, so the
+    # fact is recomputed once it covers an earlier day or fewer sessions
+    logged = session_store.count(user_id)
+    if not logged:
+        return
+    fact = workload_facts.get(user_id)
+    if fact is None or fact[:2] != (date.today(), logged):
+        write_workload(user_id, date.today())
+
+@app.route('/api/sessions/<user_id>', methods=['GET', 'POST'])
+def handle_sessions(user_id):
+    if request.method == 'GET':
+        try:
+            start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+            end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+        except ValueError:
+            return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+        return jsonify(session_store.sessions(user_id, start, end))
+
+    # One session, or {"sessions": [...]} to backfill a training log
+    data = request.json
+    items = data.get('sessions', [data]) if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Expected a session or a list of sessions'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} sessions per request'}), 413
+    sessions = []
+    for index, item in enumerate(items):
+        session, error = parse_session(item)
+        if error:
+            return jsonify({'error': error, 'index': index}), 400
+        sessions.append(session)
+
+    try:
+        if not engine.query(goal("known_user", user_id), user_id=user_id):
+            return write_error('unknown_user')
+        # The engine write goes first: if it fails, nothing is logged and a
+        # retry cannot duplicate the sessions
+        status, current = write_workload(user_id, date.today(), sessions)
+        if status != 'ok':
+            return write_error(status)
+        session_store.append(user_id, sessions)
+        return jsonify({'status': status, 'logged': len(sessions), 'workload': current})
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
+    except Exception as e:
+        app.logger.error(f"Error logging sessions: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to log sessions'}), 500
+
+@app.route('/api/workload/<user_id>', methods=['GET'])
+def get_workload(user_id):
+    # Weekly volume, monotony, strain and ACWR from the session log
+    try:
+        weeks = int(request.args.get('weeks', 12))
+        as_of = date.fromisoformat(request.args['asOf']) if 'asOf' in request.args else date.today()
+    except ValueError:
+        return jsonify({'error': 'weeks must be an integer and asOf YYYY-MM-DD'}), 400
+    if not 1 <= weeks <= 520:
+        return jsonify({'error': 'weeks must be between 1 and 520'}), 400
+    return jsonify(session_store.workload(user_id, as_of, weeks))
+
+@app.route('/api/calendar/<user_id>', methods=['GET'])
+def get_calendar(user_id):
+    # Periodized weeks (base, build, peak, taper, recovery) from the week of
+    # 'from' (default this week). Only the requested weeks are built; with
+    # format=ndjson they stream one per line as they are generated.
+    try:
+        weeks = int(request.args.get('weeks', CALENDAR_DEFAULT_WEEKS))
+        first = date.fromisoformat(request.args['from']) if 'from' in request.args else date.today()
+    except ValueError:
+        return jsonify({'error': 'weeks must be an integer and from YYYY-MM-DD'}), 400
+    if not 1 <= weeks <= CALENDAR_MAX_WEEKS:
+        return jsonify({'error': f'weeks must be between 1 and {CALENDAR_MAX_WEEKS}'}), 400
+
+    try:
+        inputs = training_calendar.inputs(user_id)
+        if inputs is None:
+            return jsonify({'error': 'User not found. Please complete your profile setup first.'}), 404
+        calendar = training_calendar.weeks(user_id, inputs, first, weeks)
+        if wants_ndjson():
+            return Response(
+                stream_with_context(stream_ndjson(calendar, f"the training calendar for user {user_id}")),
+                mimetype='application/x-ndjson',
+            )
+        return jsonify({**inputs, 'weeks': list(calendar)})
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
+    except Exception as e:
+        app.logger.error(f"Error building training calendar: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Could not build the training calendar.'}), 500
+
 @app.route('/api/injury_recommendations/<user_id>', methods=['GET'])
 def get_injury_recommendations(user_id):
     try:
         # Query Prolog for injury recommendations
-        query = f"get_injury_recommendations('{user_id}', Recommendations)"
-        result = list(prolog.query(query))
+        query = goal("get_injury_recommendations", user_id, Var("Recommendations"))
+        result = engine.query(query, user_id=user_id)
         
         if not result:
             return jsonify({'recommendations': []})
@@ -482,27 +1286,202 @@ def get_injury_recommendations(user_id):
         recommendations = result[0]['Recommendations']
         return jsonify({'recommendations': recommendations})
         
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
     except Exception as e:
         app.logger.error(f"Error getting injury recommendations: {str(e)}")
         return jsonify({'error': 'Failed to get injury recommendations'}), 500
 
+@app.route('/api/analytics/roster', methods=['GET'])
+def get_roster_analytics():
+    # Served from the counters; never touches the engines
+    return jsonify(roster.snapshot())
+
+@app.route('/api/analytics/roster/check', methods=['POST'])
+def check_roster_analytics():
+    # Recount everything from the fact base and report any drift
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        before, after = roster.rebuild(engine)
+    except (EngineBusy, QueryBudgetExceeded):
+        raise
+    except Exception as e:
+        app.logger.error(f"Error rebuilding roster counters: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to rebuild roster counters'}), 500
+    if before != after:
+        app.logger.warning("Roster counters had drifted from the fact base and were rebuilt")
+    return jsonify({'consistent': before == after, 'previous': before, 'rebuilt': after})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'planCache': plan_cache.stats(), 'calendarCache': calendar_cache.stats()})
+
+@metrics.collector
+def engine_metrics():
+    yield ('coach_engine_queue_depth', 'gauge', 'Requests sent to an engine worker and not yet answered',
+           ('worker',), [((worker.name,), worker.pending) for worker in engine.workers])
+
+    calls = {}
+    facts = {}
+    violations = {}
+    memory = []
+    for worker, stats in engine.stats():
+        memory.append((worker.name, stats['memory']))
+        for limit, count in stats['budget_violations'].items():
+            violations[limit] = violations.get(limit, 0) + count
+        for predicate, (count, inferences, cputime) in stats['predicates'].items():
+            totals = calls.setdefault(predicate, [0, 0, 0.0])
+            totals[0] += count
+            totals[1] += inferences
+            totals[2] += cputime
+        for predicate, count in stats['facts'].items():
+            facts[predicate] = facts.get(predicate, 0) + count
+
+    yield ('coach_prolog_queries_total', 'counter', 'Goals run by the engines',
+           ('predicate',), [((p,), totals[0]) for p, totals in calls.items()])
+    yield ('coach_prolog_inferences_total', 'counter', 'Inferences spent running goals, from statistics/2',
+           ('predicate',), [((p,), totals[1]) for p, totals in calls.items()])
+    yield ('coach_prolog_cpu_seconds_total', 'counter', 'Engine CPU time spent running goals, from statistics/2',
+           ('predicate',), [((p,), totals[2]) for p, totals in calls.items()])
+    yield ('coach_engine_budget_exceeded_total', 'counter', 'Goals cancelled by the engines for exceeding a budget',
+           ('limit',), [((limit,), count) for limit, count in violations.items()])
+    yield ('coach_athlete_facts', 'gauge', 'Dynamic athlete facts held by the engines',
+           ('predicate',), [((p,), count) for p, count in facts.items()])
+    yield ('coach_engine_atoms', 'gauge', "Atoms in each engine's atom table",
+           ('worker',), [((name,), usage['Atoms']) for name, usage in memory])
+    yield ('coach_engine_memory_bytes', 'gauge', 'Engine memory held by atoms and by clauses',
+           ('worker', 'space'), [((name, space), usage[var]) for name, usage in memory
+                                 for space, var in (('atom', 'AtomSpace'), ('program', 'ProgramSpace'))])
+    yield ('coach_user_keys', 'gauge', 'User IDs mapped to integer fact keys', (), [((), len(user_keys))])
+
+@metrics.collector
+def cache_metrics():
+    stats = plan_cache.stats()
+    yield ('coach_plan_cache_hits_total', 'counter', 'Plan cache hits', (), [((), stats['hits'])])
+    yield ('coach_plan_cache_misses_total', 'counter', 'Plan cache misses', (), [((), stats['misses'])])
+    yield ('coach_plan_cache_evictions_total', 'counter', 'Plans evicted from the cache', (), [((), stats['evictions'])])
+    yield ('coach_plan_cache_hit_ratio', 'gauge', 'Share of plan lookups served from the cache', (), [((), stats['hitRate'])])
+    yield ('coach_plan_cache_size', 'gauge', 'Plans currently cached', (), [((), stats['size'])])
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    return jsonify({'status': 'ok'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_probe():
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
+def admin_denied():
+    # Admin routes need COACH_ADMIN_TOKEN in X-Admin-Token, and stay closed
+    # when no token is configured
+    token = os.environ.get("COACH_ADMIN_TOKEN")
+    if not token:
+        return jsonify({'error': 'Admin routes are disabled; set COACH_ADMIN_TOKEN'}), 403
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+reload_lock = threading.Lock()
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_knowledge_base():
+    denied = admin_denied()
+    if denied:
+        return denied
+    if not reload_lock.acquire(blocking=False):
+        return jsonify({'error': 'A reload is already running'}), 409
+    try:
+        started = time.perf_counter()
+        athletes = engine.reload()
+        build_static_views()
+        seconds = round(time.perf_counter() - started, 3)
+        app.logger.warning("Knowledge base reloaded in %ss, %s athletes kept", seconds, athletes)
+        return jsonify({'status': 'reloaded', 'athletes': athletes, 'seconds': seconds})
+    except KnowledgeBaseError as e:
+        # The running rules are untouched
+        app.logger.error(f"Knowledge base reload refused: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error reloading knowledge base: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Reload failed'}), 500
+    finally:
+        reload_lock.release()
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def profiling():
+    # GET: settings and the stored profiles, newest first. POST: change the
+    # sampling with {"sampleRate": 0.01, "endpoints": ["get_plan"]}.
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        data = request.json or {}
+        sample_rate = data.get('sampleRate', request_profiler.sample_rate)
+        endpoints = data.get('endpoints', request_profiler.endpoints)
+        if not isinstance(sample_rate, (int, float)) or not 0 <= sample_rate <= 1:
+            return jsonify({'error': 'sampleRate must be between 0 and 1'}), 400
+        if endpoints is not None and (not isinstance(endpoints, (list, set))
+                                      or any(endpoint not in app.view_functions for endpoint in endpoints)):
+            return jsonify({'error': 'endpoints must be a list of endpoint names'}), 400
+        request_profiler.sample_rate = float(sample_rate)
+        request_profiler.endpoints = set(endpoints) if endpoints else None
+        app.logger.warning("Request profiling set to %s", request_profiler.settings())
+    return jsonify({
+        'settings': request_profiler.settings(),
+        'profiles': [
+            dict(request_profiler.summary(profile_id),
+                 report=url_for('get_profile', profile_id=profile_id),
+                 python=url_for('download_python_profile', profile_id=profile_id))
+            for profile_id in request_profiler.list()
+        ],
+    })
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = request_profiler.path(profile_id, 'report.json')
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/json')
+
+@app.route('/api/admin/profiles/<profile_id>/python.prof', methods=['GET'])
+def download_python_profile(profile_id):
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = request_profiler.path(profile_id, 'python.prof')
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.prof")
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/chatbot', methods=['POST'])
 def chatbot_query():
     try:
         data = request.json
         question = data.get('question', '')
 
-        # Query Prolog for an answer
-        results = list(prolog.query(f"chatbot_response('{question}', Response)"))
-        if results:
-            response = results[0]['Response']
-        else:
+        # Closest known question, if it is close enough
+        response, confidence = chatbot_index.answer(question)
+        if response is None:
             response = "I'm sorry, I don't have an answer for that."
 
-        return jsonify({"response": response})
+        return jsonify({"response": response, "confidence": round(confidence, 3)})
     except Exception as e:
         app.logger.error(f"Error in chatbot_query: {str(e)}")
         return jsonify({"response": "An error occurred while processing your question."}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Startup already ran on import; the reloader would import this module
+    # again in a child process and start a second engine pool and
+    # persistence over the same data dir
+    app.run(debug=True, use_reloader=False)
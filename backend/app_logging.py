@@ -0,0 +1,100 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Request threads only enqueue log records; a background listener formats
+# them as one JSON object per line and writes them out. Full payloads (plans,
+# result lists) are logged only for the share of requests each route samples.
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    # The stock QueueHandler formats the message in the calling thread;
+    # leave all formatting to the listener instead
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(level=None, stream=None, background=True):
+    global _listener
+    level = level or os.environ.get("COACH_LOG_LEVEL", "INFO")
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    if background:
+        records = queue.SimpleQueue()
+        _listener = QueueListener(records, handler)
+        _listener.start()
+        root.addHandler(DeferredQueueHandler(records))
+    else:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def stop_logging():
+    # Flushes whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def parse_rates(spec):
+    # "get_plan=0.01,handle_injuries=1" -> {'get_plan': 0.01, 'handle_injuries': 1.0}
+    rates = {}
+    for item in (spec or "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class PayloadSampler:
+    # Per-route sampling rates for payload dumps, keyed by endpoint name
+
+    def __init__(self, rates=None, default=0.0):
+        self.rates = dict(rates or {})
+        self.default = default
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            parse_rates(os.environ.get("COACH_LOG_PAYLOADS")),
+            float(os.environ.get("COACH_LOG_PAYLOADS_DEFAULT", 0.0)),
+        )
+
+    def sample(self, route):
+        rate = self.rates.get(route, self.default)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
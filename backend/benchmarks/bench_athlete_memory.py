@@ -0,0 +1,129 @@
+"""Engine memory per athlete at growing roster sizes, before and after compact facts.
+
+Each representation is loaded into a fresh engine process of its own, so the
+atom table starts out the same for both. Athletes are written with the same
+goals the API sends (import_athlete/11 plus two api_add_achievement/6):
+
+  before  user ID as a UUID atom, name, injury notes and achievement
+          descriptions as atoms
+  after   user ID as its integer key, free text as Prolog strings
+
+At each roster size the engine's statistics/2 atom_space and program_space
+are read; the figure reported is the growth over the empty knowledge base,
+divided by the number of athletes. "after" also counts the Python-side map
+from user IDs to keys (UserKeys), measured with tracemalloc:
+
+    cd backend && python benchmarks/bench_athlete_memory.py --sizes 100000,1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report import save_results
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+SCHEMES = ('before', 'after')
+
+
+def athlete_goals(scheme, index, user_id, key):
+    from prolog_terms import Text, Var, goal
+
+    def free(value):
+        return value if scheme == 'before' else Text(value)
+
+    subject = user_id if scheme == 'before' else key
+    injuries = [
+        ['muscle_strain', '2024-03-0%d' % (n + 1), 'moderate', '2 weeks',
+         free(f"Felt tightness in the last sprint of session {index}-{n}")]
+        for n in range(2)
+    ]
+    yield goal("import_athlete", subject, free(f"Athlete {index}"), 20 + index % 20, 'female', 170, 65,
+               'intermediate', ['running', 'intermediate'], ['balanced', []], [], injuries)
+    for n in range(2):
+        yield goal("api_add_achievement", subject, 'Regional 10k', '2024-05-1%d' % n, 'competition',
+                   free(f"Finished {index % 50 + n + 1} of {index % 50 + 80}, new personal best"), Var("Status"))
+
+
+def measure(scheme, sizes):
+    # Runs in its own process: grows one roster and prints the measurements
+    from pyswip import Prolog
+
+    from prolog_runner import GoalRunner
+    from prolog_terms import Var, goal
+    from user_keys import UserKeys
+
+    Prolog().consult(KB_PATH)
+    runner = GoalRunner()
+    memory_goal = goal("engine_memory", Var("Atoms"), Var("AtomSpace"), Var("ProgramSpace"))
+    base = runner.run(memory_goal)[0]
+
+    directory = tempfile.mkdtemp()
+    keys = UserKeys(os.path.join(directory, "users.keys"), fsync=False)
+    keys.load()
+    tracemalloc.start()
+    map_base = tracemalloc.get_traced_memory()[0]
+
+    rows = {}
+    loaded = 0
+    for size in sizes:
+        started = time.perf_counter()
+        for index in range(loaded, size):
+            user_id = str(uuid.uuid4())
+            key = keys.assign([user_id])[0] if scheme == 'after' else None
+            for athlete_goal in athlete_goals(scheme, index, user_id, key):
+                if not runner.run(athlete_goal):
+                    raise RuntimeError(f"{athlete_goal.name} failed for athlete {index}")
+        loaded = size
+        usage = runner.run(memory_goal)[0]
+        map_bytes = tracemalloc.get_traced_memory()[0] - map_base if scheme == 'after' else 0
+        rows[size] = {
+            'load_seconds': round(time.perf_counter() - started, 3),
+            'atoms': usage['Atoms'] - base['Atoms'],
+            'atom_space': usage['AtomSpace'] - base['AtomSpace'],
+            'program_space': usage['ProgramSpace'] - base['ProgramSpace'],
+            'key_map': map_bytes,
+        }
+    keys.close()
+    print(json.dumps(rows))
+
+
+def run_scheme(scheme, sizes):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", scheme, "--sizes", ",".join(map(str, sizes))],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return {int(size): row for size, row in json.loads(output.strip().splitlines()[-1]).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--measure", choices=SCHEMES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    if args.measure:
+        measure(args.measure, sizes)
+        return
+
+    results = {}
+    for scheme in SCHEMES:
+        results[scheme] = {}
+        for size, row in run_scheme(scheme, sizes).items():
+            total = row['atom_space'] + row['program_space'] + row['key_map']
+            results[scheme][size] = dict(row, bytes_per_athlete=round(total / size, 1))
+            print(f"{scheme:<7} {size:>9} athletes: {row['atoms'] / size:6.2f} atoms, "
+                  f"atoms {row['atom_space'] / size:7.1f} B, clauses {row['program_space'] / size:7.1f} B, "
+                  f"key map {row['key_map'] / size:6.1f} B = {total / size:7.1f} B/athlete")
+    save_results("athlete_memory", {'sizes': sizes}, results)
+
+
+if __name__ == "__main__":
+    main()
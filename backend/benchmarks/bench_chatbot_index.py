@@ -0,0 +1,54 @@
+"""Chatbot lookup latency as the Q&A corpus grows.
+
+Builds indexes over synthetic corpora of increasing size (plus the real
+questions from the knowledge base) and times single-question lookups:
+
+    cd backend && python benchmarks/bench_chatbot_index.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_index import ChatbotIndex
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+SIZES = (100, 1000, 10000, 50000)
+LOOKUPS = 2000
+
+
+def kb_pairs():
+    with open(KB_PATH, encoding="utf-8") as f:
+        return re.findall(r"^chatbot_response\('(.*?)', '(.*?)'\)\.", f.read(), re.M)
+
+
+def synthetic_pairs(count, seed=7):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(5000)] + "running swimming injury recovery diet protein knee ankle".split()
+    return [
+        (" ".join(rng.choice(words) for _ in range(rng.randint(4, 10))), f"answer {i}")
+        for i in range(count)
+    ]
+
+
+def main():
+    real = kb_pairs()
+    questions = [question.replace("what", "tell me") for question, _ in real]
+    for size in SIZES:
+        pairs = real + synthetic_pairs(size)
+        started = time.perf_counter()
+        index = ChatbotIndex(pairs)
+        built = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(LOOKUPS):
+            index.answer(questions[i % len(questions)])
+        per_lookup = (time.perf_counter() - started) / LOOKUPS
+        print(f"{len(pairs):>7} questions  build {built:6.2f}s  lookup {per_lookup * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Request latency with the different logging setups.
+
+A Flask route shaped like /api/plan (builds a plan-sized payload, logs it,
+returns it) is timed through the test client with:
+
+  old      DEBUG level, synchronous handler, eager f-string payload logs
+  queued   background JSON logging with every payload logged
+  sampled  background JSON logging, payloads sampled at the default rate
+  off      logging disabled
+
+Log output goes to a temporary file, as it would to a redirected stdout:
+
+    cd backend && python benchmarks/bench_logging.py [requests]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from app_logging import PayloadSampler, configure_logging, stop_logging
+
+PLAN = {
+    'trainingPlan': [{'description': f'Training item {i} ' + 'x' * 80, 'details': []} for i in range(12)],
+    'nutritionPlan': [{'description': f'Nutrition item {i} ' + 'y' * 80, 'details': []} for i in range(10)],
+    'injuryRecommendations': [{'description': f'Recovery item {i} ' + 'z' * 80, 'details': []} for i in range(5)],
+}
+
+
+def make_app(mode, sampler):
+    app = Flask(__name__)
+
+    @app.route('/api/plan/<user_id>')
+    def get_plan(user_id):
+        if mode == 'old':
+            app.logger.info(f"Fetching plan for user: {user_id}")
+            app.logger.info(f"Generated training plan: {PLAN['trainingPlan']}")
+            app.logger.info(f"Generated nutrition plan: {PLAN['nutritionPlan']}")
+            app.logger.info(f"Generated injury recommendations: {PLAN['injuryRecommendations']}")
+        else:
+            app.logger.debug("Fetching plan for user: %s", user_id)
+            if sampler.sample('get_plan'):
+                app.logger.info("Generated plan", extra={'fields': {'userId': user_id, 'plan': PLAN}})
+        return jsonify(PLAN)
+
+    return app
+
+
+def run(mode, requests, log_file):
+    root = logging.getLogger()
+    if mode == 'old':
+        stop_logging()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.StreamHandler(log_file))
+        root.setLevel(logging.DEBUG)
+        sampler = None
+    elif mode == 'off':
+        configure_logging(level=logging.CRITICAL, stream=log_file)
+        sampler = PayloadSampler()
+    else:
+        configure_logging(level=logging.INFO, stream=log_file)
+        sampler = PayloadSampler(default=1.0 if mode == 'queued' else 0.0)
+
+    client = make_app(mode, sampler).test_client()
+    client.get('/api/plan/warmup')
+    started = time.perf_counter()
+    for i in range(requests):
+        client.get(f'/api/plan/user-{i}')
+    elapsed = time.perf_counter() - started
+    stop_logging()
+    return elapsed / requests
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    with tempfile.TemporaryFile('w') as log_file:
+        for mode in ('old', 'queued', 'sampled', 'off'):
+            print(f"{mode:<8} {run(mode, requests, log_file) * 1e6:8.1f} us/request")
+
+
+if __name__ == '__main__':
+    main()
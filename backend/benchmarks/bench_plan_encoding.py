@@ -0,0 +1,103 @@
+"""Serialization cost per plan response, before and after pre-encoded fragments.
+
+Plans are made of the recommendation texts in the knowledge base. Two costs
+are timed for each encoder:
+
+  build   turn a get_full_plan/4 solution into a response body (a new plan)
+  serve   produce the body for a plan that is already cached (every request)
+
+"before" is the old path: a dict of {'description', 'details'} items passed
+to jsonify. "fragments" assembles the body from per-text fragments encoded
+once, with the standard library encoder and, if installed, with orjson:
+
+    cd backend && python benchmarks/bench_plan_encoding.py [iterations]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+import plan_encoding
+from plan_encoding import PlanFragments
+from report import save_results
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+VERSIONS = {'trainingPlan': 3, 'nutritionPlan': 1, 'injuryRecommendations': 2}
+
+
+def kb_texts():
+    # Quoted recommendation texts inside the knowledge base's list facts
+    with open(KB_PATH, encoding="utf-8") as f:
+        return sorted(set(re.findall(r"^\s+['\"]([^'\"]{20,})['\"],?$", f.read(), re.M)))
+
+
+def sample_results(texts, count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'TrainingPlan': rng.sample(texts, 10),
+        'NutritionPlan': rng.sample(texts, 10),
+        'InjuryRecommendations': rng.sample(texts, 3),
+    } for _ in range(count)]
+
+
+def old_format(result):
+    return {
+        'trainingPlan': [{'description': str(item), 'details': []} for item in result['TrainingPlan']],
+        'nutritionPlan': [{'description': str(item), 'details': []} for item in result['NutritionPlan']],
+        'injuryRecommendations': [{'description': str(item), 'details': []} for item in result['InjuryRecommendations']],
+    }
+
+
+def timed(function, items, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for item in items:
+            function(item)
+    return (time.perf_counter() - started) / (iterations * len(items)) * 1e6
+
+
+def run_before(results, iterations):
+    app = Flask(__name__)
+    with app.app_context():
+        build = timed(lambda result: jsonify({**old_format(result), 'versions': VERSIONS}).get_data(), results, iterations)
+        plans = [old_format(result) for result in results]
+        serve = timed(lambda plan: jsonify({**plan, 'versions': VERSIONS}).get_data(), plans, iterations)
+    return build, serve
+
+
+def run_fragments(texts, results, iterations):
+    fragments = PlanFragments(texts)
+    build = timed(lambda result: fragments.plan(result).body(VERSIONS), results, iterations)
+    plans = [fragments.plan(result) for result in results]
+    serve = timed(lambda plan: plan.body(VERSIONS), plans, iterations)
+    return build, serve
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    texts = kb_texts()
+    results = sample_results(texts, 50)
+    print(f"{len(texts)} recommendation texts, {len(results)} plans x {iterations} iterations")
+
+    timings = {'before': run_before(results, iterations)}
+    orjson = plan_encoding.orjson
+    plan_encoding.orjson = None
+    timings['fragments-json'] = run_fragments(texts, results, iterations)
+    plan_encoding.orjson = orjson
+    if orjson is not None:
+        timings['fragments-orjson'] = run_fragments(texts, results, iterations)
+
+    report = {}
+    for name, (build, serve) in timings.items():
+        print(f"{name:<18} build {build:8.2f} us/plan   serve {serve:8.2f} us/plan")
+        report[name] = {'build_us': round(build, 3), 'serve_us': round(serve, 3)}
+    save_results("plan_encoding", {'iterations': iterations, 'plans': len(results), 'texts': len(texts)}, report)
+
+
+if __name__ == '__main__':
+    main()
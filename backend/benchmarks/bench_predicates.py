@@ -0,0 +1,108 @@
+"""Predicate-level microbenchmarks at growing roster sizes.
+
+Loads the knowledge base in-process (as an engine worker does), grows a
+synthetic roster to each size in turn and times the plan predicates on
+randomly chosen athletes:
+
+    cd backend && python benchmarks/bench_predicates.py --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyswip import Prolog
+
+from prolog_runner import GoalRunner
+from prolog_terms import Var, goal
+from report import latency_summary, save_results
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+
+# Synthetic athletes cycle through the catalog; every fifth one is injured
+# and every third one has a competition
+ROSTER_GENERATOR = """
+bench_add_roster(From, To) :-
+    findall(S, sport_category(S), Sports), length(Sports, NS),
+    findall(L, fitness_level(L), Levels), length(Levels, NL),
+    findall(D, diet_type(D), Diets), length(Diets, ND),
+    findall(T, injury_type(T), Injuries), length(Injuries, NI),
+    forall(between(From, To, I),
+        ( atom_concat(bench_, I, ID),
+          nth0(I mod NS, Sports, Sport),
+          nth0(I mod NL, Levels, Level),
+          nth0(I mod ND, Diets, Diet),
+          assertz(user_profile(ID, 'Bench Athlete', 25, female, 170, 65, Level)),
+          assertz(user_sport(ID, Sport, Level)),
+          assertz(user_diet(ID, Diet, [])),
+          (   I mod 5 =:= 0
+          ->  nth0(I mod NI, Injuries, Injury),
+              add_injury(ID, Injury, '2024-01-01', moderate, '2 weeks', '')
+          ;   true
+          ),
+          (   I mod 3 =:= 0
+          ->  assertz(competition_details(ID, national, league, national))
+          ;   true
+          )
+        )).
+"""
+
+PREDICATES = {
+    'get_full_plan/4': lambda user_id: goal(
+        "get_full_plan", user_id, Var("TrainingPlan"), Var("NutritionPlan"), Var("InjuryRecommendations")),
+    'generate_training_plan/2': lambda user_id: goal("generate_training_plan", user_id, Var("TrainingPlan")),
+    'get_injury_recommendations/2': lambda user_id: goal("get_injury_recommendations", user_id, Var("Recommendations")),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--calls", type=int, default=2000, help="calls per predicate and roster size")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    prolog = Prolog()
+    prolog.consult(KB_PATH)
+    with tempfile.NamedTemporaryFile("w", suffix=".pl", delete=False) as f:
+        f.write(ROSTER_GENERATOR)
+    try:
+        prolog.consult(f.name)
+    finally:
+        os.unlink(f.name)
+    runner = GoalRunner()
+    rng = random.Random(args.seed)
+
+    results = {}
+    loaded = 0
+    for size in sizes:
+        started = time.perf_counter()
+        runner.run(goal("bench_add_roster", loaded + 1, size))
+        load_seconds = time.perf_counter() - started
+        loaded = size
+        print(f"Roster of {size} athletes ({load_seconds:.1f}s to grow)")
+
+        results[size] = {'load_seconds': round(load_seconds, 3), 'predicates': {}}
+        for name, make_goal in PREDICATES.items():
+            user_ids = [f"bench_{rng.randint(1, size)}" for _ in range(args.calls)]
+            samples = []
+            started = time.perf_counter()
+            for user_id in user_ids:
+                call_started = time.perf_counter()
+                runner.run(make_goal(user_id))
+                samples.append(time.perf_counter() - call_started)
+            summary = latency_summary(samples, time.perf_counter() - started)
+            results[size]['predicates'][name] = summary
+            print(f"  {name:<30} p50 {summary['p50_ms']:8.3f} ms  p95 {summary['p95_ms']:8.3f} ms"
+                  f"  p99 {summary['p99_ms']:8.3f} ms")
+
+    save_results("predicates", {'sizes': sizes, 'calls': args.calls, 'seed': args.seed}, results)
+
+
+if __name__ == "__main__":
+    main()
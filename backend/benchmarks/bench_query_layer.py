@@ -0,0 +1,57 @@
+"""Per-call overhead of f-string Prolog source versus structured goals.
+
+Runs in-process against the knowledge base, the same way an engine worker
+does, and times a read and a write path both ways:
+
+    cd backend && python benchmarks/bench_query_layer.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyswip import Prolog
+
+from prolog_runner import GoalRunner
+from prolog_terms import Var, goal
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+
+
+def timed(label, iterations, call):
+    started = time.perf_counter()
+    for i in range(iterations):
+        call(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed / iterations * 1e6:10.1f} us/call")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    prolog = Prolog()
+    prolog.consult(KB_PATH)
+    runner = GoalRunner()
+
+    prolog.assertz("user_profile('bench', 'Bench', 30, 'male', 180, 75, 'intermediate')")
+    prolog.assertz("user_sport('bench', 'football', 'intermediate')")
+
+    print(f"{iterations} iterations per case")
+    timed("read  f-string prolog.query", iterations,
+          lambda i: list(prolog.query("user_sport('bench', Sport, Level)")))
+    timed("read  GoalRunner.run", iterations,
+          lambda i: runner.run(goal("user_sport", "bench", Var("Sport"), Var("Level"))))
+
+    timed("write f-string prolog.query", iterations,
+          lambda i: list(prolog.query(f"new_user('fs{i}', 'Name {i}', 30, 'male', 180, 75, 'beginner')")))
+    timed("write GoalRunner.run", iterations,
+          lambda i: runner.run(goal("new_user", f"gr{i}", f"Name {i}", 30, "male", 180, 75, "beginner")))
+
+    timed("chatbot f-string prolog.query", iterations,
+          lambda i: list(prolog.query("chatbot_response('what are the benefits of running', Response)")))
+    timed("chatbot GoalRunner.run", iterations,
+          lambda i: runner.run(goal("chatbot_response", "what are the benefits of running", Var("Response"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Compare two saved benchmark result files.
+
+    cd backend && python benchmarks/compare_results.py results/load-A.json results/load-B.json
+
+Prints every latency and throughput figure side by side with the change.
+"""
+import json
+import sys
+
+METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def summaries(node, path=()):
+    # Yields (path, summary) for every latency summary in a results tree
+    if isinstance(node, dict):
+        if 'p50_ms' in node:
+            yield path, node
+            return
+        for key, value in node.items():
+            yield from summaries(value, path + (str(key),))
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        before = json.load(f)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before['benchmark']}: {before.get('revision')} ({before['created']}) -> "
+          f"{after.get('revision')} ({after['created']})")
+
+    old = dict(summaries(before['results']))
+    for path, summary in summaries(after['results']):
+        previous = old.get(path)
+        if previous is None:
+            continue
+        print(" / ".join(path))
+        for metric in METRICS:
+            a, b = previous.get(metric), summary.get(metric)
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"  {metric:<12} {a:12.3f} {b:12.3f} {change:>9}")
+
+
+if __name__ == "__main__":
+    main()
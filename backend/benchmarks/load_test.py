@@ -0,0 +1,216 @@
+"""HTTP load test: simulated athletes against a server started with serve.py.
+
+Each simulated athlete first onboards the way test_setup.py does
+(/api/user, /api/sport, /api/diet, /api/competition) and then keeps issuing
+a weighted mix of plan reads, catalog reads, chatbot questions and injury
+history reads and writes until the run ends. Throughput and p50/p95/p99
+latency are reported per endpoint and saved as JSON:
+
+    cd backend && python benchmarks/load_test.py --athletes 50 --duration 60
+
+Pass --url to run against an already running server instead.
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from report import latency_summary, save_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (weight, action) for the steady-state mix after onboarding
+MIX = (
+    (50, 'plan'),
+    (20, 'catalog'),
+    (15, 'chatbot'),
+    (10, 'injuries_read'),
+    (5, 'injury_write'),
+)
+
+QUESTIONS = (
+    "what are the benefits of running",
+    "What is the best diet for muscle gain?",
+    "how do I recover from a sprained ankle",
+    "which sports does this app support",
+    "how can I build endurance",
+    "is it ok to train every day",
+)
+
+
+def start_server(port, data_dir):
+    env = dict(os.environ, COACH_DATA_DIR=data_dir, COACH_LOG_LEVEL="WARNING", COACH_PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, "serve.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/api/catalog", timeout=1).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready within 120s")
+
+
+class Recorder:
+    # Each thread records into its own lists; merged once at the end
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _samples(self):
+        samples = getattr(self._local, 'samples', None)
+        if samples is None:
+            samples = self._local.samples = {}
+            with self._lock:
+                self._all.append(samples)
+        return samples
+
+    def call(self, session, name, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        latency = time.perf_counter() - started
+        latencies, errors = self._samples().setdefault(name, ([], [0, 0]))
+        latencies.append(latency)
+        if not ok:
+            errors[0] += 1
+            if response is not None and response.status_code == 503:
+                errors[1] += 1
+        return response if ok else None
+
+    def merged(self):
+        merged = {}
+        for samples in self._all:
+            for name, (latencies, errors) in samples.items():
+                target = merged.setdefault(name, ([], [0, 0]))
+                target[0].extend(latencies)
+                target[1][0] += errors[0]
+                target[1][1] += errors[1]
+        return merged
+
+
+def athlete(index, base_url, catalog, deadline, recorder, seed):
+    rng = random.Random(seed + index)
+    session = requests.Session()
+    sport = rng.choice(catalog['sports'])
+    level = rng.choice(catalog['fitnessLevels'])
+
+    response = recorder.call(session, "POST /api/user", "POST", f"{base_url}/api/user", json={
+        "name": f"Load Athlete {index}", "age": rng.randint(16, 45), "gender": rng.choice(["male", "female"]),
+        "height": rng.randint(155, 200), "weight": rng.randint(50, 100), "fitnessLevel": level,
+    })
+    if response is None:
+        return
+    user_id = response.json()["userId"]
+    recorder.call(session, "POST /api/sport", "POST", f"{base_url}/api/sport",
+                  json={"userId": user_id, "sport": sport, "level": level})
+    recorder.call(session, "POST /api/diet", "POST", f"{base_url}/api/diet",
+                  json={"userId": user_id, "dietType": rng.choice(catalog['dietTypes']), "restrictions": []})
+    recorder.call(session, "POST /api/competition", "POST", f"{base_url}/api/competition", json={
+        "userId": user_id, "competitionType": rng.choice(catalog['competitionTypes']),
+        "format": rng.choice(catalog['sportFormats'].get(sport) or ['league']),
+        "level": rng.choice(catalog['competitionLevels']),
+    })
+
+    weights = [weight for weight, _ in MIX]
+    actions = [action for _, action in MIX]
+    while time.time() < deadline:
+        action = rng.choices(actions, weights)[0]
+        if action == 'plan':
+            recorder.call(session, "GET /api/plan/<id>", "GET", f"{base_url}/api/plan/{user_id}")
+        elif action == 'catalog':
+            path = rng.choice(["/api/catalog", "/api/sports", "/api/diet_types", f"/api/sport_formats/{sport}"])
+            recorder.call(session, "GET catalog", "GET", f"{base_url}{path}")
+        elif action == 'chatbot':
+            recorder.call(session, "POST /api/chatbot", "POST", f"{base_url}/api/chatbot",
+                          json={"question": rng.choice(QUESTIONS)})
+        elif action == 'injuries_read':
+            recorder.call(session, "GET /api/injuries/<id>", "GET", f"{base_url}/api/injuries/{user_id}")
+        else:
+            recorder.call(session, "POST /api/injuries/<id>", "POST", f"{base_url}/api/injuries/{user_id}", json={
+                "type": rng.choice(catalog['injuryTypes']), "date": "2024-01-01",
+                "severity": rng.choice(["mild", "moderate", "severe"]), "recoveryTime": "2 weeks", "notes": "",
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--athletes", type=int, default=50, help="concurrent simulated athletes")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of steady-state load")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--url", help="use a running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    process = None
+    data_dir = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        data_dir = tempfile.mkdtemp(prefix="coach-load-")
+        process, base_url = start_server(args.port, data_dir)
+
+    try:
+        catalog = requests.get(f"{base_url}/api/catalog", timeout=10).json()
+        recorder = Recorder()
+        started = time.perf_counter()
+        deadline = time.time() + args.duration
+        threads = [
+            threading.Thread(target=athlete, args=(i, base_url, catalog, deadline, recorder, args.seed))
+            for i in range(args.athletes)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(30)
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = {}
+    everything = []
+    print(f"{'endpoint':<26} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'503s':>6}")
+    for name, (latencies, errors) in sorted(recorder.merged().items()):
+        summary = latency_summary(latencies, elapsed)
+        summary['errors'] = errors[0]
+        summary['rejected'] = errors[1]
+        results[name] = summary
+        everything.extend(latencies)
+        print(f"{name:<26} {summary['count']:>7} {summary['throughput']:>8.1f} {summary['p50_ms']:>8.2f}"
+              f" {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} {errors[0]:>7} {errors[1]:>6}")
+    results['all'] = latency_summary(everything, elapsed)
+    results['all']['errors'] = sum(result['errors'] for result in results.values() if 'errors' in result)
+    results['all']['rejected'] = sum(result['rejected'] for result in results.values() if 'rejected' in result)
+    print(f"{'all':<26} {results['all']['count']:>7} {results['all']['throughput']:>8.1f}")
+
+    save_results("load", {
+        'athletes': args.athletes, 'duration': args.duration, 'seed': args.seed,
+        'engine_workers': os.environ.get("COACH_ENGINE_WORKERS"), 'url': args.url,
+    }, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Shared helpers for the benchmark scripts: percentiles and JSON results.
+
+Results are written to benchmarks/results/<name>-<timestamp>.json together
+with the git revision and run parameters, so runs can be compared later
+with compare_results.py.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(samples, elapsed):
+    # samples are per-call latencies in seconds; reported in milliseconds
+    values = sorted(samples)
+    return {
+        'count': len(values),
+        'throughput': len(values) / elapsed if elapsed else None,
+        'p50_ms': _ms(percentile(values, 0.50)),
+        'p95_ms': _ms(percentile(values, 0.95)),
+        'p99_ms': _ms(percentile(values, 0.99)),
+        'max_ms': _ms(values[-1] if values else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name, parameters, results):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    document = {
+        'benchmark': name,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'parameters': parameters,
+        'results': results,
+    }
+    path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results saved to {path}")
+    return path
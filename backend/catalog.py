@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+from types import MappingProxyType
+
+from prolog_terms import Var, goal
+
+logger = logging.getLogger(__name__)
+
+# Served if the knowledge base cannot answer for these lists
+FALLBACK_COMPETITION_TYPES = ['olympics', 'commonwealth', 'world_championship', 'national', 'local']
+FALLBACK_SPORT_FORMATS = ['tournament', 'league', 'friendly']
+FALLBACK_COMPETITION_LEVELS = ['international', 'national', 'state', 'club']
+
+
+class CatalogEntry:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+class Catalog:
+    # Immutable snapshot of the static reference facts in the knowledge base.
+    # Every response body is encoded once, up front, together with its ETag.
+
+    def __init__(self, sports, competition_types, sport_formats, competition_levels,
+                 fitness_levels, diet_types, injury_types, recovery_statuses, default_formats=()):
+        self.sports = tuple(sports)
+        self.competition_types = tuple(competition_types)
+        self.sport_formats = MappingProxyType({sport: tuple(formats) for sport, formats in sport_formats.items()})
+        self.competition_levels = tuple(competition_levels)
+        self.fitness_levels = tuple(fitness_levels)
+        self.diet_types = tuple(diet_types)
+        self.injury_types = tuple(injury_types)
+        self.recovery_statuses = tuple(recovery_statuses)
+
+        # Membership sets for validating writes without asking the engine
+        self.valid = MappingProxyType({
+            'sport': frozenset(self.sports),
+            'competition_type': frozenset(self.competition_types),
+            'competition_level': frozenset(self.competition_levels),
+            'fitness_level': frozenset(self.fitness_levels),
+            'diet_type': frozenset(self.diet_types),
+            'injury_type': frozenset(self.injury_types),
+            'recovery_status': frozenset(self.recovery_statuses),
+        })
+
+        self.entries = MappingProxyType({
+            'sports': CatalogEntry({'sports': list(self.sports)}),
+            'competition_types': CatalogEntry({'competitionTypes': list(self.competition_types)}),
+            'competition_levels': CatalogEntry({'levels': list(self.competition_levels)}),
+            'fitness_levels': CatalogEntry({'fitnessLevels': list(self.fitness_levels)}),
+            'diet_types': CatalogEntry({'dietTypes': list(self.diet_types)}),
+            'injury_types': CatalogEntry({'injuryTypes': list(self.injury_types)}),
+            'recovery_statuses': CatalogEntry({'recoveryStatuses': list(self.recovery_statuses)}),
+            'catalog': CatalogEntry({
+                'sports': list(self.sports),
+                'competitionTypes': list(self.competition_types),
+                'sportFormats': {sport: list(formats) for sport, formats in self.sport_formats.items()},
+                'competitionLevels': list(self.competition_levels),
+                'fitnessLevels': list(self.fitness_levels),
+                'dietTypes': list(self.diet_types),
+                'injuryTypes': list(self.injury_types),
+                'recoveryStatuses': list(self.recovery_statuses),
+            }),
+        })
+        self.format_entries = MappingProxyType({
+            sport: CatalogEntry({'formats': list(formats)})
+            for sport, formats in self.sport_formats.items()
+        })
+        self.unknown_sport_formats = CatalogEntry({'formats': list(default_formats)})
+
+    def formats_entry(self, sport):
+        return self.format_entries.get(sport, self.unknown_sport_formats)
+
+
+def _values(engine, query, var, fallback=()):
+    try:
+        return [result[var] for result in engine.query(query)]
+    except Exception as e:
+        logger.exception("Error loading catalog facts for %s/%d: %s", query.name, len(query.args), e)
+        return list(fallback)
+
+
+def build_catalog(engine):
+    # Static facts are identical on every worker, so any engine can answer
+    sport_formats = {}
+    default_formats = ()
+    try:
+        for result in engine.query(goal("sport_format", Var("Sport"), Var("Format"))):
+            sport_formats.setdefault(result['Sport'], []).append(result['Format'])
+    except Exception as e:
+        logger.exception("Error loading catalog facts for sport_format/2: %s", e)
+        default_formats = FALLBACK_SPORT_FORMATS
+
+    return Catalog(
+        sports=_values(engine, goal("sport_category", Var("Sport")), 'Sport'),
+        competition_types=_values(engine, goal("competition_type", Var("Type")), 'Type', FALLBACK_COMPETITION_TYPES),
+        sport_formats=sport_formats,
+        competition_levels=_values(engine, goal("competition_level", Var("Level")), 'Level', FALLBACK_COMPETITION_LEVELS),
+        fitness_levels=_values(engine, goal("fitness_level", Var("Level")), 'Level'),
+        diet_types=_values(engine, goal("diet_type", Var("Type")), 'Type'),
+        injury_types=_values(engine, goal("injury_type", Var("Type")), 'Type'),
+        recovery_statuses=_values(engine, goal("recovery_status", Var("Status")), 'Status'),
+        default_formats=default_formats,
+    )
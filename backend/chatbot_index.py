@@ -0,0 +1,126 @@
+import logging
+import math
+import re
+
+import numpy as np
+
+from prolog_terms import Var, goal
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no meaning for matching a question to an answer
+STOPWORDS = frozenset("""
+a an and are as at be can do does for from how i in is it me my of on or
+should the this to what when which who why will with you your
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def normalize(text):
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+class ChatbotIndex:
+    # TF-IDF retrieval over the chatbot Q&A corpus. Document vectors are kept
+    # as an inverted index (per term: the documents containing it and their
+    # L2-normalised weights), so a lookup only touches the postings of the
+    # question's own terms and costs the same however large the corpus is.
+
+    def __init__(self, pairs, threshold=0.35):
+        self.threshold = threshold
+        self.questions = [question for question, _ in pairs]
+        self.answers = [answer for _, answer in pairs]
+        self._exact = {normalize(question): i for i, question in enumerate(self.questions)}
+
+        documents = [tokenize(question) for question in self.questions]
+        self._vocabulary = {}
+        document_frequency = []
+        for tokens in documents:
+            for token in set(tokens):
+                term = self._vocabulary.setdefault(token, len(self._vocabulary))
+                if term == len(document_frequency):
+                    document_frequency.append(0)
+                document_frequency[term] += 1
+
+        count = len(documents)
+        self._idf = np.array(
+            [math.log((1 + count) / (1 + df)) + 1 for df in document_frequency],
+            dtype=np.float32,
+        )
+
+        postings = [([], []) for _ in document_frequency]
+        for doc, tokens in enumerate(documents):
+            weights = {}
+            for token in tokens:
+                term = self._vocabulary[token]
+                weights[term] = weights.get(term, 0.0) + self._idf[term]
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings[term][0].append(doc)
+                postings[term][1].append(weight / norm)
+        self._postings = [
+            (np.array(docs, dtype=np.int32), np.array(weights, dtype=np.float32))
+            for docs, weights in postings
+        ]
+
+    def __len__(self):
+        return len(self.questions)
+
+    def search(self, question, k=3):
+        # Returns up to k (score, index) pairs, best first
+        if not self.questions:
+            return []
+        exact = self._exact.get(normalize(question))
+        if exact is not None:
+            return [(1.0, exact)]
+
+        counts = {}
+        for token in tokenize(question):
+            term = self._vocabulary.get(token)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return []
+
+        terms = list(counts)
+        query = np.array([counts[term] for term in terms], dtype=np.float32) * self._idf[terms]
+        query /= np.linalg.norm(query)
+
+        docs = np.concatenate([self._postings[term][0] for term in terms])
+        weights = np.concatenate([
+            self._postings[term][1] * q for term, q in zip(terms, query)
+        ])
+        # Sum contributions per candidate document; only candidates are scored
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(candidates[i])) for i in top]
+
+    def answer(self, question):
+        # Best answer with its confidence, or (None, confidence) below threshold
+        results = self.search(question, k=1)
+        if not results:
+            return None, 0.0
+        score, index = results[0]
+        if score < self.threshold:
+            return None, score
+        return self.answers[index], min(score, 1.0)
+
+
+def build_chatbot_index(engine, threshold=0.35):
+    try:
+        results = engine.query(goal("chatbot_response", Var("Question"), Var("Answer")))
+    except Exception as e:
+        logger.exception("Error loading chatbot corpus: %s", e)
+        results = []
+    return ChatbotIndex([(result['Question'], result['Answer']) for result in results], threshold)
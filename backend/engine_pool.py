@@ -0,0 +1,586 @@
+import bisect
+import cProfile
+import hashlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import pstats
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+from kb_compiler import KnowledgeBaseError, compile_knowledge_base
+from prolog_terms import Goal, Var, goal, plain_value
+
+logger = logging.getLogger(__name__)
+
+# Users are hashed onto a fixed number of slots, and slots are placed on a
+# consistent hash ring of workers. A user's slot never changes, so resizing
+# the pool only moves the slots whose ring position changed owner.
+NUM_SLOTS = 1024
+RING_REPLICAS = 64
+
+# Functions listed in a worker's Python profile of a profiled call
+PROFILE_TOP = 40
+PROFILE_NODE_FIELDS = ('predicate', 'calls', 'redos', 'exits', 'selfTicks', 'childTicks')
+
+
+class EngineError(Exception):
+    pass
+
+
+class EngineBusy(EngineError):
+    # The worker already has as many requests in flight as it may queue
+    pass
+
+
+class QueryBudgetExceeded(EngineError):
+    # The query was cancelled inside the engine for running past its time
+    # or inference budget; limit is "time_limit" or "inference_limit"
+    def __init__(self, limit):
+        super().__init__(f"Query exceeded its {limit} budget")
+        self.limit = limit
+
+
+def slot_for(user_id):
+    return zlib.crc32(str(user_id).encode("utf-8")) % NUM_SLOTS
+
+
+def _ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self._ring = sorted(
+            (_ring_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._keys, _ring_hash(key)) % len(self._keys)
+        return self._ring[index][1]
+
+
+def _worker_main(kb_path, conn):
+    # Runs in the worker process: one private SWI-Prolog engine per process
+    from pyswip import Prolog
+    from prolog_runner import BudgetExceeded, GoalRunner
+
+    prolog = Prolog()
+    runner = GoalRunner()
+    # Either the compiled .qlf image or the .pl source
+    runner.run(goal("load_files", kb_path, []))
+
+    # Highest write sequence number reflected in this engine's facts
+    applied_seq = 0
+
+    # Calls, inferences and CPU seconds per predicate, from statistics/2
+    measure = os.environ.get("COACH_PROLOG_STATS", "1") == "1"
+    counters_goal = goal("query_counters", Var("Inferences"), Var("CpuTime"))
+    predicate_stats = {}
+    budget_violations = {}
+
+    def run(query, budget=None):
+        try:
+            return run_measured(query, budget)
+        except BudgetExceeded as e:
+            budget_violations[e.limit] = budget_violations.get(e.limit, 0) + 1
+            raise
+
+    def run_measured(query, budget):
+        if not isinstance(query, Goal):
+            # Prolog source text, only found in write logs from older versions
+            return [plain_value(result) for result in prolog.query(query)]
+        if not measure:
+            return runner.run(query, budget)
+        before = runner.run(counters_goal)[0]
+        try:
+            return runner.run(query, budget)
+        finally:
+            after = runner.run(counters_goal)[0]
+            stats = predicate_stats.get((query.name, len(query.args)))
+            if stats is None:
+                stats = predicate_stats[(query.name, len(query.args))] = [0, 0, 0.0]
+            stats[0] += 1
+            stats[1] += after['Inferences'] - before['Inferences']
+            stats[2] += after['CpuTime'] - before['CpuTime']
+
+    def engine_stats():
+        facts = {
+            f"{result['Name']}/{result['Arity']}": result['Count']
+            for result in runner.run(goal("athlete_fact_count", Var("Name"), Var("Arity"), Var("Count")))
+        }
+        predicates = {f"{name}/{arity}": list(stats) for (name, arity), stats in predicate_stats.items()}
+        memory = runner.run(goal("engine_memory", Var("Atoms"), Var("AtomSpace"), Var("ProgramSpace")))[0]
+        return {'predicates': predicates, 'facts': facts, 'budget_violations': dict(budget_violations),
+                'applied_seq': applied_seq, 'memory': memory}
+
+    def snapshot(directory, slots):
+        # Dump this engine's athlete facts, one file per slot, so a restore
+        # can hand each slot to whichever worker owns it then
+        owned = set(slots)
+        user_ids = run(goal("athlete_ids", Var("UserIDs")))[0]['UserIDs']
+        by_slot = {}
+        for user_id in user_ids:
+            slot = slot_for(user_id)
+            if slot in owned:
+                by_slot.setdefault(slot, []).append(user_id)
+
+        files = {}
+        for slot, members in by_slot.items():
+            path = os.path.join(directory, f"slot-{slot:04d}.facts")
+            if not run(goal("dump_athlete_facts", path, members)):
+                raise EngineError(f"Could not write snapshot file {path}")
+            files[slot] = path
+        return {'seq': applied_seq, 'files': files, 'users': len(user_ids)}
+
+    def restore(files):
+        for path in files:
+            if not run(goal("load_athlete_facts", path)):
+                raise EngineError(f"Could not load snapshot file {path}")
+        return len(files)
+
+    def run_each(queries, budget=None):
+        # One round trip for many goals; each one succeeds or fails alone
+        results = []
+        for query in queries:
+            try:
+                results.append((True, run(query, budget)))
+            except Exception as e:
+                results.append((False, str(e)))
+        return results
+
+    def profiled(command, payload):
+        # A read command run under both profilers: cProfile for this
+        # process's Python side, pyswip term conversion included, and SWI's
+        # profiler for the predicates
+        python = cProfile.Profile()
+        runner.run(goal("profile_start"))
+        started = time.perf_counter()
+        python.enable()
+        try:
+            result = run(*payload) if command == "query" else run_each(*payload)
+        finally:
+            python.disable()
+            seconds = time.perf_counter() - started
+            report = runner.run(goal("profile_stop", Var("Samples"), Var("Seconds"), Var("Nodes")))[0]
+        text = io.StringIO()
+        pstats.Stats(python, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        nodes = sorted(report['Nodes'], key=lambda node: (node[4] + node[5], node[1]), reverse=True)
+        return {'result': result, 'profile': {
+            'seconds': seconds,
+            'python': text.getvalue(),
+            'prolog': {
+                'samples': report['Samples'],
+                'seconds': report['Seconds'],
+                'predicates': [dict(zip(PROFILE_NODE_FIELDS, node)) for node in nodes],
+            },
+        }}
+
+    def reload(path):
+        # Swap in new static rules while keeping every athlete: save their
+        # facts, load the new knowledge base, then put the facts back. The
+        # worker handles one command at a time, so no query sees the middle.
+        user_ids = run(goal("athlete_ids", Var("UserIDs")))[0]['UserIDs']
+        fd, saved = tempfile.mkstemp(suffix=".facts")
+        os.close(fd)
+        try:
+            if not run(goal("dump_athlete_facts", saved, user_ids)):
+                raise EngineError("Could not save athlete facts before reloading")
+            error = None
+            try:
+                runner.run(goal("load_files", path, []))
+            except Exception as e:
+                error = e
+            # Reloading may drop or keep the file's dynamic clauses; either
+            # way the athletes come back exactly as saved
+            run(goal("clear_athlete_facts"))
+            if not run(goal("load_athlete_facts", saved)):
+                raise EngineError("Could not restore athlete facts after reloading")
+            if error is not None:
+                raise EngineError(f"Reloading {path} failed: {error}")
+        finally:
+            os.remove(saved)
+        return len(user_ids)
+
+    def replay(entries, watermark):
+        nonlocal applied_seq
+        failed = 0
+        for seq, query in entries:
+            try:
+                if not run(query):
+                    failed += 1
+            except Exception:
+                failed += 1
+        applied_seq = max(applied_seq, watermark)
+        return {'replayed': len(entries), 'failed': failed}
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        request_id, command, payload = message
+        started = time.perf_counter()
+        try:
+            if command == "query":
+                result = run(*payload)
+            elif command == "write":
+                query, seq = payload
+                applied_seq = max(applied_seq, seq)
+                result = run(query)
+            elif command == "query_batch":
+                result = run_each(*payload)
+            elif command == "profile":
+                result = profiled(*payload)
+            elif command == "write_batch":
+                queries, last_seq = payload
+                applied_seq = max(applied_seq, last_seq)
+                result = run_each(queries)
+            elif command == "stats":
+                result = engine_stats()
+            elif command == "snapshot":
+                result = snapshot(*payload)
+            elif command == "restore":
+                result = restore(payload)
+            elif command == "reload":
+                result = reload(payload)
+            elif command == "ping":
+                result = True
+            elif command == "replay":
+                result = replay(*payload)
+            else:
+                raise EngineError(f"Unknown engine command: {command}")
+            conn.send((request_id, True, result, time.perf_counter() - started))
+        except BudgetExceeded as e:
+            # The engine abandoned the search and is ready for the next goal
+            conn.send((request_id, False, ("budget", e.limit), time.perf_counter() - started))
+        except Exception as e:
+            conn.send((request_id, False, ("error", str(e)), time.perf_counter() - started))
+
+
+class EngineWorker:
+    def __init__(self, name, kb_path, context, queue_limit=None):
+        self.name = name
+        self.queue_limit = queue_limit
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(kb_path, child_conn),
+            name=name,
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Held while a write is numbered and sent, so a worker always sees
+        # writes in sequence order
+        self.write_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name=f"{name}-reader", daemon=True)
+        self._reader.start()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    @property
+    def busy(self):
+        return bool(self.queue_limit) and len(self._pending) >= self.queue_limit
+
+    def call(self, command, payload, bounded=False):
+        # Bounded calls are refused with EngineBusy once the worker's queue
+        # is full; maintenance commands always get through
+        future = Future()
+        with self._lock:
+            if bounded and self.busy:
+                raise EngineBusy(f"Engine worker {self.name} has {len(self._pending)} requests queued")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            future.sent = time.perf_counter()
+            try:
+                self._conn.send((request_id, command, payload))
+            except (OSError, ValueError) as e:
+                del self._pending[request_id]
+                raise EngineError(f"Engine worker {self.name} is not reachable: {e}")
+        return future
+
+    def _read_loop(self):
+        while True:
+            try:
+                request_id, ok, payload, execution = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            # Time spent queued (and on the pipe) versus running in the engine
+            total = time.perf_counter() - future.sent
+            future.timing = (max(0.0, total - execution), execution)
+            if ok:
+                future.set_result(payload)
+            else:
+                kind, detail = payload
+                future.set_exception(QueryBudgetExceeded(detail) if kind == "budget" else EngineError(detail))
+
+        # The worker went away; fail everything still waiting on it
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(EngineError(f"Engine worker {self.name} exited"))
+
+    def stop(self, timeout=5):
+        try:
+            with self._lock:
+                self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+
+
+class EnginePool:
+    def __init__(self, kb_path, size=None, queue_limit=None):
+        self.kb_path = os.path.abspath(kb_path)
+        self.size = size or int(os.environ.get("COACH_ENGINE_WORKERS", os.cpu_count() or 1))
+        # Requests allowed to wait on one worker before new ones are refused
+        self.queue_limit = queue_limit or int(os.environ.get("COACH_ENGINE_QUEUE_LIMIT", 32))
+        self.workers = []
+        self._slot_owner = []
+        # UserKeys mapping user IDs to the integer keys their facts hold
+        self.keys = None
+        # Called as on_timing(command, wait, execution) for every request
+        self.on_timing = None
+        # Engine calls and time made by the current thread since reset_round_trips()
+        self._local = threading.local()
+
+    def set_budget(self, budget):
+        # (seconds, inferences) applied to this thread's read queries, or None
+        self._local.budget = budget
+
+    def set_profile(self, profile):
+        # A list that collects an engine profile of each of this thread's
+        # read calls, or None to run them unprofiled
+        self._local.profile = profile
+
+    def reset_round_trips(self):
+        self._local.round_trips = 0
+        self._local.wait = 0.0
+        self._local.execution = 0.0
+
+    @property
+    def round_trips(self):
+        return getattr(self._local, 'round_trips', 0)
+
+    @property
+    def request_timing(self):
+        # (queue wait, execution) seconds spent in the engines by this thread
+        return getattr(self._local, 'wait', 0.0), getattr(self._local, 'execution', 0.0)
+
+    def _count_round_trips(self, count=1):
+        self._local.round_trips = self.round_trips + count
+
+    def _result(self, command, future):
+        try:
+            return future.result()
+        finally:
+            timing = getattr(future, 'timing', None)
+            if timing is not None:
+                wait, execution = timing
+                self._local.wait = getattr(self._local, 'wait', 0.0) + wait
+                self._local.execution = getattr(self._local, 'execution', 0.0) + execution
+                if self.on_timing is not None:
+                    self.on_timing(command, wait, execution)
+
+    def _read(self, worker, command, payload):
+        # While this thread is profiling, reads run under the worker's
+        # profilers and come back as {'result', 'profile'}
+        if getattr(self._local, 'profile', None) is None:
+            return worker.call(command, payload, bounded=True)
+        return worker.call("profile", (command, payload), bounded=True)
+
+    def _read_result(self, worker, command, queries, future):
+        result = self._result(command, future)
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return result
+        profile.append(dict(
+            result['profile'], worker=worker.name, command=command,
+            goals=[f"{query.name}/{len(query.args)}" for query in queries],
+        ))
+        return result['result']
+
+    def _load_path(self, context, force=False):
+        # Compiled image if it can be built, otherwise the source itself
+        try:
+            path, rebuilt = compile_knowledge_base(self.kb_path, context, force=force)
+            if rebuilt:
+                logger.info("Compiled knowledge base to %s", path)
+            return path
+        except KnowledgeBaseError as e:
+            logger.warning("%s; loading %s from source", e, self.kb_path)
+            return self.kb_path
+
+    def start(self):
+        # Returns the seconds spent in each startup phase
+        timings = {}
+        started = time.perf_counter()
+        # spawn, not fork: each worker must initialise its own SWI runtime
+        context = multiprocessing.get_context("spawn")
+        load_path = self._load_path(context)
+        timings['compile'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.workers = [
+            EngineWorker(f"engine-{i}", load_path, context, self.queue_limit)
+            for i in range(self.size)
+        ]
+        by_name = {worker.name: worker for worker in self.workers}
+        ring = HashRing(by_name)
+        self._slot_owner = [by_name[ring.node_for(f"slot-{slot}")] for slot in range(NUM_SLOTS)]
+        # Every worker answers once its knowledge base is loaded
+        for future in [worker.call("ping", None) for worker in self.workers]:
+            future.result()
+        timings['engines'] = time.perf_counter() - started
+        return timings
+
+    def reload(self):
+        # Recompile the knowledge base (refusing a source with errors) and
+        # have every worker swap it in. Returns the number of athletes kept.
+        context = multiprocessing.get_context("spawn")
+        load_path, _ = compile_knowledge_base(self.kb_path, context)
+        futures = [worker.call("reload", load_path) for worker in self.workers]
+        return sum(future.result() for future in futures)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def key_of(self, user_id):
+        # What the user's facts are stored under: their key, or the ID
+        # itself for users created before keys were assigned
+        key = self.keys.get(user_id) if self.keys is not None else None
+        return user_id if key is None else key
+
+    def keyed(self, user_id, query):
+        # The goal with the user's ID replaced by their key
+        key = self.key_of(user_id)
+        if key is user_id or not isinstance(query, Goal):
+            return query
+        return Goal(query.name, tuple(key if arg == user_id else arg for arg in query.args))
+
+    def slot_of(self, user_id):
+        # Keyed users are placed by key, as the engines only see the key
+        # when they split their facts into per-slot snapshot files
+        return slot_for(self.key_of(user_id))
+
+    def worker_for(self, user_id):
+        return self._slot_owner[self.slot_of(user_id)]
+
+    def any_worker(self):
+        # Static facts are loaded in every worker, so pick the least busy one
+        return min(self.workers, key=lambda worker: worker.pending)
+
+    def query(self, query, user_id=None):
+        # Athlete facts live only on the worker that owns the user's slot;
+        # goals without a user can be answered anywhere
+        if user_id is None:
+            worker = self.any_worker()
+        else:
+            worker = self.worker_for(user_id)
+            query = self.keyed(user_id, query)
+        self._count_round_trips()
+        future = self._read(worker, "query", (query, getattr(self._local, 'budget', None)))
+        return self._read_result(worker, "query", [query], future)
+
+    def write(self, user_id, query, next_seq):
+        # Returns the write's sequence number along with the query results
+        worker = self.worker_for(user_id)
+        self._count_round_trips()
+        with worker.write_lock:
+            seq = next_seq()
+            future = worker.call("write", (self.keyed(user_id, query), seq), bounded=True)
+        return seq, self._result("write", future)
+
+    def _by_worker(self, user_ids):
+        groups = {}
+        for index, user_id in enumerate(user_ids):
+            groups.setdefault(self.worker_for(user_id), []).append(index)
+        return groups
+
+    def query_batch(self, queries):
+        # queries is a list of (user_id, query). Each owning worker gets its
+        # share in a single call; results come back in input order as
+        # (ok, results or error message) pairs.
+        groups = self._by_worker([user_id for user_id, _ in queries])
+        self._count_round_trips(len(groups))
+        futures = []
+        for worker, indexes in groups.items():
+            keyed = [self.keyed(*queries[i]) for i in indexes]
+            futures.append((worker, indexes, keyed, self._read(
+                worker, "query_batch", (keyed, getattr(self._local, 'budget', None)))))
+        results = [None] * len(queries)
+        for worker, indexes, keyed, future in futures:
+            for i, result in zip(indexes, self._read_result(worker, "query_batch", keyed, future)):
+                results[i] = result
+        return results
+
+    def write_batch(self, writes, next_seq):
+        # Like query_batch, but every write is numbered in the order its
+        # worker will apply it. Returns (seq, ok, results) per write.
+        groups = self._by_worker([user_id for user_id, _ in writes])
+        # Admit the whole batch or none of it, so a full queue never leaves
+        # it half applied
+        for worker in groups:
+            if worker.busy:
+                raise EngineBusy(f"Engine worker {worker.name} has {worker.pending} requests queued")
+        self._count_round_trips(len(groups))
+        futures = []
+        seqs = [None] * len(writes)
+        for worker, indexes in groups.items():
+            with worker.write_lock:
+                for i in indexes:
+                    seqs[i] = next_seq()
+                future = worker.call("write_batch", ([self.keyed(*writes[i]) for i in indexes], seqs[indexes[-1]]))
+            futures.append((indexes, future))
+        results = [None] * len(writes)
+        for indexes, future in futures:
+            for i, (ok, result) in zip(indexes, self._result("write_batch", future)):
+                results[i] = (seqs[i], ok, result)
+        return results
+
+    def slots_of(self, worker):
+        return [slot for slot, owner in enumerate(self._slot_owner) if owner is worker]
+
+    def owner_of_slot(self, slot):
+        return self._slot_owner[slot]
+
+    def stats(self):
+        # Per-worker engine counters, as (worker, stats) pairs
+        futures = [(worker, worker.call("stats", None)) for worker in self.workers]
+        return [(worker, future.result()) for worker, future in futures]
+
+    def broadcast(self, query):
+        # UserID bindings come back as user IDs, whatever the facts hold
+        futures = [worker.call("query", (query, None)) for worker in self.workers]
+        results = [future.result() for future in futures]
+        if self.keys is not None:
+            for result in (result for worker_results in results for result in worker_results):
+                if isinstance(result.get('UserID'), int):
+                    result['UserID'] = self.keys.user_id(result['UserID'])
+        return results
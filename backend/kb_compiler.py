@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+# The knowledge base is compiled once into a SWI quick-load file (.qlf) next
+# to the source, and engines load that image instead of parsing the .pl on
+# every start. A sidecar file records the hash of the source it was built
+# from, so the image is rebuilt only when the source actually changes.
+
+
+class KnowledgeBaseError(Exception):
+    pass
+
+
+def qlf_path(kb_path):
+    return os.path.splitext(kb_path)[0] + ".qlf"
+
+
+def _source_hash(kb_path):
+    with open(kb_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _stamp_path(kb_path):
+    return qlf_path(kb_path) + ".source"
+
+
+def is_current(kb_path):
+    qlf, stamp = qlf_path(kb_path), _stamp_path(kb_path)
+    if not (os.path.exists(qlf) and os.path.exists(stamp)):
+        return False
+    with open(stamp, encoding="utf-8") as f:
+        return f.read().strip() == _source_hash(kb_path)
+
+
+def _compile_main(kb_path):
+    # Runs in a child process so the parent never loads SWI-Prolog itself
+    from pyswip import Prolog
+    from prolog_runner import GoalRunner
+    from prolog_terms import Var, goal
+
+    prolog = Prolog()
+    # Count errors reported while compiling; qcompile/1 itself still succeeds
+    prolog.assertz("(user:message_hook(_, error, _) :- flag(kb_compile_errors, N, N + 1), fail)")
+    # Each Var is a fresh variable, so reading the flag needs a clause that
+    # passes the same variable as its old and new value
+    prolog.assertz("(kb_compile_error_count(N) :- flag(kb_compile_errors, N, N))")
+    runner = GoalRunner()
+    runner.run(goal("qcompile", kb_path))
+    errors = runner.run(goal("kb_compile_error_count", Var("N")))[0]['N']
+    raise SystemExit(1 if errors else 0)
+
+
+def compile_knowledge_base(kb_path, context, force=False):
+    # Returns (path engines should load, whether it was rebuilt)
+    if not force and is_current(kb_path):
+        return qlf_path(kb_path), False
+
+    source_hash = _source_hash(kb_path)
+    process = context.Process(target=_compile_main, args=(kb_path,), name="kb-compiler", daemon=True)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise KnowledgeBaseError(f"Compiling {kb_path} failed (exit status {process.exitcode})")
+
+    with open(_stamp_path(kb_path), "w", encoding="utf-8") as f:
+        f.write(source_hash)
+    return qlf_path(kb_path), True
@@ -0,0 +1,364 @@
+import glob
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+from engine_pool import NUM_SLOTS
+from prolog_terms import Goal, Text, Var
+
+logger = logging.getLogger(__name__)
+
+# Athlete state survives restarts through two files sets under the data dir:
+#   log/segment-*.jsonl     append-only record of every successful write
+#   snapshots/<id>/         per-slot dumps of the athletes' dynamic facts,
+#                           described by snapshots/manifest.json
+# Startup bulk-loads the newest snapshot into the engines, then replays only
+# the log records the snapshot does not already cover.
+
+
+def _encode_arg(arg):
+    # Output variables are stored as null and come back as fresh variables;
+    # free text is stored as {"text": ...} so it comes back as a string
+    if isinstance(arg, Var):
+        return None
+    if isinstance(arg, Text):
+        return {'text': arg.value}
+    if isinstance(arg, list):
+        return [_encode_arg(item) for item in arg]
+    return arg
+
+
+def _decode_arg(arg):
+    if arg is None:
+        return Var()
+    if isinstance(arg, dict):
+        return Text(arg['text'])
+    if isinstance(arg, list):
+        return [_decode_arg(item) for item in arg]
+    return arg
+
+
+def _record(seq, user_id, goal):
+    # The log holds user IDs; keys are applied when a record is replayed
+    return {'seq': seq, 'user': user_id, 'pred': goal.name, 'args': [_encode_arg(arg) for arg in goal.args]}
+
+
+def _record_goal(record):
+    if 'pred' in record:
+        return Goal(record['pred'], [_decode_arg(arg) for arg in record['args']])
+    # Logs written before writes became structured hold Prolog source text
+    return record['goal']
+
+
+def _applied(results):
+    return bool(results) and results[0].get('Status', 'ok') == 'ok'
+
+
+class FactLog:
+    # Append-only write log with group commit: a single writer thread drains
+    # whatever has queued up, writes it, and fsyncs once for the whole batch.
+
+    def __init__(self, directory, fsync=True, max_batch=1024):
+        self.directory = directory
+        self.fsync = fsync
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._segment = None
+        self._segment_max_seq = 0
+        self._closed_segments = {}
+        self._writer = None
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"segment-{index:08d}.jsonl")
+
+    def _segment_paths(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.jsonl")))
+
+    def read_records(self):
+        # Yields every record from the existing segments, oldest first, and
+        # remembers each segment's highest seq for compaction
+        for path in self._segment_paths():
+            max_seq = 0
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write
+                        break
+                    max_seq = max(max_seq, record['seq'])
+                    yield record
+            self._closed_segments[path] = max_seq
+
+    def open(self):
+        paths = self._segment_paths()
+        index = int(os.path.basename(paths[-1])[8:16]) + 1 if paths else 0
+        self._open_segment(index)
+        self._writer = threading.Thread(target=self._run, name="fact-log-writer", daemon=True)
+        self._writer.start()
+
+    def _open_segment(self, index):
+        self._segment = self._segment_path(index)
+        self._segment_max_seq = 0
+        self._file = open(self._segment, "a", encoding="utf-8")
+
+    def append(self, record):
+        # The returned future resolves once the record is durable
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch([record for record, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for _, future in batch:
+                    future.set_result(None)
+            if stop:
+                break
+
+    def _write_batch(self, records):
+        data = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+        with self._file_lock:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._segment_max_seq = max(self._segment_max_seq, max(record['seq'] for record in records))
+
+    def rotate(self):
+        # Start a new segment so older ones can be dropped once snapshotted
+        with self._file_lock:
+            self._file.close()
+            self._closed_segments[self._segment] = self._segment_max_seq
+            index = int(os.path.basename(self._segment)[8:16]) + 1
+            self._open_segment(index)
+
+    def compact(self, watermark):
+        # Delete closed segments whose records are all covered by a snapshot
+        with self._file_lock:
+            for path, max_seq in list(self._closed_segments.items()):
+                if max_seq <= watermark:
+                    os.remove(path)
+                    del self._closed_segments[path]
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Persistence:
+    def __init__(self, engine, directory, snapshot_interval=300, snapshot_after_writes=50000, fsync=True):
+        self.engine = engine
+        self.directory = os.path.abspath(directory)
+        self.snapshot_dir = os.path.join(directory, "snapshots")
+        self.manifest_path = os.path.join(self.snapshot_dir, "manifest.json")
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_after_writes = snapshot_after_writes
+
+        self.log = FactLog(os.path.join(directory, "log"), fsync=fsync)
+        self._seq = itertools.count(1)
+        # Some seq already handed out; writes racing next_seq() can leave it
+        # a little behind the newest, never ahead
+        self._issued = 0
+        self._writes_since_snapshot = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_wanted = threading.Event()
+        self._stopping = threading.Event()
+        self._snapshotter = None
+
+    def next_seq(self):
+        seq = next(self._seq)
+        self._issued = seq
+        return seq
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def restore(self):
+        # Bulk-load the latest snapshot, then replay the log records it does
+        # not cover. Every worker loads and replays its own slots in parallel.
+        started = time.perf_counter()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        manifest = self._read_manifest()
+        watermarks = [0] * NUM_SLOTS
+        files_by_worker = {}
+        if manifest is not None:
+            for slot, entry in manifest['slots'].items():
+                slot = int(slot)
+                watermarks[slot] = entry['seq']
+                if entry['file']:
+                    worker = self.engine.owner_of_slot(slot)
+                    files_by_worker.setdefault(worker, []).append(os.path.join(self.snapshot_dir, entry['file']))
+
+        futures = [worker.call("restore", files) for worker, files in files_by_worker.items()]
+        loaded = sum(future.result() for future in futures)
+
+        max_seq = max(watermarks)
+        entries_by_worker = {worker: [] for worker in self.engine.workers}
+        for record in self.log.read_records():
+            max_seq = max(max_seq, record['seq'])
+            if record['seq'] > watermarks[self.engine.slot_of(record['user'])]:
+                worker = self.engine.worker_for(record['user'])
+                entries_by_worker[worker].append((record['seq'], self.engine.keyed(record['user'], _record_goal(record))))
+
+        # Each worker applied its writes in seq order, so replay them that way
+        futures = [
+            worker.call("replay", (sorted(entries), max_seq))
+            for worker, entries in entries_by_worker.items()
+        ]
+        replayed = failed = 0
+        for future in futures:
+            result = future.result()
+            replayed += result['replayed']
+            failed += result['failed']
+
+        self._seq = itertools.count(max_seq + 1)
+        self._issued = max_seq
+        self.log.open()
+        logger.info("Restored athlete state: %d snapshot files, %d log records replayed (%d failed) in %.2fs",
+                    loaded, replayed, failed, time.perf_counter() - started)
+
+    def start(self):
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name="snapshotter", daemon=True)
+        self._snapshotter.start()
+
+    def write(self, user_id, goal):
+        # Apply the write on the user's engine, then make it durable before
+        # the caller answers the client. Failed goals, and API calls that
+        # report a Status other than ok, changed nothing and are not logged.
+        seq, results = self.engine.write(user_id, goal, self.next_seq)
+        if _applied(results):
+            self.log.append(_record(seq, user_id, goal)).result()
+            self._writes_since_snapshot += 1
+            if self._writes_since_snapshot >= self.snapshot_after_writes:
+                self._snapshot_wanted.set()
+        return results
+
+    def write_batch(self, writes):
+        # writes is a list of (user_id, goal). Each worker applies its share
+        # in one call, and all successful writes share one group commit.
+        # Returns (ok, results or error message) per write, in input order.
+        applied = self.engine.write_batch(writes, self.next_seq)
+        futures = [
+            self.log.append(_record(seq, user_id, goal))
+            for (user_id, goal), (seq, ok, results) in zip(writes, applied)
+            if ok and _applied(results)
+        ]
+        for future in futures:
+            future.result()
+        if futures:
+            self._writes_since_snapshot += len(futures)
+            if self._writes_since_snapshot >= self.snapshot_after_writes:
+                self._snapshot_wanted.set()
+        return [(ok, results) for _, ok, results in applied]
+
+    def _snapshot_loop(self):
+        while not self._stopping.is_set():
+            self._snapshot_wanted.wait(self.snapshot_interval)
+            if self._stopping.is_set():
+                break
+            self._snapshot_wanted.clear()
+            if self._writes_since_snapshot:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.exception("Error taking snapshot: %s", e)
+
+    def snapshot(self):
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            self._writes_since_snapshot = 0
+            snapshot_id = f"{int(time.time() * 1000)}"
+            directory = os.path.join(self.snapshot_dir, snapshot_id)
+            os.makedirs(directory)
+
+            # Queued behind each worker's earlier writes, so every dump is a
+            # consistent cut. Seqs are handed out under the write lock, so
+            # none issued before the lock was taken can still be on its way
+            # to this worker: the dump covers its slots up to that point
+            # even if the worker has been idle since much older writes, and
+            # an idle worker does not hold back log compaction.
+            futures = []
+            for worker in self.engine.workers:
+                slots = self.engine.slots_of(worker)
+                with worker.write_lock:
+                    futures.append((slots, self._issued, worker.call("snapshot", (directory, slots))))
+
+            slots_manifest = {}
+            users = 0
+            for slots, issued, future in futures:
+                result = future.result()
+                users += result['users']
+                for slot in slots:
+                    path = result['files'].get(slot)
+                    slots_manifest[str(slot)] = {
+                        'seq': max(result['seq'], issued),
+                        'file': os.path.relpath(path, self.snapshot_dir) if path else None,
+                    }
+
+            manifest = {'id': snapshot_id, 'created': time.time(), 'users': users, 'slots': slots_manifest}
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path)
+
+            # Older snapshots and fully covered log segments are now redundant
+            for entry in os.listdir(self.snapshot_dir):
+                path = os.path.join(self.snapshot_dir, entry)
+                if entry != snapshot_id and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+            self.log.rotate()
+            self.log.compact(min(entry['seq'] for entry in slots_manifest.values()))
+
+            logger.info("Snapshot %s: %d athletes in %.2fs", snapshot_id, users, time.perf_counter() - started)
+
+    def close(self):
+        self._stopping.set()
+        self._snapshot_wanted.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        try:
+            if self._writes_since_snapshot:
+                self.snapshot()
+        finally:
+            self.log.close()
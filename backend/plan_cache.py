@@ -0,0 +1,118 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+# Write invalidations are tracked per stripe of users rather than per user so
+# the bookkeeping stays bounded no matter how large the roster gets
+INVALIDATION_STRIPES = 4096
+
+
+class StripedInvalidation:
+    # Tokens that go stale when a user is written to or everything is
+    # reloaded. A cache takes a token before reading from the engine and
+    # stores the result only if the token is still current, so nothing read
+    # before a write outlives it. Not locked itself; callers hold their
+    # cache's lock around invalidate() and clear().
+
+    def __init__(self, stripes=INVALIDATION_STRIPES):
+        self._stripes = [0] * stripes
+        self._epoch = 0
+
+    def _stripe(self, user_id):
+        return zlib.crc32(str(user_id).encode('utf-8')) % len(self._stripes)
+
+    def token(self, user_id):
+        return (self._epoch, self._stripes[self._stripe(user_id)])
+
+    def invalidate(self, user_id):
+        self._stripes[self._stripe(user_id)] += 1
+
+    def clear(self):
+        self._epoch += 1
+
+
+def plan_key(fitness_level, sport, diet_type, injuries, workload_zone):
+    # Injury order matters: get_injury_recommendations/2 keeps the first few
+    return (fitness_level, sport, diet_type, tuple(tuple(injury) for injury in injuries), workload_zone)
+
+
+class PlanCache:
+    # LRU of formatted plans keyed on the plan's input signature, shared by
+    # every athlete with the same inputs, plus a bounded memo of each user's
+    # current signature so repeat requests skip the engine entirely.
+
+    def __init__(self, maxsize=4096, max_users=100000):
+        self.maxsize = maxsize
+        self.max_users = max_users
+        self._plans = OrderedDict()
+        self._signatures = OrderedDict()
+        self._invalidation = StripedInvalidation()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def token(self, user_id):
+        # Taken before reading from the engine; a write to the user (or a
+        # reload) in the meantime makes the token stale
+        return self._invalidation.token(user_id)
+
+    def signature(self, user_id):
+        with self._lock:
+            signature = self._signatures.get(user_id)
+            if signature is not None:
+                self._signatures.move_to_end(user_id)
+            return signature
+
+    def remember_signature(self, user_id, signature, token):
+        with self._lock:
+            if token != self.token(user_id):
+                return
+            self._signatures[user_id] = signature
+            self._signatures.move_to_end(user_id)
+            if len(self._signatures) > self.max_users:
+                self._signatures.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key, plan, token, user_id):
+        with self._lock:
+            if token != self.token(user_id):
+                return
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            if len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._invalidation.invalidate(user_id)
+            self._signatures.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidation.clear()
+            self._plans.clear()
+            self._signatures.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._plans),
+                'maxsize': self.maxsize,
+                'users': len(self._signatures),
+            }
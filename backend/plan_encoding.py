@@ -0,0 +1,84 @@
+import json
+import logging
+
+from prolog_terms import Var, goal
+
+logger = logging.getLogger(__name__)
+
+# Plan responses are put together from JSON fragments rather than encoded
+# per request. Every recommendation text is encoded once, when the knowledge
+# base is loaded, and a plan keeps its encoded body from then on; a request
+# only adds the per-user section versions. orjson is used when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+# (JSON key, get_full_plan/4 variable) per plan section, in response order
+SECTIONS = (
+    ('trainingPlan', 'TrainingPlan'),
+    ('nutritionPlan', 'NutritionPlan'),
+    ('injuryRecommendations', 'InjuryRecommendations'),
+)
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _encoder.encode(value).encode('utf-8')
+
+
+class EncodedPlan:
+    __slots__ = ('sections', 'prefix')
+
+    def __init__(self, sections, prefix):
+        # sections: the plan's texts by section, kept for payload logs
+        self.sections = sections
+        # prefix: the JSON object up to, not including, the versions
+        self.prefix = prefix
+
+    def body(self, versions):
+        return self.prefix + b',"versions":' + dumps(versions) + b'}'
+
+
+class PlanFragments:
+    # Encoded {"description": ..., "details": []} fragment per text. Texts
+    # outside the preloaded set are encoded on first use, up to max_size.
+
+    def __init__(self, texts=(), max_size=65536):
+        self.max_size = max_size
+        self._fragments = {}
+        for text in texts:
+            self.fragment(text)
+
+    def fragment(self, item):
+        text = str(item)
+        fragment = self._fragments.get(text)
+        if fragment is None:
+            fragment = b'{"description":' + dumps(text) + b',"details":[]}'
+            if len(self._fragments) < self.max_size:
+                self._fragments[text] = fragment
+        return fragment
+
+    def plan(self, result):
+        # result is a get_full_plan/4 solution
+        sections = {key: [str(item) for item in result[var]] for key, var in SECTIONS}
+        prefix = b'{' + b','.join(
+            b'"' + key.encode('ascii') + b'":[' + b','.join(self.fragment(text) for text in texts) + b']'
+            for key, texts in sections.items()
+        )
+        return EncodedPlan(sections, prefix)
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+def build_plan_fragments(engine):
+    try:
+        texts = {str(result['Text']) for result in engine.query(goal("plan_text", Var("Text")))}
+    except Exception as e:
+        logger.exception("Error loading plan texts: %s", e)
+        texts = ()
+    return PlanFragments(sorted(texts))
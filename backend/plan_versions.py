@@ -0,0 +1,62 @@
+import threading
+import time
+import uuid
+
+# The sections of a plan, in the order their versions appear in the ETag
+SECTIONS = ('trainingPlan', 'nutritionPlan', 'injuryRecommendations')
+
+
+class PlanVersions:
+    # Per-user version counters for each plan section, bumped by the writes
+    # that change them. A plan's ETag is built from these counters alone, so
+    # a conditional GET is answered without asking the engine anything. The
+    # ETag also carries an instance id and a rules epoch: tags handed out
+    # before a restart or a knowledge-base reload never match again.
+
+    def __init__(self):
+        self.instance = uuid.uuid4().hex[:8]
+        self._epoch = 0
+        self._reset_at = time.time()
+        # user -> [one counter per section..., last modified]
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def bump(self, user_id, sections):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = [0] * len(SECTIONS) + [self._reset_at]
+            for section in sections:
+                entry[SECTIONS.index(section)] += 1
+            entry[-1] = time.time()
+
+    def seen(self, user_id):
+        # Records a user whose plan was served, with no change counted
+        with self._lock:
+            if user_id not in self._users:
+                self._users[user_id] = [0] * len(SECTIONS) + [self._reset_at]
+
+    def known(self, user_id):
+        # Only users with a recorded version can match an ETag; anyone else
+        # may not exist at all
+        with self._lock:
+            return user_id in self._users
+
+    def current(self, user_id):
+        # Returns (versions by section, ETag, last modified timestamp)
+        with self._lock:
+            entry = self._users.get(user_id)
+            counters = entry[:-1] if entry is not None else [0] * len(SECTIONS)
+            modified = max(entry[-1], self._reset_at) if entry is not None else self._reset_at
+            epoch = self._epoch
+        etag = f"{self.instance}-{epoch}-" + ".".join(str(counter) for counter in counters)
+        return dict(zip(SECTIONS, counters)), etag, modified
+
+    def clear(self):
+        # The rules changed, so every plan may have changed
+        with self._lock:
+            self._epoch += 1
+            self._reset_at = time.time()
+
+    def __len__(self):
+        return len(self._users)
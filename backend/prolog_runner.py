@@ -0,0 +1,166 @@
+from ctypes import c_double
+
+from pyswip.core import (
+    PL_ATOM,
+    PL_Q_CATCH_EXCEPTION,
+    PL_Q_NODEBUG,
+    PL_STRING,
+    REP_UTF8,
+    PL_close_query,
+    PL_cons_functor_v,
+    PL_cons_list,
+    PL_discard_foreign_frame,
+    PL_exception,
+    PL_new_atom,
+    PL_new_functor,
+    PL_new_term_ref,
+    PL_new_term_refs,
+    PL_next_solution,
+    PL_open_foreign_frame,
+    PL_open_query,
+    PL_predicate,
+    PL_put_chars,
+    PL_put_integer,
+    PL_put_nil,
+    PL_put_variable,
+    _lib,
+    term_t,
+)
+from pyswip.easy import getTerm
+from pyswip.prolog import normalize_values
+
+from prolog_terms import Compound, Text, Var, plain_value
+
+# pyswip does not bind PL_put_float
+PL_put_float = _lib.PL_put_float
+PL_put_float.argtypes = [term_t, c_double]
+PL_put_float.restype = None
+
+
+class PrologCallError(Exception):
+    pass
+
+
+class BudgetExceeded(PrologCallError):
+    def __init__(self, goal, limit):
+        super().__init__(f"{goal.name}/{len(goal.args)} exceeded its {limit} budget")
+        self.limit = limit
+
+
+class GoalRunner:
+    # Runs Goal tuples against the engine of the current process. Arguments
+    # are put straight into term references and the query is opened on a
+    # cached predicate handle, so nothing is tokenised or parsed per call.
+
+    def __init__(self):
+        self._predicates = {}
+        self._functors = {}
+
+    def _predicate(self, name, arity):
+        handle = self._predicates.get((name, arity))
+        if handle is None:
+            handle = self._predicates[(name, arity)] = PL_predicate(name, arity, None)
+        return handle
+
+    def _functor(self, name, arity):
+        handle = self._functors.get((name, arity))
+        if handle is None:
+            handle = self._functors[(name, arity)] = PL_new_functor(PL_new_atom(name), arity)
+        return handle
+
+    def _put(self, term, value, variables):
+        if isinstance(value, Var):
+            PL_put_variable(term)
+            if value.name is not None:
+                variables.append((value.name, term))
+        elif isinstance(value, str):
+            PL_put_chars(term, PL_ATOM | REP_UTF8, -1, value.encode("utf-8"))
+        elif isinstance(value, Text):
+            PL_put_chars(term, PL_STRING | REP_UTF8, -1, value.value.encode("utf-8"))
+        elif isinstance(value, bool):
+            PL_put_chars(term, PL_ATOM | REP_UTF8, -1, b"true" if value else b"false")
+        elif isinstance(value, int):
+            PL_put_integer(term, value)
+        elif isinstance(value, float):
+            PL_put_float(term, value)
+        elif isinstance(value, Compound):
+            args = PL_new_term_refs(len(value.args))
+            for i, arg in enumerate(value.args):
+                self._put(args + i, arg, variables)
+            PL_cons_functor_v(term, self._functor(value.name, len(value.args)), args)
+        elif isinstance(value, (list, tuple)):
+            PL_put_nil(term)
+            for item in reversed(value):
+                head = PL_new_term_ref()
+                self._put(head, item, variables)
+                PL_cons_list(term, head, term)
+        else:
+            raise TypeError(f"Cannot pass {type(value).__name__} to Prolog: {value!r}")
+
+    def _raise_exception(self, qid, goal):
+        exception = PL_exception(qid)
+        if exception:
+            error = plain_value(normalize_values(getTerm(exception)))
+            raise PrologCallError(f"{goal.name}/{len(goal.args)} raised {error}")
+
+    def run(self, goal, budget=None):
+        # Returns one dict of named variable bindings per solution. With a
+        # budget of (seconds, inferences) the goal runs under
+        # run_with_budget/6 and BudgetExceeded is raised if it runs out.
+        if budget is not None:
+            return self._run_with_budget(goal, *budget)
+        frame = PL_open_foreign_frame()
+        try:
+            args = PL_new_term_refs(len(goal.args))
+            variables = []
+            for i, value in enumerate(goal.args):
+                self._put(args + i, value, variables)
+
+            predicate = self._predicate(goal.name, len(goal.args))
+            qid = PL_open_query(None, PL_Q_NODEBUG | PL_Q_CATCH_EXCEPTION, predicate, args)
+            solutions = []
+            try:
+                while PL_next_solution(qid):
+                    solutions.append({
+                        name: plain_value(normalize_values(getTerm(ref)))
+                        for name, ref in variables
+                    })
+                self._raise_exception(qid, goal)
+            finally:
+                PL_close_query(qid)
+            return solutions
+        finally:
+            PL_discard_foreign_frame(frame)
+
+    def _run_with_budget(self, goal, seconds, inferences):
+        frame = PL_open_foreign_frame()
+        try:
+            # run_with_budget(Goal, Template, Seconds, Inferences, Solutions, Status)
+            args = PL_new_term_refs(6)
+            variables = []
+            self._put(args, Compound(goal.name, goal.args), variables)
+            # The template is the list of the goal's named variables
+            PL_put_nil(args + 1)
+            for _, ref in reversed(variables):
+                PL_cons_list(args + 1, ref, args + 1)
+            PL_put_float(args + 2, float(seconds or 0))
+            PL_put_integer(args + 3, int(inferences or 0))
+            PL_put_variable(args + 4)
+            PL_put_variable(args + 5)
+
+            predicate = self._predicate("run_with_budget", 6)
+            qid = PL_open_query(None, PL_Q_NODEBUG | PL_Q_CATCH_EXCEPTION, predicate, args)
+            try:
+                if not PL_next_solution(qid):
+                    self._raise_exception(qid, goal)
+                    return []
+                found = plain_value(normalize_values(getTerm(args + 4)))
+                status = plain_value(normalize_values(getTerm(args + 5)))
+            finally:
+                PL_close_query(qid)
+            if status != "ok":
+                raise BudgetExceeded(goal, status)
+            names = [name for name, _ in variables]
+            return [dict(zip(names, values)) for values in found]
+        finally:
+            PL_discard_foreign_frame(frame)
@@ -0,0 +1,50 @@
+from collections import namedtuple
+
+# Goals are described as plain data (predicate name plus arguments) so they
+# can be sent to an engine worker and built there directly as terms, without
+# going through Prolog source text. Arguments map onto Prolog as:
+#   str -> atom, int/float -> number, list/tuple -> list,
+#   Compound -> compound term, Text -> string, Var -> fresh variable
+Goal = namedtuple('Goal', ['name', 'args'])
+Compound = namedtuple('Compound', ['name', 'args'])
+# Free text (names, notes, descriptions) is passed as a Prolog string: it is
+# stored inside the clause that holds it instead of in the atom table
+Text = namedtuple('Text', ['value'])
+
+
+class Var:
+    # A fresh variable for each occurrence. Named variables come back in the
+    # solution dicts under their name; unnamed ones play the role of `_`.
+    __slots__ = ('name',)
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __repr__(self):
+        return self.name or '_'
+
+
+def goal(name, *args):
+    return Goal(name, args)
+
+
+def compound(name, *args):
+    return Compound(name, args)
+
+
+def text(value):
+    return Text(value) if isinstance(value, str) else value
+
+
+def plain_value(value):
+    # pyswip hands back atoms as str and Prolog strings as bytes; make
+    # everything plain and picklable before it crosses the pipe
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    if isinstance(value, dict):
+        return {key: plain_value(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain_value(v) for v in value]
+    if isinstance(value, (str, int, float)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,113 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import shutil
+import threading
+import time
+import uuid
+
+# Functions listed in the Python profile of a request
+PROFILE_TOP = 40
+
+_PROFILE_ID = re.compile(r'^[0-9]{13}-[0-9a-f]{8}$')
+
+
+class RequestProfiler:
+    # Profiles chosen requests end to end: the Flask thread under cProfile
+    # and every engine read the request makes under the worker's Python and
+    # SWI-Prolog profilers (see EnginePool.set_profile). Each profile is kept
+    # as a directory under the profile dir:
+    #   report.json    request, timings, Python and per-engine-call profiles
+    #   python.prof    the Flask thread's cProfile data, for pstats/snakeviz
+    #
+    # A request is profiled when an admin asks for it or it is sampled at
+    # sample_rate, optionally only on some endpoints. With both off, the
+    # only cost is the check in start().
+    #
+    # cProfile allows one active profiler per process (since 3.12), so one
+    # request is profiled at a time; others are served unprofiled.
+
+    def __init__(self, directory, sample_rate=0.0, endpoints=None, keep=50):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.endpoints = endpoints
+        self.keep = keep
+        self._busy = threading.Lock()
+
+    def settings(self):
+        return {
+            'sampleRate': self.sample_rate,
+            'endpoints': sorted(self.endpoints) if self.endpoints else None,
+            'keep': self.keep,
+        }
+
+    def sampled(self, endpoint):
+        return (self.sample_rate > 0
+                and (not self.endpoints or endpoint in self.endpoints)
+                and random.random() < self.sample_rate)
+
+    def start(self):
+        # A running profile, or None if another request holds the profiler
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = {'python': cProfile.Profile(), 'engine': [], 'started': time.time(), 'clock': time.perf_counter()}
+        profile['python'].enable()
+        return profile
+
+    def finish(self, profile, request):
+        # request: {'method', 'path', 'endpoint', 'status'}. Returns the
+        # profile ID the reports are stored under.
+        try:
+            profile['python'].disable()
+            seconds = time.perf_counter() - profile['clock']
+        finally:
+            self._busy.release()
+
+        profile_id = f"{int(profile['started'] * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(self.directory, profile_id)
+        os.makedirs(directory)
+        profile['python'].dump_stats(os.path.join(directory, "python.prof"))
+        text = io.StringIO()
+        pstats.Stats(profile['python'], stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        engine_seconds = sum(call['seconds'] for call in profile['engine'])
+        report = {
+            'id': profile_id,
+            'created': profile['started'],
+            'request': request,
+            'seconds': round(seconds, 6),
+            'engineSeconds': round(engine_seconds, 6),
+            'engineCalls': len(profile['engine']),
+            'python': text.getvalue(),
+            'engine': profile['engine'],
+        }
+        with open(os.path.join(directory, "report.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        profile_ids = self.list()
+        for profile_id in profile_ids[self.keep:]:
+            shutil.rmtree(os.path.join(self.directory, profile_id), ignore_errors=True)
+
+    def list(self):
+        # Stored profile IDs, newest first
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((entry for entry in os.listdir(self.directory) if _PROFILE_ID.match(entry)), reverse=True)
+
+    def path(self, profile_id, filename):
+        # Path of one stored report file, or None
+        if not _PROFILE_ID.match(profile_id) or filename not in ('report.json', 'python.prof'):
+            return None
+        path = os.path.join(self.directory, profile_id, filename)
+        return path if os.path.exists(path) else None
+
+    def summary(self, profile_id):
+        with open(self.path(profile_id, 'report.json'), encoding="utf-8") as f:
+            report = json.load(f)
+        return {key: report[key] for key in ('id', 'created', 'request', 'seconds', 'engineSeconds', 'engineCalls')}
@@ -0,0 +1,128 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from prolog_terms import Var, goal
+
+# Injuries whose notes are not a recovery status
+UNSPECIFIED = 'unspecified'
+# Athletes who have not picked a sport yet
+NO_SPORT = 'none'
+
+
+class RosterStats:
+    # Roster-wide aggregates for coach dashboards, updated by the write paths
+    # as they succeed so a read only copies a few small counters. The only
+    # per-athlete state is each athlete's fitness level and sport, needed to
+    # move them between buckets when their sport changes.
+    #
+    # rebuild() recomputes everything from the engines. Writes run inside
+    # writing(), and a rebuild waits for those in flight and holds new ones
+    # back, so no write is counted twice or missed across the swap.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._writes_done = threading.Condition(self._lock)
+        self._writers = 0
+        self._rebuilding = False
+        self._reset()
+
+    def _reset(self):
+        self._athletes = {}
+        self.fitness_levels = Counter()
+        self.sports = Counter()
+        self.injuries = Counter()
+        self.recovery = Counter()
+
+    @contextmanager
+    def writing(self):
+        with self._lock:
+            while self._rebuilding:
+                self._writes_done.wait()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+                self._writes_done.notify_all()
+
+    def _add_athlete(self, user_id, fitness_level, sport):
+        self._athletes[user_id] = (fitness_level, sport)
+        self.fitness_levels[fitness_level] += 1
+        self.sports[sport] += 1
+
+    def _add_injury(self, injury_type, severity, recovery_status, count=1):
+        self.injuries[(injury_type, severity)] += count
+        self.recovery[recovery_status] += count
+
+    def add_athlete(self, user_id, fitness_level, sport=None, injuries=()):
+        # injuries is a list of (type, severity, recovery status)
+        with self._lock:
+            if user_id not in self._athletes:
+                self._add_athlete(user_id, fitness_level, sport or NO_SPORT)
+            for injury_type, severity, recovery_status in injuries:
+                self._add_injury(injury_type, severity, recovery_status)
+
+    def set_sport(self, user_id, sport):
+        with self._lock:
+            fitness_level, previous = self._athletes.get(user_id, (None, None))
+            if previous is None or previous == sport:
+                return
+            self.sports[previous] -= 1
+            if not self.sports[previous]:
+                del self.sports[previous]
+            self.sports[sport] += 1
+            self._athletes[user_id] = (fitness_level, sport)
+
+    def add_injury(self, injury_type, severity, recovery_status):
+        with self._lock:
+            self._add_injury(injury_type, severity, recovery_status)
+
+    def snapshot(self):
+        with self._lock:
+            by_type = Counter()
+            by_severity = Counter()
+            for (injury_type, severity), count in self.injuries.items():
+                by_type[injury_type] += count
+                by_severity[severity] += count
+            return {
+                'athletes': len(self._athletes),
+                'fitnessLevels': dict(self.fitness_levels),
+                'sports': dict(self.sports),
+                'injuries': {
+                    'total': sum(self.injuries.values()),
+                    'byType': dict(by_type),
+                    'bySeverity': dict(by_severity),
+                    'byTypeAndSeverity': [
+                        {'type': injury_type, 'severity': severity, 'count': count}
+                        for (injury_type, severity), count in sorted(self.injuries.items(), key=str)
+                    ],
+                },
+                'recoveryStatus': dict(self.recovery),
+            }
+
+    def rebuild(self, engine):
+        # Recount from the fact base; returns the snapshots from before and
+        # after so callers can report any drift
+        with self._lock:
+            while self._rebuilding:
+                self._writes_done.wait()
+            self._rebuilding = True
+            while self._writers:
+                self._writes_done.wait()
+        try:
+            athletes = engine.broadcast(goal("roster_athlete", Var("UserID"), Var("FitnessLevel"), Var("Sport")))
+            injuries = engine.broadcast(goal("roster_injury_count", Var("Type"), Var("Severity"), Var("Status"), Var("Count")))
+            before = self.snapshot()
+            with self._lock:
+                self._reset()
+                for result in (result for results in athletes for result in results):
+                    self._add_athlete(result['UserID'], result['FitnessLevel'], result['Sport'])
+                for result in (result for results in injuries for result in results):
+                    self._add_injury(result['Type'], result['Severity'], result['Status'], result['Count'])
+            return before, self.snapshot()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._writes_done.notify_all()
@@ -0,0 +1,21 @@
+import os
+
+from waitress import serve
+
+# Production entry point: a multi-threaded WSGI server in front of the app.
+# Handler threads only wait on engine futures, so there can be more of them
+# than engine workers; beyond each worker's queue limit requests get a 503.
+# `python app.py` is still the development server, in debug mode but without
+# the reloader, which would start a second engine pool over the data dir.
+from app import app
+
+if __name__ == '__main__':
+    serve(
+        app,
+        host=os.environ.get("COACH_HOST", "0.0.0.0"),
+        port=int(os.environ.get("COACH_PORT", 5000)),
+        threads=int(os.environ.get("COACH_HTTP_THREADS", 32)),
+        connection_limit=int(os.environ.get("COACH_CONNECTION_LIMIT", 1000)),
+        channel_timeout=int(os.environ.get("COACH_CHANNEL_TIMEOUT", 30)),
+        ident="coach",
+    )
@@ -0,0 +1,249 @@
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+# Logged training sessions live outside the Prolog database, column by column
+# in NumPy arrays per athlete. On disk they are one append-only file of
+# fixed-size records, read back in a single np.fromfile call at startup.
+RECORD = np.dtype([
+    ('user', 'S64'),
+    ('day', '<i4'),
+    ('minutes', '<f4'),
+    ('rpe', '<f4'),
+    ('sport', 'S32'),
+])
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+
+class SessionSeries:
+    # One athlete's sessions; arrays grow by doubling and are never sorted,
+    # since every metric is computed from per-day sums
+
+    __slots__ = ('days', 'minutes', 'rpe', 'sports', 'count')
+
+    def __init__(self, days=None, minutes=None, rpe=None, sports=None):
+        if days is None:
+            days = np.empty(8, dtype=np.int32)
+            minutes = np.empty(8, dtype=np.float32)
+            rpe = np.empty(8, dtype=np.float32)
+            sports = np.empty(8, dtype=np.int16)
+            self.count = 0
+        else:
+            self.count = len(days)
+        self.days, self.minutes, self.rpe, self.sports = days, minutes, rpe, sports
+
+    def append(self, day, minutes, rpe, sport):
+        if self.count == len(self.days):
+            capacity = max(8, 2 * self.count)
+            for name in ('days', 'minutes', 'rpe', 'sports'):
+                grown = np.empty(capacity, dtype=getattr(self, name).dtype)
+                grown[:self.count] = getattr(self, name)[:self.count]
+                setattr(self, name, grown)
+        self.days[self.count] = day
+        self.minutes[self.count] = minutes
+        self.rpe[self.count] = rpe
+        self.sports[self.count] = sport
+        self.count += 1
+
+    def columns(self):
+        n = self.count
+        return self.days[:n], self.minutes[:n], self.rpe[:n], self.sports[:n]
+
+
+class SessionStore:
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.path = os.path.join(directory, "sessions.bin")
+        self.fsync = fsync
+        self._series = {}
+        self._sports = []
+        self._sport_codes = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _sport_code(self, sport):
+        code = self._sport_codes.get(sport)
+        if code is None:
+            code = self._sport_codes[sport] = len(self._sports)
+            self._sports.append(sport)
+        return code
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        records = np.empty(0, dtype=RECORD)
+        if os.path.exists(self.path):
+            # A torn final record from a crash mid-write is dropped
+            count = os.path.getsize(self.path) // RECORD.itemsize
+            records = np.fromfile(self.path, dtype=RECORD, count=count)
+            with open(self.path, "r+b") as f:
+                f.truncate(count * RECORD.itemsize)
+
+        sports, sport_codes = np.unique(records['sport'], return_inverse=True)
+        for sport in sports:
+            self._sport_code(sport.decode('utf-8'))
+        order = np.argsort(records['user'], kind='stable')
+        users, starts = np.unique(records['user'][order], return_index=True)
+        for user, start, end in zip(users, starts, list(starts[1:]) + [len(order)]):
+            rows = order[start:end]
+            self._series[user.decode('utf-8')] = SessionSeries(
+                records['day'][rows].astype(np.int32),
+                records['minutes'][rows].astype(np.float32),
+                records['rpe'][rows].astype(np.float32),
+                sport_codes[rows].astype(np.int16),
+            )
+        self._file = open(self.path, "ab")
+        return len(records)
+
+    def append(self, user_id, sessions):
+        # sessions is a list of (date, minutes, rpe, sport); all are made
+        # durable with one write
+        records = np.empty(len(sessions), dtype=RECORD)
+        for record, (day, minutes, rpe, sport) in zip(records, sessions):
+            record['user'] = user_id.encode('utf-8')
+            record['day'] = day.toordinal()
+            record['minutes'] = minutes
+            record['rpe'] = rpe
+            record['sport'] = sport.encode('utf-8')
+        with self._lock:
+            self._file.write(records.tobytes())
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            series = self._series.get(user_id)
+            if series is None:
+                series = self._series[user_id] = SessionSeries()
+            for day, minutes, rpe, sport in sessions:
+                series.append(day.toordinal(), minutes, rpe, self._sport_code(sport))
+
+    def _columns(self, user_id):
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is None:
+                return None
+            # Copies, so metrics never see a half-grown array
+            return [column.copy() for column in series.columns()]
+
+    def sessions(self, user_id, start=None, end=None):
+        # The user's sessions between two dates (inclusive), by date
+        columns = self._columns(user_id)
+        if columns is None:
+            return []
+        days, minutes, rpe, sports = columns
+        mask = np.ones(len(days), dtype=bool)
+        if start is not None:
+            mask &= days >= start.toordinal()
+        if end is not None:
+            mask &= days <= end.toordinal()
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(days[rows], kind='stable')]
+        return [{
+            'date': date.fromordinal(int(days[i])).isoformat(),
+            'duration': float(minutes[i]),
+            'rpe': float(rpe[i]),
+            'sport': self._sports[sports[i]],
+            'load': float(minutes[i] * rpe[i]),
+        } for i in rows]
+
+    def workload(self, user_id, as_of, weeks=12, pending=()):
+        # pending sessions, in append's format, count as if already logged
+        columns = self._columns(user_id)
+        if columns is None:
+            columns = [np.empty(0, dtype=np.int32)] + [np.empty(0, dtype=np.float32)] * 2
+        days, minutes, rpe = columns[:3]
+        if pending:
+            days = np.append(days, [day.toordinal() for day, _, _, _ in pending]).astype(np.int32)
+            minutes = np.append(minutes, [m for _, m, _, _ in pending]).astype(np.float32)
+            rpe = np.append(rpe, [r for _, _, r, _ in pending]).astype(np.float32)
+        return workload_metrics(days, minutes, rpe, as_of, weeks)
+
+    def count(self, user_id):
+        # Sessions logged for the user so far
+        with self._lock:
+            series = self._series.get(user_id)
+            return series.count if series is not None else 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return len(self._series)
+
+
+def _ratio(numerator, denominator):
+    # Element-wise division with NaN where the denominator is zero
+    out = np.full(np.shape(numerator), np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def _number(value, digits=2):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def workload_metrics(days, minutes, rpe, as_of, weeks=12):
+    # Session-RPE load (minutes x RPE) summed per day from the first session
+    # (or the earliest window needed) up to as_of, then every rolling
+    # quantity for every day from cumulative sums and window views: the whole
+    # history costs a handful of array passes, whatever its length.
+    end = as_of.toordinal()
+    start = end - max(CHRONIC_DAYS, ACUTE_DAYS * weeks) + 1
+    if len(days):
+        start = min(start, int(days.min()))
+    span = end - start + 1
+    # Rolling windows reach back before the first day; pad with zeros
+    pad = CHRONIC_DAYS
+    mask = days <= end
+    offsets = days[mask] - start + pad
+    load = np.bincount(offsets, weights=(minutes * rpe)[mask], minlength=span + pad)
+    volume = np.bincount(offsets, weights=minutes[mask], minlength=span + pad)
+    count = np.bincount(offsets, minlength=span + pad)
+
+    def rolling(values, window):
+        total = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        return (total[window:] - total[:-window])[pad - window + 1:]
+
+    acute = rolling(load, ACUTE_DAYS)
+    chronic = rolling(load, CHRONIC_DAYS)
+    minutes_7 = rolling(volume, ACUTE_DAYS)
+    sessions_7 = rolling(count, ACUTE_DAYS)
+
+    mean = acute / ACUTE_DAYS
+    # Exact per-window spread; a cumulative sum of squares loses precision
+    # over years of history and turns flat weeks into huge monotony values
+    std = np.lib.stride_tricks.sliding_window_view(load[pad - ACUTE_DAYS + 1:], ACUTE_DAYS).std(axis=1)
+    monotony = _ratio(mean, std)
+    strain = acute * monotony
+    # A chronic window reaching back before the first session is padding,
+    # not rest; the ratio is undefined until a full window has been logged
+    acwr = _ratio(mean, chronic / CHRONIC_DAYS)
+    if mask.any():
+        window_starts = start + np.arange(span) - CHRONIC_DAYS + 1
+        acwr[window_starts < int(days[mask].min())] = np.nan
+    else:
+        acwr[:] = np.nan
+
+    # One row per week, ending on as_of
+    week_ends = np.arange(span - 1, -1, -ACUTE_DAYS)[:weeks][::-1]
+    history = [{
+        'weekEnding': (as_of - timedelta(days=int(span - 1 - i))).isoformat(),
+        'load': round(float(acute[i]), 1),
+        'minutes': round(float(minutes_7[i]), 1),
+        'sessions': int(sessions_7[i]),
+        'monotony': _number(monotony[i]),
+        'strain': _number(strain[i], 1),
+        'acwr': _number(acwr[i]),
+    } for i in week_ends]
+
+    current = dict(history[-1]) if history else {}
+    current.update({
+        'acuteLoad': round(float(mean[-1]), 1),
+        'chronicLoad': round(float(chronic[-1] / CHRONIC_DAYS), 1),
+    })
+    return {'asOf': as_of.isoformat(), 'current': current, 'weeks': history}
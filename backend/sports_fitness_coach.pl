@@ -1,12 +1,16 @@
 % Sports Fitness Coach Expert System
 
+:- use_module(library(time)).
+:- use_module(library(prolog_profile)).
+
 % Dynamic predicate declarations
 :- dynamic user_profile/7.
 :- dynamic user_sport/3.
-:- dynamic user_injury/6.
-:- dynamic user_achievement/5.
+:- dynamic user_injury/7.
+:- dynamic user_achievement/6.
 :- dynamic user_diet/3.
 :- dynamic user_training_schedule/2.
+:- dynamic user_workload/2.
 :- dynamic filter_diet_recommendations/3.
 :- dynamic is_vegetarian_friendly/2.
 :- dynamic contains_animal_products/1.
@@ -26,11 +30,18 @@
 :- dynamic competition_details/4.
 % competition_details(UserID, CompetitionType, Format, Level).
 
+% Training schedule: the date ('YYYY-MM-DD') of the competition the
+% athlete's periodized calendar builds up to
+% user_training_schedule(UserID, CompetitionDate).
+
 % Medical history
-% user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes).
+% user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key).
 
 % Past achievements
-% user_achievement(UserID, Title, Date, Category, Description).
+% user_achievement(UserID, Title, Date, Category, Description, Key).
+
+% Key identifies a history record by its athlete and position (see
+% history_key/3), so history pages resume with indexed lookups
 
 % Diet preferences
 % diet_preference(UserID, DietType, Restrictions).
@@ -433,7 +444,7 @@ generate_training_plan(UserID, TrainingPlan) :-
     
     % Check for injuries and modify if needed
     findall(Mod, (
-        user_injury(UserID, InjuryType, _, Severity, _, _),
+        user_injury(UserID, InjuryType, _, Severity, _, _, _),
         recovery_status(RecoveryStatus), % Make sure RecoveryStatus is bound
         modify_training_for_injury(InjuryType, RecoveryStatus, InjuryMods),
         member(Mod, InjuryMods)
@@ -512,19 +523,353 @@ set_competition(UserID, CompType, Format, Level) :-
     retractall(competition_details(UserID, _, _, _)),
     assertz(competition_details(UserID, CompType, Format, Level)).
 
+% '' leaves the athlete without a competition date
+set_competition_date(UserID, '') :- !,
+    retractall(user_training_schedule(UserID, _)).
+set_competition_date(UserID, Date) :-
+    retractall(user_training_schedule(UserID, _)),
+    assertz(user_training_schedule(UserID, Date)).
+
 % Add injury with new structure
 add_injury(UserID, Type, Date, Severity, RecoveryTime, Notes) :-
-    assertz(user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes)).
+    next_history_position(injury, UserID, Position),
+    history_key(UserID, Position, Key),
+    assertz(user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key)).
 
 % Add achievement with new structure
 add_achievement(UserID, Title, Date, Category, Description) :-
-    assertz(user_achievement(UserID, Title, Date, Category, Description)).
+    next_history_position(achievement, UserID, Position),
+    history_key(UserID, Position, Key),
+    assertz(user_achievement(UserID, Title, Date, Category, Description, Key)).
 
 set_diet(UserID, DietType, Restrictions) :-
     diet_type(DietType),
     retractall(user_diet(UserID, _, _)),
     assertz(user_diet(UserID, DietType, Restrictions)).
 
+% Current acute:chronic workload ratio, computed by the API from the logged
+% training sessions; none clears it
+set_workload(UserID, none) :- !,
+    retractall(user_workload(UserID, _)).
+set_workload(UserID, ACWR) :-
+    retractall(user_workload(UserID, _)),
+    assertz(user_workload(UserID, ACWR)).
+
+% Write API
+% Each api_* predicate is one complete write: it checks the athlete and the
+% values, applies the change, and reports the outcome in Status (ok,
+% unknown_user, or invalid_<field>) instead of failing.
+known_user(UserID) :-
+    user_profile(UserID, _, _, _, _, _, _), !.
+
+api_set_sport(UserID, Sport, Level, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   \+ sport_category(Sport) -> Status = invalid_sport
+    ;   \+ fitness_level(Level) -> Status = invalid_level
+    ;   set_sport(UserID, Sport, Level), Status = ok
+    ).
+
+api_set_competition(UserID, CompType, Format, Level, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   \+ competition_type(CompType) -> Status = invalid_competition_type
+    ;   \+ competition_level(Level) -> Status = invalid_level
+    ;   set_competition(UserID, CompType, Format, Level), Status = ok
+    ).
+
+api_set_competition(UserID, CompType, Format, Level, Date, Status) :-
+    api_set_competition(UserID, CompType, Format, Level, Status),
+    (   Status == ok -> set_competition_date(UserID, Date) ; true ).
+
+api_set_diet(UserID, DietType, Restrictions, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   \+ diet_type(DietType) -> Status = invalid_diet_type
+    ;   set_diet(UserID, DietType, Restrictions), Status = ok
+    ).
+
+api_add_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   add_injury(UserID, Type, Date, Severity, RecoveryTime, Notes), Status = ok
+    ).
+
+api_add_achievement(UserID, Title, Date, Category, Description, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   add_achievement(UserID, Title, Date, Category, Description), Status = ok
+    ).
+
+api_set_workload(UserID, ACWR, Status) :-
+    (   \+ known_user(UserID) -> Status = unknown_user
+    ;   set_workload(UserID, ACWR), Status = ok
+    ).
+
+% History pages
+% An athlete's injuries and achievements are numbered 1, 2, ... in the order
+% they were logged. The number is folded into the record's key together
+% with the athlete, so "record N of this athlete" is a single lookup on an
+% argument that is unique per record, whatever the history's length.
+% Athletes stored under their integer key get 24 bits of positions; older
+% athletes, still stored under their ID, use the position as the key.
+history_key(UserID, Position, Key) :-
+    (   integer(UserID)
+    ->  Position < 1 << 24,
+        Key is UserID << 24 + Position
+    ;   Key = Position
+    ).
+
+history_taken(injury, UserID, Position) :-
+    history_key(UserID, Position, Key),
+    once(user_injury(UserID, _, _, _, _, _, Key)).
+history_taken(achievement, UserID, Position) :-
+    history_key(UserID, Position, Key),
+    once(user_achievement(UserID, _, _, _, _, Key)).
+
+% Positions have no gaps, so the first free one is found in O(log N)
+% lookups by doubling and then bisecting
+next_history_position(Kind, UserID, Position) :-
+    history_free_from(Kind, UserID, 1, High),
+    Low is High // 2,
+    history_first_free(Kind, UserID, Low, High, Position).
+
+history_free_from(Kind, UserID, Position, High) :-
+    (   history_taken(Kind, UserID, Position)
+    ->  Next is Position * 2,
+        history_free_from(Kind, UserID, Next, High)
+    ;   High = Position
+    ).
+
+% Low is taken (or 0) and High is free
+history_first_free(Kind, UserID, Low, High, Position) :-
+    (   High - Low =:= 1
+    ->  Position = High
+    ;   Middle is (Low + High) // 2,
+        (   history_taken(Kind, UserID, Middle)
+        ->  history_first_free(Kind, UserID, Middle, High, Position)
+        ;   history_first_free(Kind, UserID, Low, Middle, Position)
+        )
+    ).
+
+% The positions after After, in order, up to the last one logged
+history_position(Kind, UserID, After, Position) :-
+    Next is After + 1,
+    history_taken(Kind, UserID, Next),
+    (   Position = Next
+    ;   history_position(Kind, UserID, Next, Position)
+    ).
+
+% injury_history/11 and achievement_history/10 yield at most Limit of a
+% user's records, in the order they were logged, starting after position
+% After; each record comes with its Position, the cursor for the page that
+% follows it. The date range (From and To, '' for open) and a bound Type
+% or Category are checked here, so only one page of solutions is ever built
+% and a page costs the records it looks at, not the ones before After.
+history_date_in_range(Date, From, To) :-
+    ( From == '' -> true ; From @=< Date ),
+    ( To == '' -> true ; Date @=< To ).
+
+injury_history(UserID, From, To, After, Limit, Type, Date, Severity, RecoveryTime, Notes, Position) :-
+    limit(Limit,
+        ( history_position(injury, UserID, After, Position),
+          history_key(UserID, Position, Key),
+          user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key),
+          history_date_in_range(Date, From, To) )).
+
+achievement_history(UserID, From, To, After, Limit, Title, Date, Category, Description, Position) :-
+    limit(Limit,
+        ( history_position(achievement, UserID, After, Position),
+          history_key(UserID, Position, Key),
+          user_achievement(UserID, Title, Date, Category, Description, Key),
+          history_date_in_range(Date, From, To) )).
+
+% Roster analytics
+% Full recounts behind the API's roster counters, which the write paths keep
+% up to date; only used at startup and for consistency checks.
+roster_athlete(UserID, FitnessLevel, Sport) :-
+    user_profile(UserID, _, _, _, _, _, FitnessLevel),
+    (user_sport(UserID, Sport, _) -> true ; Sport = none).
+
+% Injuries logged through /api/injury keep their recovery status in Notes;
+% free-text notes are strings, and count when they spell out a status
+injury_recovery_status(Notes, Status) :-
+    (   ( atom(Notes) ; string(Notes) ),
+        recovery_status(Status0), atom_string(Status0, Notes)
+    ->  Status = Status0
+    ;   Status = unspecified
+    ).
+
+% Sport and competition level of every athlete, the facets of the API's
+% achievement index
+athlete_facets(UserID, Sport, Level) :-
+    user_profile(UserID, _, _, _, _, _, _),
+    (user_sport(UserID, Sport, _) -> true ; Sport = none),
+    (competition_details(UserID, _, _, Level) -> true ; Level = none).
+
+roster_injury_count(Type, Severity, Status, Count) :-
+    aggregate(count, UserID^Date^RecoveryTime^Notes^Key^(
+        user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key),
+        injury_recovery_status(Notes, Status)), Count).
+
+% Club imports
+% import_athlete(ID, Name, Age, Gender, Height, Weight, FitnessLevel, Sport, Diet, Competition, Injuries)
+% asserts a complete athlete in one call. Optional parts are [] when absent:
+%   Sport = [Sport, Level], Diet = [DietType, Restrictions],
+%   Competition = [CompType, Format, Level],
+%   Injuries = [[Type, Date, Severity, RecoveryTime, Notes], ...]
+% Everything is checked before anything is asserted, so a rejected record
+% leaves no partial athlete behind.
+import_athlete(ID, Name, Age, Gender, Height, Weight, FitnessLevel, Sport, Diet, Competition, Injuries) :-
+    \+ user_profile(ID, _, _, _, _, _, _),
+    fitness_level(FitnessLevel),
+    ( Sport = [SportName, SportLevel] -> sport_category(SportName), fitness_level(SportLevel) ; Sport == [] ),
+    ( Diet = [DietType, Restrictions] -> diet_type(DietType) ; Diet == [] ),
+    ( Competition = [_, _, _] ; Competition == [] ),
+    !,
+    new_user(ID, Name, Age, Gender, Height, Weight, FitnessLevel),
+    ( Sport == [] -> true ; set_sport(ID, SportName, SportLevel) ),
+    ( Diet == [] -> true ; set_diet(ID, DietType, Restrictions) ),
+    ( Competition = [CompType, Format, CompLevel] -> set_competition(ID, CompType, Format, CompLevel) ; true ),
+    forall(member([Type, Date, Severity, RecoveryTime, Notes], Injuries),
+           add_injury(ID, Type, Date, Severity, RecoveryTime, Notes)).
+
+% Athlete state persistence
+% The dynamic predicates that hold athlete state
+athlete_predicate(user_profile/7).
+athlete_predicate(user_sport/3).
+athlete_predicate(competition_details/4).
+athlete_predicate(user_injury/7).
+athlete_predicate(user_achievement/6).
+athlete_predicate(user_diet/3).
+athlete_predicate(user_training_schedule/2).
+athlete_predicate(user_workload/2).
+
+% Removes every athlete fact, e.g. before reloading them after a KB reload
+clear_athlete_facts :-
+    forall(athlete_predicate(Name/Arity),
+           ( functor(Head, Name, Arity), retractall(Head) )).
+
+% Every dynamic fact that belongs to an athlete, keyed by user ID
+athlete_fact(UserID, user_profile(UserID, Name, Age, Gender, Height, Weight, FitnessLevel)) :-
+    user_profile(UserID, Name, Age, Gender, Height, Weight, FitnessLevel).
+athlete_fact(UserID, user_sport(UserID, Sport, Level)) :-
+    user_sport(UserID, Sport, Level).
+athlete_fact(UserID, competition_details(UserID, CompType, Format, Level)) :-
+    competition_details(UserID, CompType, Format, Level).
+athlete_fact(UserID, user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key)) :-
+    user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes, Key).
+athlete_fact(UserID, user_achievement(UserID, Title, Date, Category, Description, Key)) :-
+    user_achievement(UserID, Title, Date, Category, Description, Key).
+athlete_fact(UserID, user_diet(UserID, DietType, Restrictions)) :-
+    user_diet(UserID, DietType, Restrictions).
+athlete_fact(UserID, user_training_schedule(UserID, Schedule)) :-
+    user_training_schedule(UserID, Schedule).
+athlete_fact(UserID, user_workload(UserID, ACWR)) :-
+    user_workload(UserID, ACWR).
+
+athlete_ids(UserIDs) :-
+    (   setof(UserID, Fact^(athlete_fact(UserID, Fact), atomic(UserID)), UserIDs)
+    ->  true
+    ;   UserIDs = []
+    ).
+
+% Snapshot files hold facts in SWI's fast binary term format
+dump_athlete_facts(File, UserIDs) :-
+    setup_call_cleanup(
+        open(File, write, Out, [type(binary)]),
+        forall(( member(UserID, UserIDs), athlete_fact(UserID, Fact) ),
+               fast_write(Out, Fact)),
+        close(Out)).
+
+load_athlete_facts(File) :-
+    setup_call_cleanup(
+        open(File, read, In, [type(binary)]),
+        load_athlete_stream(In),
+        close(In)).
+
+load_athlete_stream(In) :-
+    (   at_end_of_stream(In)
+    ->  true
+    ;   fast_read(In, Fact),
+        load_athlete_fact(Fact),
+        load_athlete_stream(In)
+    ).
+
+% Snapshots taken before history records had keys hold them without one;
+% they are numbered as they are loaded, in the order they were dumped
+load_athlete_fact(user_injury(UserID, Type, Date, Severity, RecoveryTime, Notes)) :- !,
+    add_injury(UserID, Type, Date, Severity, RecoveryTime, Notes).
+load_athlete_fact(user_achievement(UserID, Title, Date, Category, Description)) :- !,
+    add_achievement(UserID, Title, Date, Category, Description).
+load_athlete_fact(Fact) :-
+    assertz(Fact).
+
+% Query budgets
+% run_with_budget(Goal, Template, Seconds, Inferences, Solutions, Status)
+% collects every Template of Goal unless the wall-clock or inference budget
+% runs out first, in which case Status is time_limit or inference_limit and
+% the search is abandoned. A limit of 0 means unlimited.
+run_with_budget(Goal, Template, Seconds, Inferences, Solutions, Status) :-
+    catch(budget_time(Seconds, Inferences, findall(Template, Goal, Found), Result),
+          time_limit_exceeded, Result = time_limit),
+    (   Result == time_limit -> Status = time_limit, Solutions = []
+    ;   Result == inference_limit_exceeded -> Status = inference_limit, Solutions = []
+    ;   Status = ok, Solutions = Found
+    ).
+
+budget_time(Seconds, Inferences, Goal, Result) :-
+    (   Seconds > 0
+    ->  call_with_time_limit(Seconds, budget_inferences(Inferences, Goal, Result))
+    ;   budget_inferences(Inferences, Goal, Result)
+    ).
+
+budget_inferences(Inferences, Goal, Result) :-
+    (   Inferences > 0
+    ->  call_with_inference_limit(Goal, Inferences, Result)
+    ;   call(Goal), Result = (!)
+    ).
+
+% Engine metrics
+% Counters sampled around every query to attribute work to predicates
+query_counters(Inferences, CpuTime) :-
+    statistics(inferences, Inferences),
+    statistics(cputime, CpuTime).
+
+% Atom table size and the bytes held by atoms and by clauses
+engine_memory(Atoms, AtomSpace, ProgramSpace) :-
+    statistics(atoms, Atoms),
+    statistics(atom_space, AtomSpace),
+    statistics(program_space, ProgramSpace).
+
+% Per-request profiling
+% profile_start/0 and profile_stop/3 bracket one engine call. Nodes holds a
+% [Predicate, Calls, Redos, Exits, SelfTicks, ChildTicks] entry for every
+% predicate the call ran: port counts are exact, ticks are samples.
+profile_start :-
+    reset_profiler,
+    profiler(_, cputime).
+
+profile_stop(Samples, Seconds, Nodes) :-
+    profiler(_, false),
+    profile_data(Data),
+    get_dict(summary, Data, Summary),
+    get_dict(samples, Summary, Samples),
+    get_dict(time, Summary, Seconds),
+    get_dict(nodes, Data, NodeData),
+    findall([Predicate, Calls, Redos, Exits, Self, Children],
+            ( member(Node, NodeData),
+              get_dict(predicate, Node, Head),
+              format(string(Predicate), "~q", [Head]),
+              get_dict(call, Node, Calls),
+              get_dict(redo, Node, Redos),
+              get_dict(exit, Node, Exits),
+              get_dict(ticks_self, Node, Self),
+              get_dict(ticks_siblings, Node, Children)
+            ),
+            Nodes).
+
+% Clause counts of the athletes' dynamic predicates
+athlete_fact_count(Name, Arity, Count) :-
+    athlete_predicate(Name/Arity),
+    functor(Head, Name, Arity),
+    (   predicate_property(Head, number_of_clauses(Clauses)) -> Count = Clauses ; Count = 0 ).
+
 % Get full plan for a user
 get_full_plan(UserID, TrainingPlan, NutritionPlan, InjuryRecommendations) :-
     % Get user's fitness level
@@ -536,19 +881,166 @@ get_full_plan(UserID, TrainingPlan, NutritionPlan, InjuryRecommendations) :-
     % Get user's diet preferences
     (user_diet(UserID, DietType, _) -> true; DietType = balanced),
     
-    % Generate training plan
-    training_recommendation(Sport, FitnessLevel, TrainingPlan),
+    % Generate training plan, adjusted for the athlete's recent workload
+    training_recommendation(Sport, FitnessLevel, BaseTraining),
+    user_workload_zone(UserID, WorkloadZone),
+    workload_advice(WorkloadZone, WorkloadAdvice),
+    append(BaseTraining, WorkloadAdvice, TrainingPlan),
     
     % Generate nutrition plan
     diet_recommendation(Sport, DietType, NutritionPlan),
     
     % Get injury recommendations if user has injuries
-    (user_injury(UserID, _, _, _, _, _) ->
+    (user_injury(UserID, _, _, _, _, _, _) ->
         get_injury_recommendations(UserID, InjuryRecommendations)
     ;
         InjuryRecommendations = ["No current injuries. Continue with regular training and recovery protocols."]
     ).
 
+% Everything get_full_plan/4 depends on for a user; the API caches plans on it.
+% Injuries are read with the same argument positions as get_injury_recommendations/2.
+plan_signature(UserID, FitnessLevel, Sport, DietType, Injuries, WorkloadZone) :-
+    once(user_profile(UserID, _, _, _, _, _, FitnessLevel)),
+    (user_sport(UserID, Sport, _) -> true; Sport = general),
+    (user_diet(UserID, DietType, _) -> true; DietType = balanced),
+    findall([Type, Severity], user_injury(UserID, Type, Severity, _, _, _, _), Injuries),
+    user_workload_zone(UserID, WorkloadZone).
+
+% Acute:chronic workload ratio zones; 0.8-1.3 is the usual "sweet spot",
+% above 1.5 injury risk climbs sharply
+user_workload_zone(UserID, Zone) :-
+    (   user_workload(UserID, ACWR) -> workload_zone(ACWR, Zone) ; Zone = unknown ).
+
+workload_zone(ACWR, spike) :- ACWR > 1.5, !.
+workload_zone(ACWR, elevated) :- ACWR > 1.3, !.
+workload_zone(ACWR, optimal) :- ACWR >= 0.8, !.
+workload_zone(_, low).
+
+workload_advice(unknown, []).
+workload_advice(optimal, []).
+workload_advice(spike, [
+    "Your training load this week is far above your 4-week average: high injury risk",
+    "Cut volume or intensity for the next few days and prioritise recovery sessions"
+]).
+workload_advice(elevated, [
+    "Your training load is rising faster than your body is used to",
+    "Hold this week's load steady rather than adding more"
+]).
+workload_advice(low, [
+    "Your training load has dropped well below your usual level",
+    "Build back up gradually, by no more than about 10% per week"
+]).
+
+% Periodized training calendar
+% Weeks are counted back from the competition week (out(0)): the taper
+% comes last, the peak block before it and the build block before that,
+% with base training further out. Blocks are longer for bigger
+% competitions. The two weeks after a competition are for recovery.
+% Without a competition date, weeks are numbered (cycle(N)) and training
+% repeats three build weeks and a recovery week.
+competition_blocks(CompLevel, Taper, Peak, Build) :-
+    (   competition_block_weeks(CompLevel, Taper, Peak, Build) -> true
+    ;   competition_block_weeks(default, Taper, Peak, Build)
+    ).
+
+competition_block_weeks(international, 3, 3, 6).
+competition_block_weeks(national, 2, 3, 6).
+competition_block_weeks(default, 1, 2, 4).
+
+calendar_phase(out(WeeksOut), _, recovery) :- WeeksOut < 0, WeeksOut >= -2, !.
+calendar_phase(out(WeeksOut), _, base) :- WeeksOut < 0, !.
+calendar_phase(out(WeeksOut), CompLevel, Phase) :-
+    competition_blocks(CompLevel, Taper, Peak, Build),
+    (   WeeksOut < Taper -> Phase = taper
+    ;   WeeksOut < Taper + Peak -> Phase = peak
+    ;   WeeksOut < Taper + Peak + Build -> Phase = build
+    ;   Phase = base
+    ).
+calendar_phase(cycle(Week), _, Phase) :-
+    (   Week mod 4 =:= 3 -> Phase = recovery ; Phase = build ).
+
+% phase_load(Phase, VolumePercent, Intensity, Sessions, Focus): volume is
+% relative to a normal week; Sessions is how many of the sport's sessions
+% the week keeps
+phase_load(base, 100, moderate, 5, "Aerobic base and general strength: add volume gradually").
+phase_load(build, 110, high, 5, "Sport-specific intensity: intervals and strength-power work").
+phase_load(peak, 90, very_high, 4, "Race-pace work and competition simulation at full intensity").
+phase_load(taper, 60, high, 3, "Cut volume, keep the intensity, and arrive at the competition fresh").
+phase_load(recovery, 50, low, 2, "Easy sessions and mobility to absorb the training").
+
+% Injuries that are not fully recovered cap the weekly volume
+injury_volume_cap(severe, 50).
+injury_volume_cap(moderate, 75).
+injury_volume_cap(mild, 90).
+
+active_injury(UserID, Type, Cap) :-
+    user_injury(UserID, Type, _, Severity, _, Notes, _),
+    \+ injury_recovery_status(Notes, fully_recovered),
+    (   injury_volume_cap(Severity, Cap) -> true ; Cap = 85 ).
+
+% Everything the calendar is built from, read once per athlete. The API
+% keeps the generated weeks until one of these facts changes.
+calendar_inputs(UserID, Sport, CompType, CompLevel, CompDate, VolumeCap, Injuries) :-
+    known_user(UserID),
+    (user_sport(UserID, Sport, _) -> true ; Sport = general),
+    (competition_details(UserID, CompType, _, CompLevel) -> true ; CompType = none, CompLevel = none),
+    (user_training_schedule(UserID, CompDate) -> true ; CompDate = ''),
+    findall([Type, Cap], active_injury(UserID, Type, Cap), Found),
+    sort(Found, Injuries),
+    (   Injuries == []
+    ->  VolumeCap = 100
+    ;   aggregate_all(min(Cap), member([_, Cap], Injuries), VolumeCap)
+    ).
+
+% calendar_week(Inputs, Period, Phase, Volume, Intensity, Focus, Sessions, Adjustments)
+% builds one week from calendar_inputs/7 (less the user ID and date) and
+% the week's out(N) or cycle(N)
+calendar_week([Sport, CompType, CompLevel, VolumeCap, Injuries], Period,
+              Phase, Volume, Intensity, Focus, Sessions, Adjustments) :-
+    calendar_phase(Period, CompLevel, Phase),
+    phase_load(Phase, Load, Intensity0, Count, Focus),
+    Volume is min(Load, VolumeCap),
+    (   VolumeCap =< 50, Intensity0 \== low -> Intensity = moderate ; Intensity = Intensity0 ),
+    once(sport_specific_training(Sport, AllSessions)),
+    length(AllSessions, Available),
+    Keep is min(Count, Available),
+    length(Sessions, Keep),
+    append(Sessions, _, AllSessions),
+    (   memberchk(Phase, [peak, taper]),
+        competition_adjustments(CompType, CompLevel, CompAdjustments)
+    ->  true
+    ;   CompAdjustments = []
+    ),
+    (   Period = out(0) -> Race = ["Competition week: short, sharp sessions and two easy days before the event"] ; Race = [] ),
+    findall(Text,
+            ( member([Type, Cap], Injuries),
+              format(string(Text), "Keep volume under ~w% while your ~w recovers", [Cap, Type]) ),
+            InjuryNotes),
+    append([Race, CompAdjustments, InjuryNotes], Adjustments).
+
+% One call builds a run of weeks
+calendar_weeks(Inputs, Periods, Weeks) :-
+    findall([Phase, Volume, Intensity, Focus, Sessions, Adjustments],
+            ( member(Period, Periods),
+              calendar_week(Inputs, Period, Phase, Volume, Intensity, Focus, Sessions, Adjustments) ),
+            Weeks).
+
+% Every fixed recommendation text a plan can be made of; the API encodes
+% them to JSON once per load instead of on every plan request
+plan_text(Text) :-
+    (   sport_specific_training(_, Texts)
+    ;   fitness_level_training(_, Texts)
+    ;   sport_specific_diet(_, Texts)
+    ;   diet_type_recommendations(_, Texts)
+    ;   clause(diet_recommendation(_, balanced, Texts), true)
+    ;   injury_type_recommendation(_, Texts)
+    ;   severity_recommendation(_, Texts)
+    ;   specific_injury_recommendation(_, Texts)
+    ;   workload_advice(_, Texts)
+    ;   Texts = ["No current injuries. Continue with regular training and recovery protocols."]
+    ),
+    member(Text, Texts).
+
 % Default training recommendations for general sport
 training_recommendation(general, FitnessLevel, Plan) :-
     fitness_level_training(FitnessLevel, Plan).
@@ -807,7 +1299,7 @@ specific_injury_recommendation('back_strain', [
 get_injury_recommendations(UserId, Recommendations) :-
     findall(
         Recs,
-        ( user_injury(UserId, Type, Severity, _, _, _),
+        ( user_injury(UserId, Type, Severity, _, _, _, _),
           injury_recommendation(Type, Severity, TypeSeverityRecs),
           ( specific_injury_recommendation(Type, SpecificRecs) -> true ; SpecificRecs = [] ),
           append(TypeSeverityRecs, SpecificRecs, Recs)
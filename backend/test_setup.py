@@ -51,6 +51,35 @@ def set_user_diet(user_id):
     else:
         print(f"Failed to set diet: {response.text}")
 
+def import_test_club(count=5):
+    # Create a whole club in one request, then fetch every plan in one more
+    athletes = [{
+        "name": f"Club Athlete {i}",
+        "age": 20 + i,
+        "gender": "female" if i % 2 else "male",
+        "height": 170 + i,
+        "weight": 65 + i,
+        "fitnessLevel": "intermediate",
+        "sport": {"sport": "running", "level": "intermediate"},
+        "diet": {"dietType": "balanced", "restrictions": []},
+        "competition": {"competitionType": "national", "format": "league", "level": "state"},
+        "injuries": []
+    } for i in range(count)]
+    
+    response = requests.post(f"{BASE_URL}/api/users/batch", json={"athletes": athletes})
+    if response.status_code != 200:
+        print(f"Failed to import club: {response.text}")
+        return
+    result = response.json()
+    print(f"Imported club: {result['created']} created, {result['failed']} failed")
+    
+    user_ids = [r["userId"] for r in result["results"] if r["status"] == "created"]
+    response = requests.post(f"{BASE_URL}/api/plans/batch", json={"userIds": user_ids})
+    if response.status_code == 200:
+        print(f"Fetched {len(response.json()['plans'])} plans in one request")
+    else:
+        print(f"Failed to get plans: {response.text}")
+
 def main():
     user_id = create_test_user()
     if user_id:
@@ -64,6 +93,8 @@ def main():
             print(json.dumps(response.json(), indent=2))
         else:
             print(f"\nFailed to get plan: {response.text}")
+    
+    import_test_club()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
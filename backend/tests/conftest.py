@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported the way app.py imports them, from the
+# backend directory itself
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+KB_PATH = os.path.join(BACKEND, "sports_fitness_coach.pl")
+
+
+@pytest.fixture(scope="session")
+def swipl():
+    # Tests that need SWI-Prolog skip when pyswip cannot load it; pyswip
+    # raises its own error rather than ImportError then
+    try:
+        from pyswip import Prolog
+    except Exception as e:
+        pytest.skip(f"SWI-Prolog is not available: {e}")
+    return Prolog
+
+
+@pytest.fixture(scope="session")
+def prolog(swipl):
+    # One in-process engine with the knowledge base loaded
+    from prolog_runner import GoalRunner
+    from prolog_terms import goal
+
+    swipl()
+    runner = GoalRunner()
+    runner.run(goal("load_files", KB_PATH, []))
+    return runner
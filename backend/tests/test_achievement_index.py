@@ -0,0 +1,65 @@
+import pytest
+
+from achievement_index import AchievementIndex
+
+
+@pytest.fixture
+def index():
+    index = AchievementIndex()
+    index.set_athlete('a', sport='running', level='national')
+    index.set_athlete('b', sport='swimming', level='state')
+    for day in range(1, 11):
+        index.add('a', f"Run {day:02d}", f"2024-05-{day:02d}", 'competition', '')
+        index.add('b', f"Swim {day:02d}", f"2024-05-{day:02d}", 'training', '')
+    return index
+
+
+def pages(fetch, limit):
+    # Every page fetch(limit, after) returns, following the cursors
+    result, after = [], None
+    while True:
+        entries, after = fetch(limit, after)
+        result.append(entries)
+        if after is None:
+            return result
+
+
+def test_top_pages_newest_first_without_gaps(index):
+    result = pages(lambda limit, after: index.top(limit, after=after), 3)
+    assert [len(page) for page in result] == [3, 3, 3, 3, 3, 3, 2]
+    entries = [entry for page in result for entry in page]
+    assert len({entry['id'] for entry in entries}) == 20
+    dates = [entry['date'] for entry in entries]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_top_with_facets_and_dates(index):
+    entries, after = index.top(10, sport='running', start='2024-05-03', end='2024-05-06')
+    assert [entry['title'] for entry in entries] == ['Run 06', 'Run 05', 'Run 04', 'Run 03']
+    assert after is None
+    entries, _ = index.top(10, category='training', level='state')
+    assert {entry['userId'] for entry in entries} == {'b'}
+
+
+def test_entries_follow_an_athlete_sport_change(index):
+    index.set_athlete('b', sport='running')
+    entries, _ = index.top(30, sport='running')
+    assert len(entries) == 20
+    assert index.top(30, sport='swimming') == ([], None)
+    # The level is kept when only the sport changes
+    assert {entry['level'] for entry in entries if entry['userId'] == 'b'} == {'state'}
+
+
+def test_search_pages_prefix_matches_alphabetically(index):
+    index.add('a', "Runner up", "2024-06-01", 'competition', '')
+    result = pages(lambda limit, after: index.search('RUN', limit, after=after), 4)
+    titles = [entry['title'] for page in result for entry in page]
+    assert titles == [f"Run {day:02d}" for day in range(1, 11)] + ["Runner up"]
+    assert [len(page) for page in result] == [4, 4, 3]
+
+
+def test_search_without_matches(index):
+    assert index.search('cycle', 5) == ([], None)
+    entries, after = index.search('swim 1', 5)
+    assert [entry['title'] for entry in entries] == ['Swim 10']
+    assert after is None
@@ -0,0 +1,53 @@
+from prolog_terms import Text, Var, compound, goal
+
+
+def history(prolog, user_id, after, limit, injury_type=None):
+    # (position, type) of each record on the page
+    results = prolog.run(goal(
+        "injury_history", user_id, '', '', after, limit, injury_type or Var("Type"), Var("Date"), Var("Severity"),
+        Var("RecoveryTime"), Var("Notes"), Var("Position"),
+    ))
+    return [(result['Position'], result.get('Type', injury_type)) for result in results]
+
+
+def add_injuries(prolog, user_id, types):
+    for injury_type in types:
+        assert prolog.run(goal("add_injury", user_id, injury_type, '2024-01-01', 'mild', '1 week', Text("")))
+
+
+def test_pages_resume_after_the_last_position(prolog):
+    add_injuries(prolog, 7, ['sprain', 'fracture'] * 5)
+    first = history(prolog, 7, 0, 4)
+    assert [position for position, _ in first] == [1, 2, 3, 4]
+    rest = history(prolog, 7, first[-1][0], 100)
+    assert [position for position, _ in rest] == list(range(5, 11))
+    assert history(prolog, 7, 10, 5) == []
+
+
+def test_filtered_pages_return_positions_to_resume_from(prolog):
+    add_injuries(prolog, 8, ['sprain', 'fracture'] * 5)
+    assert history(prolog, 8, 0, 2, 'fracture') == [(2, 'fracture'), (4, 'fracture')]
+    assert history(prolog, 8, 4, 10, 'fracture') == [(6, 'fracture'), (8, 'fracture'), (10, 'fracture')]
+
+
+def test_positions_are_per_athlete(prolog):
+    add_injuries(prolog, 'legacy-athlete', ['sprain'] * 3)
+    add_injuries(prolog, 9, ['fracture'])
+    assert history(prolog, 'legacy-athlete', 0, 10) == [(1, 'sprain'), (2, 'sprain'), (3, 'sprain')]
+    assert history(prolog, 9, 0, 10) == [(1, 'fracture')]
+
+
+def test_snapshot_facts_without_keys_are_numbered_on_load(swipl, prolog, tmp_path):
+    swipl.assertz(
+        "(write_test_facts(File, Facts) :- setup_call_cleanup(open(File, write, Out, [type(binary)]),"
+        " forall(member(Fact, Facts), fast_write(Out, Fact)), close(Out)))"
+    )
+    path = str(tmp_path / "before-keys.facts")
+    prolog.run(goal("write_test_facts", path, [
+        compound("user_injury", 11, 'sprain', '2023-01-01', 'mild', '1 week', Text("")),
+        compound("user_injury", 11, 'fracture', '2023-02-01', 'severe', '8 weeks', Text("")),
+    ]))
+    assert prolog.run(goal("load_athlete_facts", path))
+    assert history(prolog, 11, 0, 10) == [(1, 'sprain'), (2, 'fracture')]
+    add_injuries(prolog, 11, ['concussion'])
+    assert history(prolog, 11, 2, 10) == [(3, 'concussion')]
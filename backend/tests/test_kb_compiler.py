@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+from kb_compiler import KnowledgeBaseError, compile_knowledge_base, qlf_path
+
+KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sports_fitness_coach.pl")
+
+
+def test_compile_knowledge_base(swipl, tmp_path):
+    kb_path = str(tmp_path / "coach.pl")
+    shutil.copy(KB_PATH, kb_path)
+    context = multiprocessing.get_context("spawn")
+    assert compile_knowledge_base(kb_path, context) == (qlf_path(kb_path), True)
+    assert os.path.exists(qlf_path(kb_path))
+    # Unchanged source: the image is reused
+    assert compile_knowledge_base(kb_path, context) == (qlf_path(kb_path), False)
+
+
+def test_compile_knowledge_base_reports_errors(swipl, tmp_path):
+    kb_path = str(tmp_path / "broken.pl")
+    with open(kb_path, "w", encoding="utf-8") as f:
+        f.write("broken(.\n")
+    with pytest.raises(KnowledgeBaseError):
+        compile_knowledge_base(kb_path, multiprocessing.get_context("spawn"))
@@ -0,0 +1,52 @@
+from plan_cache import PlanCache, StripedInvalidation
+
+
+def test_token_goes_stale_on_write_and_reload():
+    invalidation = StripedInvalidation()
+    token = invalidation.token('a')
+    invalidation.invalidate('a')
+    assert invalidation.token('a') != token
+    token = invalidation.token('a')
+    invalidation.clear()
+    assert invalidation.token('a') != token
+
+
+def test_plan_cache_skips_results_read_before_a_write():
+    cache = PlanCache()
+    token = cache.token('a')
+    cache.invalidate_user('a')
+    cache.put('plan', {'plan': 1}, token, 'a')
+    cache.remember_signature('a', 'plan', token)
+    assert cache.get('plan') is None
+    assert cache.signature('a') is None
+
+    token = cache.token('a')
+    cache.put('plan', {'plan': 1}, token, 'a')
+    cache.remember_signature('a', 'plan', token)
+    assert cache.get('plan') == {'plan': 1}
+    assert cache.signature('a') == 'plan'
+
+
+def test_plan_cache_write_drops_only_the_signature():
+    cache = PlanCache()
+    token = cache.token('a')
+    cache.put('plan', {'plan': 1}, token, 'a')
+    cache.remember_signature('a', 'plan', token)
+    cache.invalidate_user('a')
+    # Plans are keyed on their inputs, so other athletes still share them
+    assert cache.signature('a') is None
+    assert cache.get('plan') == {'plan': 1}
+    cache.clear()
+    assert cache.get('plan') is None
+
+
+def test_plan_cache_evicts_least_recently_used():
+    cache = PlanCache(maxsize=2)
+    for key in ('x', 'y'):
+        cache.put(key, key, cache.token('a'), 'a')
+    cache.get('x')
+    cache.put('z', 'z', cache.token('a'), 'a')
+    assert cache.get('y') is None
+    assert cache.get('x') == 'x'
+    assert cache.stats()['evictions'] == 1
+
@@ -0,0 +1,73 @@
+from prolog_terms import Text, Var, compound, goal
+from training_calendar import CalendarCache
+
+
+def test_calendar_cache_drops_athlete_on_write():
+    cache = CalendarCache()
+    token = cache.token('a')
+    cache.put_inputs('a', {'sport': 'running'}, token)
+    cache.put_weeks('a', {'2024-05-06': 'week'}, token)
+    assert cache.inputs('a') == {'sport': 'running'}
+    assert cache.weeks('a', ['2024-05-06', '2024-05-13']) == {'2024-05-06': 'week'}
+
+    cache.invalidate_user('a')
+    assert cache.inputs('a') is None
+    # Weeks built from inputs read before the write are not stored
+    cache.put_inputs('a', {'sport': 'swimming'}, cache.token('a'))
+    cache.put_weeks('a', {'2024-05-13': 'stale'}, token)
+    assert cache.weeks('a', ['2024-05-13']) == {}
+
+
+def test_calendar_cache_clear():
+    cache = CalendarCache()
+    token = cache.token('a')
+    cache.put_inputs('a', {'sport': 'running'}, token)
+    cache.clear()
+    assert cache.inputs('a') is None
+    cache.put_inputs('a', {'sport': 'running'}, token)
+    assert cache.inputs('a') is None
+
+
+def import_athlete(prolog, user_id, competition=(), injuries=()):
+    assert prolog.run(goal(
+        "import_athlete", user_id, Text("Smoke Test"), 25, 'female', 170, 60, 'intermediate',
+        ['running', 'intermediate'], [], list(competition), [list(injury) for injury in injuries],
+    ))
+
+
+def calendar_inputs(prolog, user_id):
+    return prolog.run(goal(
+        "calendar_inputs", user_id, Var("Sport"), Var("CompType"), Var("CompLevel"), Var("CompDate"),
+        Var("VolumeCap"), Var("Injuries"),
+    ))
+
+
+def test_calendar_inputs_for_a_healthy_athlete(prolog):
+    import_athlete(prolog, 'smoke_healthy')
+    [result] = calendar_inputs(prolog, 'smoke_healthy')
+    assert result['Sport'] == 'running'
+    assert result['CompType'] == 'none'
+    assert result['VolumeCap'] == 100
+    assert result['Injuries'] == []
+
+
+def test_calendar_inputs_cap_volume_for_injuries(prolog):
+    import_athlete(prolog, 'smoke_injured', competition=['olympics', 'marathon', 'international'], injuries=[
+        ['sprain', '2024-03-01', 'moderate', '2 weeks', Text("Still sore")],
+        ['muscle_strain', '2024-03-05', 'mild', '1 week', Text("Tight hamstring")],
+    ])
+    [result] = calendar_inputs(prolog, 'smoke_injured')
+    assert (result['CompType'], result['CompLevel']) == ('olympics', 'international')
+    assert result['Injuries'] == [['muscle_strain', 90], ['sprain', 75]]
+    assert result['VolumeCap'] == 75
+
+
+def test_calendar_inputs_unknown_athlete(prolog):
+    assert calendar_inputs(prolog, 'smoke_nobody') == []
+
+
+def test_calendar_weeks_one_per_period(prolog):
+    periods = [compound("out", weeks_out) for weeks_out in (8, 2, 0)] + [compound("cycle", 2800)]
+    [result] = prolog.run(goal("calendar_weeks", ['running', 'none', 'none', 100, []], periods, Var("Weeks")))
+    assert len(result['Weeks']) == len(periods)
+    assert all(len(week) == 6 for week in result['Weeks'])
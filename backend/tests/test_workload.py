@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from prolog_terms import Var, goal
+from session_store import workload_metrics
+
+AS_OF = date(2024, 6, 30)
+
+
+def sessions(daily):
+    # daily: {days before AS_OF: (minutes, rpe)}
+    days = np.array([(AS_OF - timedelta(days=back)).toordinal() for back in daily], dtype=np.int64)
+    minutes = np.array([minutes for minutes, _ in daily.values()], dtype=np.float64)
+    rpe = np.array([rpe for _, rpe in daily.values()], dtype=np.float64)
+    return days, minutes, rpe
+
+
+def test_steady_load_has_acwr_of_one():
+    days, minutes, rpe = sessions({back: (60, 5) for back in range(28)})
+    current = workload_metrics(days, minutes, rpe, AS_OF)['current']
+    assert current['load'] == 7 * 300
+    assert current['sessions'] == 7
+    assert current['acuteLoad'] == 300
+    assert current['chronicLoad'] == 300
+    assert current['acwr'] == 1.0
+    # Identical days have no spread, so monotony is undefined
+    assert current['monotony'] is None
+    assert current['strain'] is None
+
+
+def test_no_acwr_without_a_full_chronic_window():
+    # A week of training is not a spike over three weeks that were never logged
+    days, minutes, rpe = sessions({back: (60, 5) for back in range(7)})
+    result = workload_metrics(days, minutes, rpe, AS_OF)
+    current = result['current']
+    assert current['acuteLoad'] == 300
+    assert current['chronicLoad'] == 75
+    assert current['acwr'] is None
+    assert all(week['acwr'] is None for week in result['weeks'])
+
+
+def test_load_after_rest_is_a_spike():
+    # One logged session four weeks back starts the chronic window
+    days, minutes, rpe = sessions({27: (0, 0), **{back: (60, 5) for back in range(7)}})
+    current = workload_metrics(days, minutes, rpe, AS_OF)['current']
+    assert current['chronicLoad'] == 75
+    assert current['acwr'] == 4.0
+    earlier = workload_metrics(days, minutes, rpe, AS_OF - timedelta(days=1))['current']
+    assert earlier['acwr'] is None
+
+
+def test_monotony_and_strain():
+    # Alternating hard and rest days over the last week
+    days, minutes, rpe = sessions({back: (60, 10) for back in range(0, 7, 2)})
+    current = workload_metrics(days, minutes, rpe, AS_OF)['current']
+    loads = np.array([600, 0, 600, 0, 600, 0, 600], dtype=np.float64)
+    assert current['monotony'] == pytest.approx(loads.mean() / loads.std(), abs=0.01)
+    assert current['strain'] == pytest.approx(loads.sum() * loads.mean() / loads.std(), abs=0.1)
+
+
+def test_no_sessions():
+    empty = np.array([], dtype=np.int64)
+    result = workload_metrics(empty, empty.astype(np.float64), empty.astype(np.float64), AS_OF, weeks=4)
+    assert len(result['weeks']) == 4
+    assert result['current']['load'] == 0
+    assert result['current']['acwr'] is None
+
+
+def test_weeks_end_on_as_of():
+    days, minutes, rpe = sessions({back: (30, 4) for back in range(0, 70, 3)})
+    weeks = workload_metrics(days, minutes, rpe, AS_OF, weeks=6)['weeks']
+    assert [week['weekEnding'] for week in weeks] == [
+        (AS_OF - timedelta(weeks=back)).isoformat() for back in range(5, -1, -1)
+    ]
+    # Sessions after as_of are left out
+    later = np.append(days, (AS_OF + timedelta(days=1)).toordinal())
+    result = workload_metrics(later, np.append(minutes, 500), np.append(rpe, 10), AS_OF, weeks=6)
+    assert result['weeks'] == weeks
+
+
+@pytest.mark.parametrize("acwr, zone", [(0.5, 'low'), (0.8, 'optimal'), (1.3, 'optimal'), (1.4, 'elevated'), (1.6, 'spike')])
+def test_workload_zone(prolog, acwr, zone):
+    assert prolog.run(goal("workload_zone", acwr, Var("Zone")))[0]['Zone'] == zone
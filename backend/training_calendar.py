@@ -0,0 +1,177 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from plan_cache import StripedInvalidation
+from prolog_terms import Var, compound, goal
+
+# Weeks built per engine call while a calendar is generated
+CHUNK_WEEKS = 4
+# Weeks without a competition are numbered from this Monday
+EPOCH = date(1970, 1, 5)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+class CalendarCache:
+    # Per-athlete calendars: the inputs read from the athlete's facts and
+    # every week generated from them so far, LRU over athletes. A write to
+    # one of those facts drops the athlete's entry; weeks generated from
+    # inputs read before the write are not stored (see token()).
+
+    def __init__(self, maxsize=1024, max_weeks=520):
+        self.maxsize = maxsize
+        self.max_weeks = max_weeks
+        self._entries = OrderedDict()
+        self._invalidation = StripedInvalidation()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def token(self, user_id):
+        return self._invalidation.token(user_id)
+
+    def inputs(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry['inputs']
+
+    def put_inputs(self, user_id, inputs, token):
+        with self._lock:
+            if token != self.token(user_id):
+                return
+            self._entries[user_id] = {'inputs': inputs, 'weeks': {}}
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def weeks(self, user_id, starts):
+        # The cached weeks among starts, by start date
+        with self._lock:
+            entry = self._entries.get(user_id)
+            weeks = entry['weeks'] if entry is not None else {}
+            found = {start: weeks[start] for start in starts if start in weeks}
+            self.hits += len(found)
+            self.misses += len(starts) - len(found)
+            return found
+
+    def put_weeks(self, user_id, weeks, token):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or token != self.token(user_id):
+                return
+            if len(entry['weeks']) + len(weeks) > self.max_weeks:
+                entry['weeks'].clear()
+            entry['weeks'].update(weeks)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._invalidation.invalidate(user_id)
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidation.clear()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'athletes': len(self._entries),
+                'weeks': sum(len(entry['weeks']) for entry in self._entries.values()),
+                'maxsize': self.maxsize,
+            }
+
+
+class TrainingCalendar:
+    # Periodized training weeks, built only when asked for. The athlete's
+    # sport, competition and injuries are read once (calendar_inputs/7);
+    # weeks are then built from those inputs by the rules alone
+    # (calendar_weeks/3), CHUNK_WEEKS at a time, on any engine worker.
+
+    def __init__(self, engine, cache):
+        self.engine = engine
+        self.cache = cache
+
+    def inputs(self, user_id):
+        # None for an unknown athlete
+        inputs = self.cache.inputs(user_id)
+        if inputs is not None:
+            return inputs
+        token = self.cache.token(user_id)
+        results = self.engine.query(goal(
+            "calendar_inputs", user_id, Var("Sport"), Var("CompType"), Var("CompLevel"), Var("CompDate"),
+            Var("VolumeCap"), Var("Injuries"),
+        ), user_id=user_id)
+        if not results:
+            return None
+        result = results[0]
+        competition = None
+        if result['CompType'] != 'none':
+            competition = {
+                'type': result['CompType'],
+                'level': result['CompLevel'],
+                'date': result['CompDate'] or None,
+            }
+        inputs = {
+            'sport': result['Sport'],
+            'competition': competition,
+            'volumeCap': result['VolumeCap'],
+            'injuries': [{'type': injury_type, 'volumeCap': cap} for injury_type, cap in result['Injuries']],
+        }
+        self.cache.put_inputs(user_id, inputs, token)
+        return inputs
+
+    def weeks(self, user_id, inputs, first, count):
+        # Yields count weeks from the week of first, generating the ones
+        # not cached yet as the caller consumes them
+        token = self.cache.token(user_id)
+        starts = [week_start(first) + timedelta(weeks=i) for i in range(count)]
+        for offset in range(0, count, CHUNK_WEEKS):
+            chunk = starts[offset:offset + CHUNK_WEEKS]
+            weeks = self.cache.weeks(user_id, chunk)
+            missing = [start for start in chunk if start not in weeks]
+            if missing:
+                generated = self._generate(inputs, missing)
+                self.cache.put_weeks(user_id, generated, token)
+                weeks.update(generated)
+            for start in chunk:
+                yield weeks[start]
+
+    def _generate(self, inputs, starts):
+        competition = inputs['competition'] or {}
+        competition_week = week_start(date.fromisoformat(competition['date'])) if competition.get('date') else None
+        if competition_week is not None:
+            out = [(competition_week - start).days // 7 for start in starts]
+            periods = [compound("out", weeks_out) for weeks_out in out]
+        else:
+            out = [None] * len(starts)
+            periods = [compound("cycle", (start - EPOCH).days // 7) for start in starts]
+        rule_inputs = [
+            inputs['sport'], competition.get('type', 'none'), competition.get('level', 'none'),
+            inputs['volumeCap'], [[injury['type'], injury['volumeCap']] for injury in inputs['injuries']],
+        ]
+        weeks = self.engine.query(goal("calendar_weeks", rule_inputs, periods, Var("Weeks")))[0]['Weeks']
+        return {
+            start: {
+                'weekStart': start.isoformat(),
+                'weekEnd': (start + timedelta(days=6)).isoformat(),
+                'weeksToCompetition': weeks_out,
+                'phase': phase,
+                'volumePercent': volume,
+                'intensity': intensity,
+                'focus': focus,
+                'sessions': sessions,
+                'adjustments': adjustments,
+            }
+            for start, weeks_out, (phase, volume, intensity, focus, sessions, adjustments) in zip(starts, out, weeks)
+        }
@@ -0,0 +1,68 @@
+import os
+import threading
+
+
+class UserKeys:
+    # Dense integer keys for user IDs. Athlete facts in the engines hold the
+    # key rather than the ID, so UUIDs never enter SWI's atom table and each
+    # one costs a small integer inside its clauses. The mapping is an
+    # append-only file with one ID per line; a user's key is their line
+    # number, so it never changes once written.
+    #
+    # Users created before keys existed have none and keep their ID in
+    # their facts; get() returns None for them and callers pass the ID as is.
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._ids = []
+        self._file = None
+
+    def load(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            self._keys = {}
+            self._ids = []
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        # A torn final line from a crash mid-write has no
+                        # newline; its user was never written to an engine
+                        if line.endswith("\n"):
+                            self._keys[line[:-1]] = len(self._ids)
+                            self._ids.append(line[:-1])
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._file.truncate(sum(len(user_id.encode("utf-8")) + 1 for user_id in self._ids))
+        return len(self._ids)
+
+    def assign(self, user_ids):
+        # Keys for new users, durable before they are returned, so no fact
+        # holding a key can outlive the record of what it stands for
+        with self._lock:
+            new = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self._keys]
+            if new:
+                self._file.write("".join(user_id + "\n" for user_id in new))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                for user_id in new:
+                    self._keys[user_id] = len(self._ids)
+                    self._ids.append(user_id)
+            return [self._keys[user_id] for user_id in user_ids]
+
+    def get(self, user_id):
+        return self._keys.get(user_id)
+
+    def user_id(self, key):
+        return self._ids[key]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return len(self._ids)